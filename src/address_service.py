@@ -1,5 +1,6 @@
 from typing import Optional
 from src.config import get_conn
+from src.aio_db import aget_conn
 
 
 class AddressService:
@@ -44,7 +45,7 @@ class AddressService:
     # ------------- 分页查询地址 -------------
     @staticmethod
     def get_address_list(user_id: int, page: int = 1, size: int = 10) -> list:
-        with get_conn() as conn:
+        with get_conn(readonly=True) as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT id, name, phone, province, city, district, detail, is_default, created_at
@@ -58,7 +59,7 @@ class AddressService:
     # ------------- 获取默认地址 -------------
     @staticmethod
     def get_default_address(user_id: int) -> Optional[dict]:
-        with get_conn() as conn:
+        with get_conn(readonly=True) as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT id, name, phone, province, city, district, detail, created_at
@@ -66,4 +67,68 @@ class AddressService:
                     WHERE user_id=%s AND is_default=1
                     LIMIT 1
                 """, (user_id,))
-                return cur.fetchone()
\ No newline at end of file
+                return cur.fetchone()
+
+
+class AsyncAddressService:
+    """AddressService 的 asyncio 版本"""
+
+    @staticmethod
+    async def add_address(user_id: int, name: str, phone: str, province: str, city: str, district: str, detail: str,
+                          is_default: bool = False, addr_type: str = "shipping") -> int:
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                if is_default:
+                    await cur.execute("UPDATE addresses SET is_default=0 WHERE user_id=%s", (user_id,))
+                await cur.execute("""
+                    INSERT INTO addresses(user_id, name, phone, province, city, district, detail, is_default, addr_type)
+                    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                """, (user_id, name, phone, province, city, district, detail, int(is_default), addr_type))
+                return cur.lastrowid
+
+    @staticmethod
+    async def delete_address(user_id: int, addr_id: int) -> None:
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM addresses WHERE id=%s AND user_id=%s", (addr_id, user_id))
+                if cur.rowcount == 0:
+                    raise ValueError("地址不存在或无权删除")
+
+    @staticmethod
+    async def update_address(user_id: int, addr_id: int, **kwargs) -> None:
+        if not kwargs:
+            raise ValueError("无更新内容")
+        set_clause = ", ".join([f"{k}=%s" for k in kwargs])
+        values = list(kwargs.values()) + [addr_id, user_id]
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                if kwargs.get("is_default"):
+                    await cur.execute("UPDATE addresses SET is_default=0 WHERE user_id=%s", (user_id,))
+                await cur.execute(f"UPDATE addresses SET {set_clause} WHERE id=%s AND user_id=%s", values)
+                if cur.rowcount == 0:
+                    raise ValueError("地址不存在或无权修改")
+
+    @staticmethod
+    async def get_address_list(user_id: int, page: int = 1, size: int = 10) -> list:
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT id, name, phone, province, city, district, detail, is_default, created_at
+                    FROM addresses
+                    WHERE user_id=%s
+                    ORDER BY is_default DESC, id DESC
+                    LIMIT %s OFFSET %s
+                """, (user_id, size, (page - 1) * size))
+                return await cur.fetchall()
+
+    @staticmethod
+    async def get_default_address(user_id: int) -> Optional[dict]:
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT id, name, phone, province, city, district, detail, created_at
+                    FROM addresses
+                    WHERE user_id=%s AND is_default=1
+                    LIMIT 1
+                """, (user_id,))
+                return await cur.fetchone()
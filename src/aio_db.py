@@ -0,0 +1,144 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+import aiomysql
+
+from src.config import CFG, POOL_CFG, TIMED_CURSOR, REPLICAS, REPLICA_CFG, PoolTimeoutError, router
+from src.metrics import ATimedCursor, db_connections_opened
+
+# aiomysql 连接绑定创建时的事件循环，所以池也按循环各建一个（正常服务进程只有一个）
+_pool = None
+_pool_loop = None
+_pool_lock = None
+_replica_pools = {}   # 从库下标 -> aiomysql.Pool，与 _pool 同属 _pool_loop
+_seen_conns = weakref.WeakSet()
+
+
+async def get_async_pool() -> aiomysql.Pool:
+    """进程内异步连接池，首次使用时创建，配置与同步池共用 POOL_CFG"""
+    global _pool, _pool_loop, _pool_lock
+    loop = asyncio.get_running_loop()
+    if _pool is not None and _pool_loop is loop:
+        return _pool
+    if _pool_lock is None or _pool_loop is not loop:
+        _pool_lock = asyncio.Lock()
+        _pool, _pool_loop = None, loop
+        _replica_pools.clear()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await _create_pool(CFG)
+    return _pool
+
+
+async def _create_pool(cfg: dict) -> aiomysql.Pool:
+    return await aiomysql.create_pool(
+        minsize=POOL_CFG["min_size"],
+        maxsize=POOL_CFG["max_size"],
+        pool_recycle=int(POOL_CFG["max_lifetime"]) if POOL_CFG["max_lifetime"] else -1,
+        cursorclass=ATimedCursor if TIMED_CURSOR else aiomysql.DictCursor,
+        **cfg,
+    )
+
+
+async def _replica_pool(i: int) -> aiomysql.Pool:
+    await get_async_pool()    # 保证 _pool_loop / _pool_lock 属于当前循环
+    pool = _replica_pools.get(i)
+    if pool is None:
+        async with _pool_lock:
+            pool = _replica_pools.get(i)
+            if pool is None:
+                pool = _replica_pools[i] = await _create_pool(REPLICAS[i])
+    return pool
+
+
+async def _acquire(pool: aiomysql.Pool, timeout: float = None):
+    timeout = POOL_CFG["timeout"] if timeout is None else timeout
+    try:
+        conn = await asyncio.wait_for(pool.acquire(), timeout)
+    except asyncio.TimeoutError:
+        raise PoolTimeoutError(f"等待数据库连接超时（{timeout:g}s，池上限 {pool.maxsize}）")
+    if conn not in _seen_conns:
+        # aiomysql 没有建连回调，第一次借出时计数
+        _seen_conns.add(conn)
+        db_connections_opened.inc("async")
+    if asyncio.get_running_loop().time() - conn.last_usage >= POOL_CFG["ping_interval"]:
+        try:
+            await conn.ping(reconnect=True)
+        except (aiomysql.OperationalError, aiomysql.InterfaceError):
+            conn.close()
+            await pool.release(conn)
+            raise
+    return conn
+
+
+@asynccontextmanager
+async def aget_conn(readonly: bool = False):
+    """异步版 get_conn：async with aget_conn() as conn，退出时归还连接池
+    readonly=True 表示块内只有查询，配置了从库时路由到从库，从库全部不可用时回落主库"""
+    conn, replica = None, None
+    if router.use_replica(readonly):
+        for i in router.candidates():
+            try:
+                pool = await _replica_pool(i)
+                # aiomysql 的 acquire 包含建连，不能一律用短超时；只有池已占满时才只等一小会儿，
+                # 后面还有别的从库和主库兜底
+                full = not pool.freesize and pool.size >= pool.maxsize
+                conn = await _acquire(pool, REPLICA_CFG["acquire_timeout"] if full else None)
+            except (aiomysql.OperationalError, aiomysql.InterfaceError, OSError):
+                router.mark_down(i)
+                continue
+            except PoolTimeoutError:
+                router.saturated(i)
+                continue
+            replica = i
+            router.acquired(i)
+            break
+        else:
+            router.fell_back()
+    if conn is None:
+        pool = await get_async_pool()
+        conn = await _acquire(pool)
+    try:
+        yield conn
+    except (aiomysql.OperationalError, aiomysql.InterfaceError):
+        # 网络类异常后连接状态不可信，关闭后再归还，池会自动剔除
+        conn.close()
+        raise
+    finally:
+        # 未提交的事务由 aiomysql 在归还时关闭连接处理，不会流到下一个借用者
+        await pool.release(conn)
+        if replica is not None:
+            router.released(replica)
+
+
+async def close_async_pool():
+    """应用关闭时调用，等待借出的连接全部归还后断开"""
+    global _pool
+    pools = list(_replica_pools.values())
+    _replica_pools.clear()
+    if _pool is not None:
+        pools.append(_pool)
+        _pool = None
+    for pool in pools:
+        pool.close()
+        await pool.wait_closed()
+
+
+def _pool_stats(pool: aiomysql.Pool) -> dict:
+    return {
+        "min_size": pool.minsize,
+        "max_size": pool.maxsize,
+        "size": pool.size,
+        "idle": pool.freesize,
+        "in_use": pool.size - pool.freesize,
+    }
+
+
+def async_pool_stats() -> dict:
+    if _pool is None:
+        return {"size": 0, "idle": 0, "in_use": 0}
+    stats = _pool_stats(_pool)
+    if REPLICAS:
+        stats["replicas"] = {router.names[i]: _pool_stats(p) for i, p in _replica_pools.items()}
+    return stats
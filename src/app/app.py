@@ -1,7 +1,17 @@
+from contextlib import asynccontextmanager
+
 import pymysql
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
-from src.config import CFG
+from src.config import CFG, TIMED_CURSOR, PoolTimeoutError
+from src.aio_db import close_async_pool
+from src.pwd_hasher import HasherBusyError, shutdown_hasher
+from src.points_writer import PointsWriterBusyError, shutdown_points_writer
+from src.audit_sink import shutdown_audit_sink
+from src.slow_query import shutdown_slow_query_log
+from src.wechat_client import close_wechat_client
+from src.metrics import MetricsMiddleware
 from src.tools.init_db import init_database
 from src.app.routes import register_routes
 
@@ -28,7 +38,30 @@ def ensure_database():
 ensure_database()
 
 
-app = FastAPI(title="用户中心", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_wechat_client()
+    # 先刷完排队中的积分变动和审计，再关连接池
+    shutdown_points_writer()
+    shutdown_audit_sink()
+    await close_async_pool()
+    shutdown_slow_query_log()
+    shutdown_hasher()
+
+
+app = FastAPI(title="用户中心", version="1.0.0", lifespan=lifespan)
+# 路由级指标；慢查询日志里的当前路由也由它提供
+if TIMED_CURSOR:
+    app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(PoolTimeoutError)
+@app.exception_handler(HasherBusyError)
+@app.exception_handler(PointsWriterBusyError)
+async def overload_handler(request: Request, exc: Exception):
+    # 连接池耗尽属于过载，返回 503 让调用方稍后重试
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 
 register_routes(app)
@@ -1,6 +1,6 @@
 from fastapi import Query
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 from src.user_service import UserStatus
 
@@ -8,7 +8,7 @@ from src.user_service import UserStatus
 class SetStatusReq(BaseModel):
     mobile: str
     new_status: UserStatus = Field(..., description="0-正常 1-冻结 2-注销")
-    reason: str = "后台调整"
+    reason: str = Field("后台调整", max_length=255)
 
 
 class RegisterReq(BaseModel):
@@ -26,11 +26,11 @@ class LoginReq(BaseModel):
 class SetLevelReq(BaseModel):
     mobile: str
     new_level: int = Field(ge=0, le=6)
-    reason: str = "后台手动调整"
+    reason: str = Field("后台手动调整", max_length=255)
 
 
 class AddressReq(BaseModel):
-    mobile: str
+    mobile: Optional[str] = None   # 带了 Bearer token 时可不传
     name: str
     phone: str
     province: str
@@ -45,9 +45,23 @@ class PointsReq(BaseModel):
     mobile: str
     points_type: str = Field(pattern="^(member|merchant)$")
     amount: int
+    reason: str = Field("系统赠送", max_length=255)
+
+
+class PointsBatchRow(BaseModel):
+    # 类型 / 用户在服务层逐行校验，单行出错不影响整批
+    mobile: Optional[str] = None
+    user_id: Optional[int] = None
+    points_type: str = "member"
+    amount: int
     reason: str = "系统赠送"
 
 
+class PointsBatchReq(BaseModel):
+    admin_key: str = Field(..., description="后台口令")
+    rows: List[PointsBatchRow] = Field(..., max_length=200000)
+
+
 class PageQuery(BaseModel):
     page: int = Query(1, ge=1)
     size: int = Query(10, ge=1, le=200)
@@ -80,7 +94,7 @@ class UserInfoResp(BaseModel):
 
 
 class UpdateProfileReq(BaseModel):
-    mobile: str
+    mobile: Optional[str] = None   # 带了 Bearer token 时可不传
     name: Optional[str] = None
     avatar_path: Optional[str] = None
     old_password: Optional[str] = None
@@ -100,15 +114,15 @@ class AdminResetPwdReq(BaseModel):
 
 
 class SelfDeleteReq(BaseModel):
-    mobile: str
+    mobile: Optional[str] = None   # 带了 Bearer token 时可不传
     password: str
-    reason: str = "用户自助注销"
+    reason: str = Field("用户自助注销", max_length=255)
 
 
 class FreezeReq(BaseModel):
     mobile: str
     admin_key: str = Field(..., description="后台口令")
-    reason: str = "后台冻结/解冻"
+    reason: str = Field("后台冻结/解冻", max_length=255)
 
 
 class ResetPasswordReq(BaseModel):
@@ -1,26 +1,83 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
-import uuid
+from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
 import datetime
+from typing import Optional
 
 from src.app.models import (
     SetStatusReq, AuthReq, AuthResp, UpdateProfileReq, SelfDeleteReq,
     FreezeReq, ResetPwdReq, AdminResetPwdReq, SetLevelReq, AddressReq,
-    PointsReq, UserInfoResp
+    PointsReq, PointsBatchReq, UserInfoResp
 )
 
-from src.config import get_conn
-from src.user_service import UserService, UserStatus, verify_pwd, hash_pwd
-from src.address_service import AddressService
-from src.points_service import add_points
-from src.reward_service import TeamRewardService
-from src.director_service import DirectorService
+from src.config import AUTH_CFG, METRICS_CFG, pool_stats, router
+from src.db_router import bind_session_user
+from src.aio_db import aget_conn, async_pool_stats
+from src.user_service import AsyncUserService, UserStatus
+from src.pwd_hasher import verify_pwd_async, hash_pwd_async, hasher_stats
+from src.user_resolver import aresolve_user, invalidate_user, resolver_stats
+from src.profile_cache import aget_profile, invalidate_profiles, profile_cache_stats
+from src.auth import (TokenClaims, token_claims, issue_token, revoke_token, revoke_user_tokens, token_cutoff,
+                      auth_stats)
+from src.address_service import AsyncAddressService
+from src.points_service import add_points_async, bulk_add_points_async, parse_points_csv
+from src.points_writer import points_writer_stats
+from src.audit_sink import audit_entry, ainsert_audit, audit_sink_stats
+from src.slow_query import slow_queries, reset_slow_queries, slow_query_stats
+from src.reward_service import AsyncTeamRewardService
+from src.director_service import AsyncDirectorService
 from src.wechat_service import wechat_login
+from src.wechat_client import wechat_client_stats
+from src.pagination import decode_cursor, keyset_where, keyset_args, next_cursor
+from src.totals import acount_total, alevel_user_total, apoints_log_total, totals_stats
+from src.partitions import prune_range
+from src.referral_tree import TEAM_LIST_SQL
+from src import metrics
+
+_mobile_fallback_warned = False
+
 
 def _err(msg: str):
     raise HTTPException(status_code=400, detail=msg)
 
 
+async def _user_id(claims: Optional[TokenClaims], mobile: Optional[str]) -> int:
+    """取 token 里的 user_id；只有打开 AUTH_ALLOW_MOBILE 兼容开关时，没带 token 的老客户端才按 mobile 查（走缓存）
+    同时记为本次请求的当前用户，他刚写过的数据短时间内从主库读（见 db_router）"""
+    if claims is not None:
+        bind_session_user(claims.user_id)
+        return claims.user_id
+    if not mobile or not AUTH_CFG["allow_mobile"]:
+        raise HTTPException(status_code=401, detail="请先登录", headers={"WWW-Authenticate": "Bearer"})
+    global _mobile_fallback_warned
+    if not _mobile_fallback_warned:
+        _mobile_fallback_warned = True
+        print("⚠️ AUTH_ALLOW_MOBILE 已废弃：仍有请求不带 token 按 mobile 识别用户，老客户端升级后请关闭")
+    u = await aresolve_user(mobile)
+    if not u:
+        _err("用户不存在")
+    bind_session_user(u.id)
+    return u.id
+
+
+def _pool_gauges():
+    sync, aio = pool_stats(), async_pool_stats()
+    for key in ("size", "idle", "in_use"):
+        yield ("sync", key), sync[key]
+        yield ("async", key), aio[key]
+
+
+def _queue_gauges():
+    for name, stats in (("points_writer", points_writer_stats()), ("audit_sink", audit_sink_stats())):
+        if "queue_depth" in stats:
+            yield (name,), stats["queue_depth"]
+
+
+# 已有 stats 的组件在抓取时取值，不在业务路径上额外计数
+metrics.collect("db_pool_connections", "连接池连接数", _pool_gauges, ("pool", "state"))
+metrics.collect("bcrypt_inflight", "bcrypt 排队+计算中的任务数", lambda: [((), hasher_stats()["inflight"])])
+metrics.collect("write_queue_depth", "后台写队列深度", _queue_gauges, ("queue",))
+
+
 def register_routes(app):
     @app.post('/user/wechat_login', summary="微信一键登录")
     async def wechat_login_route(request: Request):
@@ -32,98 +89,117 @@ def register_routes(app):
             raise HTTPException(status_code=400, detail=str(e))
         
     @app.post("/user/set-status", summary="冻结/注销/恢复正常")
-    def set_user_status(body: SetStatusReq):
+    async def set_user_status(body: SetStatusReq):
         try:
-            ok = UserService.set_status(body.mobile, body.new_status, body.reason)
+            ok = await AsyncUserService.set_status(body.mobile, body.new_status, body.reason)
             return {"success": ok}
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
     @app.post("/user/auth", summary="一键登录（不存在则自动注册）")
-    def user_auth(body: AuthReq):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, password_hash, member_level, status FROM users WHERE mobile=%s", (body.mobile,))
-                row = cur.fetchone()
-
-                if row:
-                    if not verify_pwd(body.password, row["password_hash"]):
-                        raise HTTPException(status_code=400, detail="手机号或密码错误")
-                    status = row["status"]
-                    if status == UserStatus.FROZEN:
-                        raise HTTPException(status_code=403, detail="账号已冻结")
-                    if status == UserStatus.DELETED:
-                        raise HTTPException(status_code=403, detail="账号已注销")
-                    token = str(uuid.uuid4())
-                    return AuthResp(uid=row["id"], token=token, level=row["member_level"], is_new=False)
-
-                try:
-                    uid = UserService.register(
-                        mobile=body.mobile,
-                        pwd=body.password,
-                        name=body.name,
-                        referrer_mobile=None
-                    )
-                except ValueError as e:
-                    raise HTTPException(status_code=400, detail=str(e))
-
-                token = str(uuid.uuid4())
-                return AuthResp(uid=uid, token=token, level=0, is_new=True)
+    async def user_auth(body: AuthReq):
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id, password_hash, member_level, status FROM users WHERE mobile=%s", (body.mobile,))
+                row = await cur.fetchone()
+
+        if row:
+            if not await verify_pwd_async(body.password, row["password_hash"]):
+                raise HTTPException(status_code=400, detail="手机号或密码错误")
+            status = row["status"]
+            if status == UserStatus.FROZEN:
+                raise HTTPException(status_code=403, detail="账号已冻结")
+            if status == UserStatus.DELETED:
+                raise HTTPException(status_code=403, detail="账号已注销")
+            token = issue_token(row["id"])
+            return AuthResp(uid=row["id"], token=token, level=row["member_level"], is_new=False)
+
+        try:
+            uid = await AsyncUserService.register(
+                mobile=body.mobile,
+                pwd=body.password,
+                name=body.name,
+                referrer_mobile=None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        token = issue_token(uid)
+        return AuthResp(uid=uid, token=token, level=0, is_new=True)
+
+    @app.post("/user/logout", summary="退出登录（作废当前 token）")
+    async def logout(claims: Optional[TokenClaims] = Depends(token_claims)):
+        if claims is None:
+            raise HTTPException(status_code=401, detail="请先登录", headers={"WWW-Authenticate": "Bearer"})
+        revoke_token(claims)
+        return {"msg": "ok"}
 
     @app.post("/user/update-profile", summary="修改资料（昵称/头像/密码）")
-    def update_profile(body: UpdateProfileReq):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, password_hash FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
+    async def update_profile(body: UpdateProfileReq, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, body.mobile)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id, password_hash FROM users WHERE id=%s", (uid,))
+                u = await cur.fetchone()
                 if not u:
                     raise HTTPException(status_code=404, detail="用户不存在")
 
                 if body.new_password:
                     if not body.old_password:
                         raise HTTPException(status_code=400, detail="请提供旧密码")
-                    if not verify_pwd(body.old_password, u["password_hash"]):
+                    if not await verify_pwd_async(body.old_password, u["password_hash"]):
                         raise HTTPException(status_code=400, detail="旧密码错误")
-                    new_hash = hash_pwd(body.new_password)
-                    cur.execute("UPDATE users SET password_hash=%s WHERE id=%s", (new_hash, u["id"]))
+                    new_hash = await hash_pwd_async(body.new_password)
+                    # 改密后其它设备上的登录全部作废：截止时间随改密一起落库，提交成功后再清本进程缓存
+                    await cur.execute("UPDATE users SET password_hash=%s, token_valid_after=%s WHERE id=%s",
+                                      (new_hash, token_cutoff(), u["id"]))
 
                 if body.name is not None:
-                    cur.execute("UPDATE users SET name=%s WHERE id=%s", (body.name, u["id"]))
+                    await cur.execute("UPDATE users SET name=%s WHERE id=%s", (body.name, u["id"]))
                 if body.avatar_path is not None:
-                    cur.execute("UPDATE users SET avatar_path=%s WHERE id=%s", (body.avatar_path, u["id"]))
+                    await cur.execute("UPDATE users SET avatar_path=%s WHERE id=%s", (body.avatar_path, u["id"]))
 
-                conn.commit()
+                await conn.commit()
+        if body.new_password:
+            revoke_user_tokens(uid)
+        invalidate_profiles(uid)
         return {"msg": "ok"}
 
     @app.post("/user/self-delete", summary="用户自助注销账号")
-    def self_delete(body: SelfDeleteReq):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, password_hash, status FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
+    async def self_delete(body: SelfDeleteReq, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, body.mobile)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id, mobile, password_hash, status FROM users WHERE id=%s", (uid,))
+                u = await cur.fetchone()
                 if not u:
                     raise HTTPException(status_code=404, detail="用户不存在")
 
-                if not verify_pwd(body.password, u["password_hash"]):
+                if not await verify_pwd_async(body.password, u["password_hash"]):
                     raise HTTPException(status_code=403, detail="密码错误")
 
-                cur.execute(
-                    "INSERT INTO audit_log(user_id, op_type, old_val, new_val, reason) VALUES (%s,'SELF_DELETE',%s,%s,%s)",
-                    (u["id"], int(u["status"]), int(UserStatus.DELETED), body.reason)
-                )
-                cur.execute("UPDATE users SET status=%s WHERE id=%s", (int(UserStatus.DELETED), u["id"]))
-                conn.commit()
+                # 注销和审计同一事务提交
+                await conn.begin()
+                await ainsert_audit(cur, [audit_entry(u["id"], "SELF_DELETE", u["status"], UserStatus.DELETED,
+                                                      body.reason)])
+                await cur.execute("UPDATE users SET status=%s, token_valid_after=%s WHERE id=%s",
+                                  (int(UserStatus.DELETED), token_cutoff(), u["id"]))
+                await conn.commit()
+        invalidate_user(u["mobile"])
+        invalidate_profiles(u["id"])
+        revoke_user_tokens(u["id"])
         return {"msg": "账号已注销"}
 
     @app.put("/user/freeze", summary="后台冻结用户")
-    def freeze_user(body: FreezeReq):
+    async def freeze_user(body: FreezeReq):
         if body.admin_key != "admin2025":
             raise HTTPException(status_code=403, detail="后台口令错误")
 
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, status FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await cur.execute("SELECT id, status FROM users WHERE mobile=%s FOR UPDATE", (body.mobile,))
+                u = await cur.fetchone()
                 if not u:
                     raise HTTPException(status_code=404, detail="用户不存在")
                 if u["status"] == UserStatus.DELETED:
@@ -133,23 +209,26 @@ def register_routes(app):
                 if u["status"] == new_status:
                     return {"msg": "已是冻结状态"}
 
-                cur.execute(
-                    "INSERT INTO audit_log(user_id, op_type, old_val, new_val, reason) VALUES (%s,'FREEZE',%s,%s,%s)",
-                    (u["id"], u["status"], new_status, body.reason)
-                )
-                cur.execute("UPDATE users SET status=%s WHERE id=%s", (new_status, u["id"]))
-                conn.commit()
+                # 冻结前签发的 token 解冻后也不再有效
+                await cur.execute("UPDATE users SET status=%s, token_valid_after=%s WHERE id=%s",
+                                  (new_status, token_cutoff(), u["id"]))
+                await ainsert_audit(cur, [audit_entry(u["id"], "FREEZE", u["status"], new_status, body.reason)])
+                await conn.commit()
+        invalidate_user(body.mobile)
+        invalidate_profiles(u["id"])
+        revoke_user_tokens(u["id"])
         return {"msg": "已冻结"}
 
     @app.put("/user/unfreeze", summary="后台解冻用户")
-    def unfreeze_user(body: FreezeReq):
+    async def unfreeze_user(body: FreezeReq):
         if body.admin_key != "admin2025":
             raise HTTPException(status_code=403, detail="后台口令错误")
 
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, status FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await cur.execute("SELECT id, status FROM users WHERE mobile=%s FOR UPDATE", (body.mobile,))
+                u = await cur.fetchone()
                 if not u:
                     raise HTTPException(status_code=404, detail="用户不存在")
 
@@ -157,147 +236,96 @@ def register_routes(app):
                 if u["status"] == new_status:
                     return {"msg": "已是正常状态"}
 
-                cur.execute(
-                    "INSERT INTO audit_log(user_id, op_type, old_val, new_val, reason) VALUES (%s,'UNFREEZE',%s,%s,%s)",
-                    (u["id"], u["status"], new_status, body.reason)
-                )
-                cur.execute("UPDATE users SET status=%s WHERE id=%s", (new_status, u["id"]))
-                conn.commit()
+                await cur.execute("UPDATE users SET status=%s WHERE id=%s", (new_status, u["id"]))
+                await ainsert_audit(cur, [audit_entry(u["id"], "UNFREEZE", u["status"], new_status, body.reason)])
+                await conn.commit()
+        invalidate_user(body.mobile)
+        invalidate_profiles(u["id"])
         return {"msg": "已解冻"}
 
     @app.post("/user/reset-password", summary="找回密码（短信验证）")
-    def reset_password(body: ResetPwdReq):
+    async def reset_password(body: ResetPwdReq):
         if body.sms_code != "111111":
             raise HTTPException(status_code=400, detail="验证码错误")
 
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
-                if not u:
-                    raise HTTPException(status_code=404, detail="手机号未注册")
-
-                new_hash = hash_pwd(body.new_password)
-                cur.execute("UPDATE users SET password_hash=%s WHERE id=%s", (new_hash, u["id"]))
-                conn.commit()
+        u = await aresolve_user(body.mobile)
+        if not u:
+            raise HTTPException(status_code=404, detail="手机号未注册")
+
+        new_hash = await hash_pwd_async(body.new_password)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("UPDATE users SET password_hash=%s, token_valid_after=%s WHERE id=%s",
+                                  (new_hash, token_cutoff(), u.id))
+                await conn.commit()
+        revoke_user_tokens(u.id)
         return {"msg": "密码已重置"}
 
     @app.put("/admin/user/reset-pwd", summary="后台重置用户密码")
-    def admin_reset_password(body: AdminResetPwdReq):
+    async def admin_reset_password(body: AdminResetPwdReq):
         if body.admin_key != "admin2025":
             raise HTTPException(status_code=403, detail="后台口令错误")
 
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
-                if not u:
-                    raise HTTPException(status_code=404, detail="用户不存在")
-
-                new_hash = hash_pwd(body.new_password)
-                cur.execute("UPDATE users SET password_hash=%s WHERE id=%s", (new_hash, u["id"]))
-                cur.execute(
-                    "INSERT INTO audit_log(user_id, op_type, old_val, new_val, reason) VALUES (%s,'RESET_PWD',0,1,'后台重置')",
-                    (u["id"],)
-                )
-                conn.commit()
+        u = await aresolve_user(body.mobile)
+        if not u:
+            raise HTTPException(status_code=404, detail="用户不存在")
+
+        new_hash = await hash_pwd_async(body.new_password)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await cur.execute("UPDATE users SET password_hash=%s, token_valid_after=%s WHERE id=%s",
+                                  (new_hash, token_cutoff(), u.id))
+                await ainsert_audit(cur, [audit_entry(u.id, "RESET_PWD", 0, 1, "后台重置")])
+                await conn.commit()
+        revoke_user_tokens(u.id)
         return {"msg": "密码已重置"}
 
     @app.post("/user/upgrade", summary="升 1 星")
-    def upgrade(mobile: str):
+    async def upgrade(mobile: str):
         try:
-            new_lv = UserService.upgrade_one_star(mobile)
+            new_lv = await AsyncUserService.upgrade_one_star(mobile)
             return {"new_level": new_lv}
         except ValueError as e:
             _err(str(e))
 
     @app.post("/user/set-level", summary="后台调星")
-    def set_level(body: SetLevelReq):
+    async def set_level(body: SetLevelReq):
         try:
-            old = UserService.set_level(body.mobile, body.new_level, body.reason)
+            old = await AsyncUserService.set_level(body.mobile, body.new_level, body.reason)
             return {"old_level": old, "new_level": body.new_level}
         except ValueError as e:
             _err(str(e))
 
     @app.get("/user/info", summary="用户详情（个人中心）", response_model=UserInfoResp)
-    def user_info(mobile: str):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT id, mobile, name, avatar_path, member_level, referral_code "
-                    "FROM users WHERE mobile=%s AND status != %s",
-                    (mobile, UserStatus.DELETED.value)
-                )
-                u = cur.fetchone()
-                if not u:
-                    raise HTTPException(status_code=404, detail="用户不存在或已注销")
-
-                cur.execute(
-                    "SELECT ru.mobile, ru.name, ru.member_level "
-                    "FROM user_referrals r JOIN users ru ON ru.id=r.referrer_id "
-                    "WHERE r.user_id=%s",
-                    (u["id"],)
-                )
-                referrer = cur.fetchone()
-
-                cur.execute(
-                    "SELECT COUNT(*) AS c FROM user_referrals WHERE referrer_id=%s",
-                    (u["id"],)
-                )
-                direct_count = cur.fetchone()["c"]
-
-                cur.execute(
-                    """
-                    WITH RECURSIVE team AS (
-                        SELECT id, 0 AS layer FROM users WHERE id=%s
-                        UNION ALL
-                        SELECT r.user_id, t.layer + 1
-                        FROM user_referrals r
-                        JOIN team t ON t.id = r.referrer_id
-                        WHERE t.layer < 6
-                    )
-                    SELECT COUNT(*) - 1 AS c FROM team
-                    """,
-                    (u["id"],)
-                )
-                team_total = cur.fetchone()["c"]
-
-                cur.execute(
-                    "SELECT member_points, merchant_points, withdrawable_balance "
-                    "FROM users WHERE id=%s",
-                    (u["id"],)
-                )
-                assets = cur.fetchone()
-
-        return UserInfoResp(
-            uid=u["id"],
-            mobile=u["mobile"],
-            name=u["name"],
-            avatar_path=u["avatar_path"],
-            member_level=u["member_level"],
-            referral_code=u["referral_code"],
-            direct_count=direct_count,
-            team_total=team_total,
-            assets={
-                "member_points": assets["member_points"],
-                "merchant_points": assets["merchant_points"],
-                "withdrawable_balance": assets["withdrawable_balance"]
-            },
-            referrer=referrer
-        )
+    async def user_info(mobile: str = None, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        profile = await aget_profile(uid)
+        if not profile:
+            raise HTTPException(status_code=404, detail="用户不存在或已注销")
+        return UserInfoResp(**profile)
 
     @app.get("/user/list", summary="分页列表+筛选")
-    def user_list(
+    async def user_list(
         id_start: int = None,
         id_end: int = None,
         level_start: int = 0,
         level_end: int = 6,
         page: int = 1,
         size: int = 20,
+        cursor: str = None,
+        approximate: bool = False,
     ):
         if level_start > level_end or (id_start is not None and id_end is not None and id_start > id_end):
             _err("区间左值不能大于右值")
         where, args = [], []
+        if cursor:
+            try:
+                (after_id,) = decode_cursor(cursor, (int,))
+            except ValueError as e:
+                _err(str(e))
+            where.append("id > %s")
+            args.append(after_id)
         if id_start is not None:
             where.append("id >= %s")
             args.append(id_start)
@@ -307,280 +335,413 @@ def register_routes(app):
         where.append("member_level BETWEEN %s AND %s")
         args.extend([level_start, level_end])
         sql_where = "WHERE " + " AND ".join(where) if where else ""
-        limit_sql = "LIMIT %s OFFSET %s"
-        args.extend([size, (page - 1) * size])
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute(f"SELECT id, mobile, name, member_level, created_at FROM users {sql_where} ORDER BY id {limit_sql}", args)
-                rows = cur.fetchall()
-                cur.execute(f"SELECT COUNT(*) AS c FROM users {sql_where}", args[:-2])
-                total = cur.fetchone()["c"]
-                return {"rows": rows, "total": total, "page": page, "size": size}
+        limit_sql = "LIMIT %s" if cursor else "LIMIT %s OFFSET %s"
+        args.extend([size] if cursor else [size, (page - 1) * size])
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"SELECT id, mobile, name, member_level, created_at FROM users {sql_where} ORDER BY id {limit_sql}", args)
+                rows = await cur.fetchall()
+                nxt = next_cursor(rows, size, ("id",))
+                if cursor:
+                    return {"rows": rows, "size": size, "next_cursor": nxt}
+                # 只按等级筛选时直接读计数器
+                if id_start is None and id_end is None:
+                    total, exact = await alevel_user_total(cur, level_start, level_end)
+                else:
+                    total, exact = await acount_total(cur, f"users {sql_where}", args[:-2], approximate)
+                return {"rows": rows, "total": total, "total_exact": exact, "page": page, "size": size,
+                        "next_cursor": nxt}
 
     @app.post("/user/bind-referrer", summary="绑定推荐人")
-    def bind_referrer(mobile: str, referrer_mobile: str):
+    async def bind_referrer(mobile: str, referrer_mobile: str):
         try:
-            UserService.bind_referrer(mobile, referrer_mobile)
+            await AsyncUserService.bind_referrer(mobile, referrer_mobile)
             return {"msg": "ok"}
         except ValueError as e:
             _err(str(e))
 
     @app.get("/user/refer-direct", summary="直推列表")
-    def refer_direct(mobile: str, page: int = 1, size: int = 10):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u:
-                    _err("用户不存在")
-                cur.execute("SELECT COUNT(*) AS c FROM user_referrals WHERE referrer_id=%s", (u["id"],))
-                total = cur.fetchone()["c"]
-                cur.execute("""
-                    SELECT u.id, u.mobile, u.name, u.member_level, u.created_at
+    async def refer_direct(mobile: str = None, page: int = 1, size: int = 10, cursor: str = None,
+                           claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        where, args = ["r.referrer_id=%s"], [uid]
+        if cursor:
+            try:
+                after = decode_cursor(cursor, (datetime.datetime, int))
+            except ValueError as e:
+                _err(str(e))
+            where.append(keyset_where(("r.created_at", "r.user_id")))
+            args.extend(keyset_args(after))
+        limit_sql = "LIMIT %s" if cursor else "LIMIT %s OFFSET %s"
+        args.extend([size] if cursor else [size, (page - 1) * size])
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                # 排序键全在 user_referrals 上，走 idx_referrer_dt 按索引顺序读 size 行再回表 users
+                await cur.execute(f"""
+                    SELECT u.id, u.mobile, u.name, u.member_level, u.created_at, r.created_at AS referred_at
                     FROM user_referrals r
                     JOIN users u ON u.id = r.user_id
-                    WHERE r.referrer_id=%s
-                    ORDER BY u.created_at DESC
-                    LIMIT %s OFFSET %s
-                """, (u["id"], size, (page - 1) * size))
-                rows = cur.fetchall()
-                return {"rows": rows, "total": total, "page": page, "size": size}
-
-    @app.get("/user/refer-team", summary="团队列表（递归）")
-    def refer_team(mobile: str, max_layer: int = 6):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    WITH RECURSIVE team AS (
-                        SELECT id, mobile, name, member_level, 0 AS layer FROM users WHERE mobile=%s
-                        UNION ALL
-                        SELECT u.id, u.mobile, u.name, u.member_level, t.layer + 1
-                        FROM user_referrals r
-                        JOIN users u ON u.id = r.user_id
-                        JOIN team t ON t.id = r.referrer_id
-                        WHERE t.layer < %s
-                    )
-                    SELECT id, mobile, name, member_level, layer
-                    FROM team
-                    WHERE layer > 0
-                    ORDER BY layer, id
-                """, (mobile, max_layer))
-                rows = cur.fetchall()
+                    WHERE {" AND ".join(where)}
+                    ORDER BY r.created_at DESC, r.user_id DESC
+                    {limit_sql}
+                """, args)
+                rows = await cur.fetchall()
+                nxt = next_cursor(rows, size, ("referred_at", "id"))
+                if cursor:
+                    return {"rows": rows, "size": size, "next_cursor": nxt}
+                await cur.execute("SELECT COUNT(*) AS c FROM user_referrals WHERE referrer_id=%s", (uid,))
+                total = (await cur.fetchone())["c"]
+                return {"rows": rows, "total": total, "page": page, "size": size, "next_cursor": nxt}
+
+    @app.get("/user/refer-team", summary="团队列表（闭包表）")
+    async def refer_team(mobile: str = None, max_layer: int = 6,
+                         claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(TEAM_LIST_SQL, (uid, max_layer))
+                rows = await cur.fetchall()
                 return {"rows": rows}
 
     # 地址模块
     @app.post("/address", summary="新增地址")
-    def address_add(body: AddressReq):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
-                if not u:
-                    _err("用户不存在")
-                addr_id = AddressService.add_address(
-                    u["id"], body.name, body.phone, body.province, body.city,
-                    body.district, body.detail, body.is_default, body.addr_type
-                )
-                return {"addr_id": addr_id}
+    async def address_add(body: AddressReq, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, body.mobile)
+        addr_id = await AsyncAddressService.add_address(
+            uid, body.name, body.phone, body.province, body.city,
+            body.district, body.detail, body.is_default, body.addr_type
+        )
+        return {"addr_id": addr_id}
 
     @app.put("/address/default", summary="把已有地址设为默认")
-    def set_default_addr(addr_id: int, mobile: str):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT user_id FROM addresses WHERE id=%s", (addr_id,))
-                row = cur.fetchone()
+    async def set_default_addr(addr_id: int, mobile: str = None, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT user_id FROM addresses WHERE id=%s", (addr_id,))
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="地址不存在")
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u or u["id"] != row["user_id"]:
+                if uid != row["user_id"]:
                     raise HTTPException(status_code=403, detail="地址不属于当前用户")
 
-                cur.execute("UPDATE addresses SET is_default=0 WHERE user_id=%s", (u["id"],))
-                cur.execute("UPDATE addresses SET is_default=1 WHERE id=%s", (addr_id,))
-                conn.commit()
+                await cur.execute("UPDATE addresses SET is_default=0 WHERE user_id=%s", (uid,))
+                await cur.execute("UPDATE addresses SET is_default=1 WHERE id=%s", (addr_id,))
+                await conn.commit()
         return {"msg": "ok"}
 
     @app.delete("/address/{addr_id}", summary="删除地址")
-    def delete_addr(addr_id: int, mobile: str):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT user_id FROM addresses WHERE id=%s", (addr_id,))
-                row = cur.fetchone()
+    async def delete_addr(addr_id: int, mobile: str = None, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT user_id FROM addresses WHERE id=%s", (addr_id,))
+                row = await cur.fetchone()
                 if not row:
                     raise HTTPException(status_code=404, detail="地址不存在")
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u or u["id"] != row["user_id"]:
+                if uid != row["user_id"]:
                     raise HTTPException(status_code=403, detail="地址不属于当前用户")
 
-                cur.execute("DELETE FROM addresses WHERE id=%s", (addr_id,))
-                conn.commit()
+                await cur.execute("DELETE FROM addresses WHERE id=%s", (addr_id,))
+                await conn.commit()
         return {"msg": "ok"}
 
     @app.get("/address/list", summary="地址列表")
-    def address_list(mobile: str, page: int = 1, size: int = 5):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u:
-                    _err("用户不存在")
-                rows = AddressService.get_address_list(u["id"], page, size)
-                return {"rows": rows}
+    async def address_list(mobile: str = None, page: int = 1, size: int = 5,
+                           claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        rows = await AsyncAddressService.get_address_list(uid, page, size)
+        return {"rows": rows}
 
     @app.post("/address/return", summary="商家设置退货地址")
-    def return_addr_set(body: AddressReq):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (body.mobile,))
-                u = cur.fetchone()
-                if not u:
-                    _err("商家不存在")
-                addr_id = AddressService.add_address(
-                    u["id"], body.name, body.phone, body.province, body.city,
-                    body.district, body.detail, is_default=True, addr_type="return"
-                )
-                return {"addr_id": addr_id}
+    async def return_addr_set(body: AddressReq, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, body.mobile)
+        addr_id = await AsyncAddressService.add_address(
+            uid, body.name, body.phone, body.province, body.city,
+            body.district, body.detail, is_default=True, addr_type="return"
+        )
+        return {"addr_id": addr_id}
 
     @app.get("/address/return", summary="查看退货地址")
-    def return_addr_get(mobile: str):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u:
-                    _err("商家不存在")
-                addr = AddressService.get_default_address(u["id"])
-                if not addr:
-                    _err("未设置退货地址")
-                return addr
+    async def return_addr_get(mobile: str = None, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        addr = await AsyncAddressService.get_default_address(uid)
+        if not addr:
+            _err("未设置退货地址")
+        return addr
 
     # 积分模块
     @app.post("/points", summary="增减积分")
-    def points(body: PointsReq):
+    async def points(body: PointsReq):
         try:
-            with get_conn() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT id FROM users WHERE mobile=%s", (body.mobile,))
-                    row = cur.fetchone()
-                    if not row:
-                        raise HTTPException(status_code=404, detail="用户不存在")
-                    user_id = row["id"]
-            add_points(user_id, body.points_type, body.amount, body.reason)
+            u = await aresolve_user(body.mobile)
+            if not u:
+                raise HTTPException(status_code=404, detail="用户不存在")
+            await add_points_async(u.id, body.points_type, body.amount, body.reason)
             return {"msg": "ok"}
         except ValueError as e:
             _err(str(e))
 
+    @app.post("/points/batch", summary="批量增减积分（活动发放）")
+    async def points_batch(body: PointsBatchReq, chunk: int = 1000):
+        if body.admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        if chunk <= 0:
+            _err("chunk 必须大于 0")
+        return await bulk_add_points_async([r.model_dump() for r in body.rows], chunk)
+
+    @app.post("/points/batch/csv", summary="批量增减积分（请求体为 CSV 文件内容）")
+    async def points_batch_csv(request: Request, admin_key: str, chunk: int = 1000):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        if chunk <= 0:
+            _err("chunk 必须大于 0")
+        try:
+            rows = parse_points_csv((await request.body()).decode("utf-8"))
+        except (UnicodeDecodeError, ValueError) as e:
+            _err(f"CSV 解析失败：{e}")
+        return await bulk_add_points_async(rows, chunk)
+
     @app.get("/points/balance", summary="积分余额")
-    def points_balance(mobile: str):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT member_points, merchant_points, withdrawable_balance FROM users WHERE mobile=%s", (mobile,))
-                row = cur.fetchone()
+    async def points_balance(mobile: str = None, claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT member_points, merchant_points, withdrawable_balance FROM users WHERE id=%s", (uid,))
+                row = await cur.fetchone()
                 if not row:
                     _err("用户不存在")
                 return row
 
     @app.get("/points/log", summary="积分流水")
-    def points_log(mobile: str, points_type: str = "member", page: int = 1, size: int = 10):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u:
-                    _err("用户不存在")
-                where, args = ["user_id=%s", "points_type=%s"], [u["id"], points_type]
-                sql_where = " AND ".join(where)
-                sql = f"""
-                    SELECT change_amount, reason, related_order, created_at
-                    FROM points_log
-                    WHERE {sql_where}
-                    ORDER BY created_at DESC
-                    LIMIT %s OFFSET %s
-                """
-                args.extend([size, (page - 1) * size])
-                cur.execute(sql, args)
-                rows = cur.fetchall()
-                cur.execute(f"SELECT COUNT(*) AS c FROM points_log WHERE {sql_where}", args[:-2])
-                total = cur.fetchone()["c"]
-                return {"rows": rows, "total": total, "page": page, "size": size}
+    async def points_log(mobile: str = None, points_type: str = "member", page: int = 1, size: int = 10,
+                         cursor: str = None, start: datetime.date = None, end: datetime.date = None,
+                         claims: Optional[TokenClaims] = Depends(token_claims)):
+        if start and end and end < start:
+            _err("结束日期不能早于开始日期")
+        uid = await _user_id(claims, mobile)
+        # 带日期范围时只扫命中的月分区
+        ranged, range_args = prune_range("created_at", start, end)
+        where, args = ["user_id=%s", "points_type=%s", *ranged], [uid, points_type, *range_args]
+        count_where, count_args = " AND ".join(where), list(args)
+        if cursor:
+            try:
+                after = decode_cursor(cursor, (datetime.datetime, int))
+            except ValueError as e:
+                _err(str(e))
+            where.append(keyset_where(("created_at", "id")))
+            args.extend(keyset_args(after))
+        sql = f"""
+            SELECT id, change_amount, reason, related_order, created_at
+            FROM points_log
+            WHERE {" AND ".join(where)}
+            ORDER BY created_at DESC, id DESC
+            {"LIMIT %s" if cursor else "LIMIT %s OFFSET %s"}
+        """
+        args.extend([size] if cursor else [size, (page - 1) * size])
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, args)
+                rows = await cur.fetchall()
+                nxt = next_cursor(rows, size, ("created_at", "id"))
+                if cursor:
+                    return {"rows": rows, "size": size, "next_cursor": nxt}
+                if ranged:
+                    total, exact = await acount_total(cur, f"points_log WHERE {count_where}", count_args)
+                else:
+                    total, exact = await apoints_log_total(cur, uid, points_type)
+                return {"rows": rows, "total": total, "total_exact": exact, "page": page, "size": size,
+                        "next_cursor": nxt}
 
     # 团队奖励模块
     @app.get("/reward/list", summary="我的团队奖励")
-    def reward_list(mobile: str, page: int = 1, size: int = 10):
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u:
-                    _err("用户不存在")
-                rows = TeamRewardService.get_reward_list_by_user(u["id"], page, size)
-                return {"rows": rows}
+    async def reward_list(mobile: str = None, page: int = 1, size: int = 10, cursor: str = None,
+                          claims: Optional[TokenClaims] = Depends(token_claims)):
+        uid = await _user_id(claims, mobile)
+        try:
+            rows = await AsyncTeamRewardService.get_reward_list_by_user(uid, page, size, cursor)
+        except ValueError as e:
+            _err(str(e))
+        return {"rows": rows, "next_cursor": next_cursor(rows, size, ("created_at", "id"))}
 
     @app.get("/reward/by-order/{order_id}", summary="按订单查看奖励")
-    def reward_by_order(order_id: int):
-        rows = TeamRewardService.get_reward_by_order(order_id)
+    async def reward_by_order(order_id: int):
+        rows = await AsyncTeamRewardService.get_reward_by_order(order_id)
         return {"rows": rows}
 
     # 董事模块
     @app.post("/director/try-promote", summary="晋升荣誉董事")
-    def director_try_promote(user_id: int):
-        ok = DirectorService.try_promote(user_id)
+    async def director_try_promote(user_id: int):
+        ok = await AsyncDirectorService.try_promote(user_id)
         return {"success": ok}
 
     @app.get("/director/is", summary="是否荣誉董事")
-    def director_is(user_id: int):
-        return {"is_director": DirectorService.is_director(user_id)}
+    async def director_is(user_id: int):
+        return {"is_director": await AsyncDirectorService.is_director(user_id)}
 
     @app.get("/director/dividend", summary="分红明细")
-    def director_dividend(user_id: int, page: int = 1, size: int = 10):
-        rows = DirectorService.get_dividend_detail(user_id, page, size)
-        return {"rows": rows}
+    async def director_dividend(user_id: int, page: int = 1, size: int = 10, cursor: str = None):
+        try:
+            rows = await AsyncDirectorService.get_dividend_detail(user_id, page, size, cursor)
+        except ValueError as e:
+            _err(str(e))
+        return {"rows": rows, "next_cursor": next_cursor(rows, size, ("period_date", "id"))}
 
     @app.get("/director/list", summary="所有活跃董事")
-    def director_list(page: int = 1, size: int = 10):
-        rows = DirectorService.list_all_directors(page, size)
-        return {"rows": rows}
+    async def director_list(page: int = 1, size: int = 10, cursor: str = None):
+        try:
+            rows = await AsyncDirectorService.list_all_directors(page, size, cursor)
+        except ValueError as e:
+            _err(str(e))
+        return {"rows": rows, "next_cursor": next_cursor(rows, size, ("id",))}
+
+    @app.post("/admin/director/promote-all", summary="批量晋升荣誉董事（每周跑一次）")
+    async def director_promote_all(admin_key: str, chunk: int = 1000):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        if chunk <= 0:
+            _err("chunk 必须大于 0")
+        return await AsyncDirectorService.promote_all(chunk)
+
+    @app.get("/director/sales", summary="平台业绩（按天汇总）")
+    async def director_sales(start: datetime.date, end: datetime.date):
+        if end < start:
+            _err("结束日期不能早于开始日期")
+        return {"start": start, "end": end, "sales": await AsyncDirectorService.get_sales(start, end)}
 
     @app.post("/director/calc-week", summary="手动触发周分红（仅内部）")
-    def director_calc_week(period: datetime.date):
-        total_paid = DirectorService.calc_week_dividend(period)
+    async def director_calc_week(period: datetime.date):
+        total_paid = await AsyncDirectorService.calc_week_dividend(period)
         return {"total_paid": total_paid}
 
     # 审计日志
     @app.get("/audit", summary="等级变动审计")
-    def audit_list(mobile: str = None, page: int = 1, size: int = 10):
-        where, args = "", []
+    async def audit_list(mobile: str = None, page: int = 1, size: int = 10, cursor: str = None,
+                         approximate: bool = False, start: datetime.date = None, end: datetime.date = None):
+        if start and end and end < start:
+            _err("结束日期不能早于开始日期")
+        where, args = [], []
         if mobile:
-            where = "WHERE u.mobile=%s"
-            args.append(mobile)
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                count_sql = f"SELECT COUNT(*) AS c FROM audit_log a JOIN users u ON u.id=a.user_id {where}"
-                cur.execute(count_sql, args)
-                total = cur.fetchone()["c"]
+            u = await aresolve_user(mobile)
+            if not u:
+                return {"rows": [], "total": 0, "total_exact": True, "page": page, "size": size, "next_cursor": None}
+            where.append("a.user_id=%s")
+            args.append(u.id)
+        ranged, range_args = prune_range("a.created_at", start, end)
+        where.extend(ranged)
+        args.extend(range_args)
+        # 统计不需要 join users，沿用同一组带别名的条件
+        count_from = f"audit_log a WHERE {' AND '.join(where)}" if where else "audit_log a"
+        count_args = list(args)
+        if cursor:
+            try:
+                after = decode_cursor(cursor, (datetime.datetime, int))
+            except ValueError as e:
+                _err(str(e))
+            where.append(keyset_where(("a.created_at", "a.id")))
+            args.extend(keyset_args(after))
+        sql_where = ("WHERE " + " AND ".join(where)) if where else ""
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
                 sql = f"""
-                    SELECT u.mobile, a.old_val, a.new_val, a.reason, a.created_at
+                    SELECT a.id, u.mobile, a.old_val, a.new_val, a.reason, a.created_at
                     FROM audit_log a
                     JOIN users u ON u.id=a.user_id
-                    {where}
-                    ORDER BY a.created_at DESC
-                    LIMIT %s OFFSET %s
+                    {sql_where}
+                    ORDER BY a.created_at DESC, a.id DESC
+                    {"LIMIT %s" if cursor else "LIMIT %s OFFSET %s"}
                 """
-                args.extend([size, (page - 1) * size])
-                cur.execute(sql, args)
-                rows = cur.fetchall()
-                return {"rows": rows, "total": total, "page": page, "size": size}
+                args.extend([size] if cursor else [size, (page - 1) * size])
+                await cur.execute(sql, args)
+                rows = await cur.fetchall()
+                nxt = next_cursor(rows, size, ("created_at", "id"))
+                if cursor:
+                    return {"rows": rows, "size": size, "next_cursor": nxt}
+                total, exact = await acount_total(cur, count_from, count_args, approximate)
+                return {"rows": rows, "total": total, "total_exact": exact, "page": page, "size": size,
+                        "next_cursor": nxt}
 
     @app.post("/user/grant-merchant", summary="后台赋予商户身份")
-    def grant_merchant(mobile: str, admin_key: str):
+    async def grant_merchant(mobile: str, admin_key: str):
         if admin_key != "gm2025":
             raise HTTPException(status_code=403, detail="口令错误")
-        if UserService.grant_merchant(mobile):
+        if await AsyncUserService.grant_merchant(mobile):
                 return {"msg": "已赋予商户身份"}
         raise HTTPException(status_code=404, detail="用户不存在")
 
     @app.get("/user/is-merchant", summary="查询是否商户")
-    def is_merchant(mobile: str):
-        return {"is_merchant": UserService.is_merchant(mobile)}
+    async def is_merchant(mobile: str):
+        return {"is_merchant": await AsyncUserService.is_merchant(mobile)}
+
+    @app.get("/admin/db/pool-stats", summary="数据库连接池状态")
+    async def db_pool_stats(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return {"sync": pool_stats(), "async": async_pool_stats(), "routing": router.stats()}
+
+    @app.get("/metrics", summary="Prometheus 指标", include_in_schema=False)
+    async def prometheus_metrics(token: str = ""):
+        if METRICS_CFG["token"] and token != METRICS_CFG["token"]:
+            raise HTTPException(status_code=403, detail="指标令牌错误")
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.get("/admin/resolver-stats", summary="手机号→用户 id 缓存命中率")
+    async def user_resolver_stats(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return resolver_stats()
+
+    @app.get("/admin/hasher-stats", summary="bcrypt 计算池状态与耗时")
+    async def pwd_hasher_stats(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return hasher_stats()
+
+    @app.get("/admin/points-writer-stats", summary="积分组提交队列状态")
+    async def points_writer_state(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return points_writer_stats()
+
+    @app.get("/admin/audit-sink-stats", summary="审计缓冲队列状态")
+    async def audit_sink_state(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return audit_sink_stats()
+
+    @app.get("/admin/slow-queries", summary="慢查询排行（按语句指纹，含最近一次 EXPLAIN）")
+    async def slow_query_top(admin_key: str, limit: int = 20, order: str = "total", reset: bool = False):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        try:
+            rows = slow_queries(limit, order)
+        except ValueError as e:
+            _err(str(e))
+        stats = slow_query_stats()
+        if reset:
+            reset_slow_queries()
+        return {"stats": stats, "top": rows}
+
+    @app.get("/admin/totals-stats", summary="分页总数缓存命中率")
+    async def totals_cache_stats(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return totals_stats()
+
+    @app.get("/admin/wechat-stats", summary="微信接口调用统计与熔断状态")
+    async def wechat_stats(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return wechat_client_stats()
+
+    @app.get("/admin/auth-stats", summary="登录 token 校验缓存与黑名单")
+    async def token_auth_stats(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return auth_stats()
+
+    @app.get("/admin/profile-cache-stats", summary="个人中心缓存命中率")
+    async def profile_stats(admin_key: str):
+        if admin_key != "admin2025":
+            raise HTTPException(status_code=403, detail="后台口令错误")
+        return profile_cache_stats()
@@ -0,0 +1,335 @@
+"""
+审计日志缓冲写
+业务提交后调用 record_audit / arecord_audit 把审计行放进内存队列，后台线程每 interval 秒（或攒满 max_batch 条）
+一条多行 INSERT 写入 audit_log；created_at 取记录时刻，延迟落库、补写都不改变事件时间。
+数据库不可用或队列已满时追加写到本地 spill 文件（fsync），库恢复后由后台线程整文件补写再删除；
+补写提交后、删文件前进程崩溃会导致该文件的行重复写入一次。
+整批写入因数据本身出错（超长、约束等，非连接类异常）时逐行重试，仍然失败的行转存 dead-letter 文件，
+不把数据库标记为不可用，也不会卡住后续批次和 spill 补写；dead-letter 文件需人工处理。
+后台/安全相关操作（改等级、改状态、冻结解冻、注销、重置密码）的审计必须和业务变更同生共死，
+一律用 insert_audit / ainsert_audit 在业务事务里直接写；缓冲写只留给量大、丢几条可接受的审计行，
+进程被强杀时内存队列里的行会丢失。
+"""
+import asyncio
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import pymysql
+
+from src.config import get_conn, pin_session_user, AUDIT_CFG, PoolTimeoutError
+from src.aio_db import aget_conn
+
+_INSERT_SQL = "INSERT INTO audit_log(user_id, op_type, old_val, new_val, reason, created_at) VALUES (%s,%s,%s,%s,%s,%s)"
+
+_STOP = object()
+# 库连不上 / 连接池耗尽：整批留着稍后重试；其它异常视为数据问题，逐行隔离
+_TRANSIENT_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError, PoolTimeoutError, OSError)
+
+
+class AuditEntry(NamedTuple):
+    user_id: int
+    op_type: str
+    old_val: Optional[int]
+    new_val: Optional[int]
+    reason: Optional[str]
+    created_at: datetime.datetime
+
+
+def audit_entry(user_id: int, op_type: str, old_val, new_val, reason: Optional[str] = None) -> AuditEntry:
+    return AuditEntry(user_id, op_type,
+                      None if old_val is None else int(old_val),
+                      None if new_val is None else int(new_val),
+                      reason, datetime.datetime.now().replace(microsecond=0))
+
+
+# ------------- 同步写（在调用方事务里） -------------
+def insert_audit(cur, entries: Iterable[AuditEntry]):
+    """在调用方事务里写审计，随业务一起提交或回滚"""
+    rows = [tuple(e) for e in entries]
+    if rows:
+        cur.executemany(_INSERT_SQL, rows)
+
+
+async def ainsert_audit(cur, entries: Iterable[AuditEntry]):
+    rows = [tuple(e) for e in entries]
+    if rows:
+        await cur.executemany(_INSERT_SQL, rows)
+
+
+# ------------- spill 文件 -------------
+def _dump(entry: AuditEntry, error: Optional[str] = None) -> str:
+    d = {**entry._asdict(), "created_at": entry.created_at.isoformat()}
+    if error is not None:
+        d["error"] = error    # 只出现在 dead-letter 文件里
+    return json.dumps(d, ensure_ascii=False)
+
+
+def _load(line: str) -> AuditEntry:
+    d = json.loads(line)
+    d["created_at"] = datetime.datetime.fromisoformat(d["created_at"])
+    return AuditEntry(**d)
+
+
+class AuditSink:
+    """审计缓冲队列 + 后台刷库线程 + 本地 spill 文件"""
+
+    def __init__(self, interval: float = 1.0, max_batch: int = 500, max_queue: int = 20000,
+                 spill_path: str = "audit_spill.jsonl", dead_letter_path: str = "audit_dead.jsonl",
+                 retry_after: float = 5.0):
+        self.interval = interval
+        self.max_batch = max(1, max_batch)
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path
+        self.retry_after = retry_after
+        self._queue: "queue.Queue" = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._down_until = 0.0
+        self._stats = {"recorded": 0, "flushes": 0, "flushed": 0, "spilled": 0, "replayed": 0,
+                       "bad_lines": 0, "dead_letters": 0, "failures": 0, "max_batch_seen": 0,
+                       "flush_seconds": 0.0, "max_flush_seconds": 0.0}
+
+    def record(self, entries: List[AuditEntry]) -> List[AuditEntry]:
+        """排队，不做任何 IO；返回队列已满放不下的行，由调用方交给 spill（异步调用方放到线程池里做）"""
+        self._ensure_started()
+        overflow = []
+        for e in entries:
+            try:
+                self._queue.put_nowait(e)
+            except queue.Full:
+                overflow.append(e)
+        with self._lock:
+            self._stats["recorded"] += len(entries)
+        return overflow
+
+    def spill(self, entries: List[AuditEntry]):
+        """阻塞写 + fsync"""
+        if entries:
+            self._spill(entries)
+
+    # ------------- 内部 -------------
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            self._replay()
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            if stop:
+                # 退出前把队列里剩下的也带上
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            for i in range(0, len(batch), self.max_batch):
+                self._flush(batch[i:i + self.max_batch])
+
+    def _write(self, entries: List[AuditEntry]):
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                conn.begin()
+                try:
+                    for i in range(0, len(entries), self.max_batch):
+                        insert_audit(cur, entries[i:i + self.max_batch])
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+    def _write_isolating(self, entries: List[AuditEntry]) -> Tuple[List[AuditEntry], int]:
+        """整批写入；数据问题时逐行重试并把坏行转存 dead-letter。
+        返回 (因库不可用而没写进去的行（调用方负责落盘）, 转存 dead-letter 的行数)"""
+        try:
+            self._write(entries)
+            return [], 0
+        except _TRANSIENT_ERRORS as e:
+            self._mark_down(e)
+            return entries, 0
+        except Exception as e:
+            print(f"⚠️ 审计整批写入失败，逐行重试：{e}")
+        dead = []
+        for i, entry in enumerate(entries):
+            try:
+                self._write([entry])
+            except _TRANSIENT_ERRORS as e:
+                self._mark_down(e)
+                self._dead_letter(dead)
+                return entries[i:], len(dead)
+            except Exception as e:
+                dead.append((entry, str(e)))
+        self._dead_letter(dead)
+        return [], len(dead)
+
+    def _mark_down(self, e: Exception):
+        print(f"⚠️ 审计写库失败，{self.retry_after:g}s 内转存 {self.spill_path}：{e}")
+        self._down_until = time.monotonic() + self.retry_after
+        with self._lock:
+            self._stats["failures"] += 1
+
+    def _flush(self, batch: List[AuditEntry]):
+        if not batch:
+            return
+        if time.monotonic() < self._down_until:
+            self._spill(batch)
+            return
+        t0 = time.perf_counter()
+        remaining, dead = self._write_isolating(batch)
+        if remaining:
+            self._spill(remaining)
+            return
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            s = self._stats
+            s["flushes"] += 1
+            s["flushed"] += len(batch) - dead
+            s["max_batch_seen"] = max(s["max_batch_seen"], len(batch))
+            s["flush_seconds"] += elapsed
+            s["max_flush_seconds"] = max(s["max_flush_seconds"], elapsed)
+
+    def _spill(self, entries: List[AuditEntry]):
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write("".join(_dump(e) + "\n" for e in entries))
+                f.flush()
+                os.fsync(f.fileno())
+        with self._lock:
+            self._stats["spilled"] += len(entries)
+
+    def _dead_letter(self, dead):
+        if not dead:
+            return
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write("".join(_dump(e, error) + "\n" for e, error in dead))
+                f.flush()
+                os.fsync(f.fileno())
+        print(f"⚠️ {len(dead)} 条审计无法写库，已转存 {self.dead_letter_path}")
+        with self._lock:
+            self._stats["dead_letters"] += len(dead)
+
+    def _replay(self):
+        """把 spill 文件整体补写进库；先改名，补写期间新的落盘写到新文件"""
+        replaying = self.spill_path + ".replay"
+        if time.monotonic() < self._down_until:
+            return
+        with self._spill_lock:
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replaying)
+        entries, bad = [], 0
+        with open(replaying, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(_load(line))
+                except (ValueError, TypeError, KeyError):
+                    bad += 1    # 崩溃时写了半行
+        remaining, dead = self._write_isolating(entries)
+        if remaining:
+            # 已写进去的行不再重放，剩下的原子替换回补写文件，retry_after 后继续
+            tmp = replaying + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("".join(_dump(e) + "\n" for e in remaining))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, replaying)
+        else:
+            os.remove(replaying)
+        with self._lock:
+            self._stats["replayed"] += len(entries) - len(remaining) - dead
+            self._stats["bad_lines"] += bad
+
+    def _spill_pending(self) -> int:
+        total = 0
+        for path in (self.spill_path, self.spill_path + ".replay"):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self._queue.qsize()
+        s["spill_pending_bytes"] = self._spill_pending()
+        s["dead_letter_pending"] = os.path.exists(self.dead_letter_path)
+        s["db_down"] = time.monotonic() < self._down_until
+        s["avg_batch"] = s["flushed"] / s["flushes"] if s["flushes"] else 0.0
+        s["avg_flush_seconds"] = s["flush_seconds"] / s["flushes"] if s["flushes"] else 0.0
+        return s
+
+    def shutdown(self, timeout: float = 10.0):
+        """刷完已排队的审计再退出；库不可用时落 spill 文件，下次启动补写"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+
+_sink = AuditSink(**{k: v for k, v in AUDIT_CFG.items() if k != "enabled"}) if AUDIT_CFG["enabled"] else None
+
+
+def record_audit(*entries: AuditEntry):
+    """业务提交之后调用，只用于量大的非关键审计；未启用缓冲时当场单独写库"""
+    if _sink:
+        _sink.spill(_sink.record(list(entries)))
+        pin_session_user(*(e.user_id for e in entries))
+        return
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            insert_audit(cur, entries)
+
+
+async def arecord_audit(*entries: AuditEntry):
+    if _sink:
+        overflow = _sink.record(list(entries))
+        if overflow:
+            # 落盘要 fsync，不能卡住事件循环
+            await asyncio.get_running_loop().run_in_executor(None, _sink.spill, overflow)
+        pin_session_user(*(e.user_id for e in entries))
+        return
+    async with aget_conn() as conn:
+        async with conn.cursor() as cur:
+            await ainsert_audit(cur, entries)
+
+
+def audit_sink_stats() -> dict:
+    return _sink.stats() if _sink else {"enabled": False}
+
+
+def shutdown_audit_sink():
+    if _sink:
+        _sink.shutdown()
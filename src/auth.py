@@ -0,0 +1,247 @@
+import datetime
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+from src.config import AUTH_CFG
+from src.aio_db import aget_conn
+
+# users.status 里只有 0（正常）允许使用已签发的 token；user_service 依赖本模块，这里不反向 import UserStatus
+_ACTIVE_STATUS = 0
+_USER_STATE_SQL = "SELECT status, token_valid_after FROM users WHERE id=%s"
+
+
+def _ms(ts: float) -> float:
+    return int(ts * 1000) / 1000
+
+
+class InvalidTokenError(Exception):
+    """token 签名不对 / 过期 / 已吊销"""
+
+
+class TokenClaims(NamedTuple):
+    user_id: int
+    jti: str
+    iat: float
+    exp: int
+
+
+class JwtAuth:
+    """JWT 签发与校验
+
+    验签通过的 token 放进进程内 LRU，同一个 token 再次请求只查字典 + 比较过期时间；
+    吊销靠内存黑名单：单个 token 记 jti，冻结 / 注销 / 改密记"该用户此刻之前签发的全部作废"，
+    条目在对应 token 自然过期后清理，所以黑名单大小只和有效期内的吊销次数有关。
+    "全部作废"同时持久化在 users.token_valid_after（由改状态 / 改密的那条 UPDATE 顺带写入），
+    每个用户每 recheck 秒回库读一次 status 和 token_valid_after，
+    所以重启后、或吊销发生在别的 worker 上时，最多 recheck 秒后也会生效。
+    退出登录（单个 jti）仍只在本进程生效。
+    """
+
+    def __init__(self, secret: str, algorithm: str = "HS256", ttl: int = 7 * 24 * 3600,
+                 cache_size: int = 50000, recheck: float = 60.0):
+        if not secret:
+            # 没配密钥时临时生成一个：重启后旧 token 全部失效，多实例之间也互不认
+            secret = secrets.token_urlsafe(32)
+            print("⚠️ 未配置 JWT_SECRET，已使用临时密钥")
+        self.secret = secret
+        self.algorithm = algorithm
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.recheck = recheck
+        self._checked: Dict[int, float] = {}          # user_id -> 上次回库检查的时刻（monotonic）
+        self._inactive = set()                        # 回库时发现已冻结 / 注销的用户
+        self._cache: "OrderedDict[str, TokenClaims]" = OrderedDict()
+        self._denied_jti: Dict[str, int] = {}       # jti -> exp
+        self._denied_before: Dict[int, float] = {}    # user_id -> 截止时间，iat 早于它的 token 作废
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+
+    # ------------- 签发 -------------
+    def issue(self, user_id: int) -> str:
+        # iat 精确到毫秒：吊销后立刻重新登录拿到的新 token 不会被同一秒的截止时间误伤
+        now = time.time()
+        claims = {"sub": str(user_id), "jti": secrets.token_hex(8), "iat": _ms(now),
+                  "exp": int(now) + self.ttl}
+        return jwt.encode(claims, self.secret, algorithm=self.algorithm)
+
+    # ------------- 校验 -------------
+    def verify(self, token: str) -> TokenClaims:
+        now = time.time()
+        with self._lock:
+            claims = self._cache.get(token)
+            if claims is not None:
+                self._cache.move_to_end(token)
+                self._hits += 1
+        if claims is None:
+            claims = self._decode(token)
+            with self._lock:
+                self._misses += 1
+                self._cache[token] = claims
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if claims.exp <= now:
+            self._reject(token)
+            raise InvalidTokenError("登录已过期，请重新登录")
+        if self._is_revoked(claims):
+            self._reject(token)
+            raise InvalidTokenError("登录已失效，请重新登录")
+        return claims
+
+    def _decode(self, token: str) -> TokenClaims:
+        try:
+            raw = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+            return TokenClaims(int(raw["sub"]), raw["jti"], float(raw["iat"]), int(raw["exp"]))
+        except (JWTError, KeyError, TypeError, ValueError):
+            with self._lock:
+                self._rejected += 1
+            raise InvalidTokenError("无效的登录凭证")
+
+    def _reject(self, token: str):
+        with self._lock:
+            self._cache.pop(token, None)
+            self._rejected += 1
+
+    def _is_revoked(self, claims: TokenClaims) -> bool:
+        cutoff = self._denied_before.get(claims.user_id)
+        return (claims.jti in self._denied_jti or claims.user_id in self._inactive
+                or (cutoff is not None and claims.iat < cutoff))
+
+    # ------------- 回库检查 -------------
+    def needs_check(self, user_id: int) -> bool:
+        checked = self._checked.get(user_id)
+        return checked is None or time.monotonic() - checked >= self.recheck
+
+    def apply_user_state(self, user_id: int, status: Optional[int], valid_after: Optional[datetime.datetime]):
+        """合并库里的状态；用户不存在按已注销处理"""
+        with self._lock:
+            self._checked[user_id] = time.monotonic()
+            if status != _ACTIVE_STATUS:
+                self._inactive.add(user_id)
+            else:
+                self._inactive.discard(user_id)
+            if valid_after is not None:
+                cutoff = _ms(valid_after.timestamp())
+                self._denied_before[user_id] = max(cutoff, self._denied_before.get(user_id, 0.0))
+            self._prune()
+
+    def check_revoked(self, claims: TokenClaims):
+        if self._is_revoked(claims):
+            raise InvalidTokenError("登录已失效，请重新登录")
+
+    # ------------- 吊销 -------------
+    def revoke(self, claims: TokenClaims):
+        """退出登录：只作废这一个 token"""
+        with self._lock:
+            self._denied_jti[claims.jti] = claims.exp
+            self._prune()
+
+    def revoke_user(self, user_id: int):
+        """冻结 / 注销 / 改密：本进程立即作废该用户此前签发的全部 token（提交成功后调用）"""
+        with self._lock:
+            self._denied_before[user_id] = _ms(time.time())
+            self._prune()
+
+    def _prune(self):
+        """已过期的黑名单条目不再有意义，每分钟最多清理一次（调用方持锁）"""
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + 60
+        self._denied_jti = {j: exp for j, exp in self._denied_jti.items() if exp > now}
+        self._denied_before = {u: t for u, t in self._denied_before.items() if t + self.ttl > now}
+        stale = time.monotonic() - self.recheck
+        self._checked = {u: t for u, t in self._checked.items() if t > stale}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "cache_size": len(self._cache),
+                "max_cache_size": self.cache_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "rejected": self._rejected,
+                "denied_tokens": len(self._denied_jti),
+                "denied_users": len(self._denied_before),
+                "inactive_users": len(self._inactive),
+            }
+
+
+_auth = None
+_auth_lock = threading.Lock()
+_bearer = HTTPBearer(auto_error=False)
+
+
+def get_auth() -> JwtAuth:
+    """首次签发 / 校验时才创建，命令行工具 import 业务模块时不会触发密钥检查"""
+    global _auth
+    if _auth is None:
+        with _auth_lock:
+            if _auth is None:
+                _auth = JwtAuth(**{k: v for k, v in AUTH_CFG.items() if k != "allow_mobile"})
+    return _auth
+
+
+def issue_token(user_id: int) -> str:
+    return get_auth().issue(user_id)
+
+
+def verify_token(token: str) -> TokenClaims:
+    """校验失败抛 InvalidTokenError"""
+    return get_auth().verify(token)
+
+
+def revoke_token(claims: TokenClaims):
+    get_auth().revoke(claims)
+
+
+def revoke_user_tokens(user_id: int):
+    get_auth().revoke_user(user_id)
+
+
+def token_cutoff() -> datetime.datetime:
+    """写进 users.token_valid_after 的截止时间：和改状态 / 改密的 UPDATE 同一事务写入，早于它签发的 token 全部作废"""
+    return datetime.datetime.fromtimestamp(_ms(time.time()))
+
+
+async def _acheck_user(auth: JwtAuth, claims: TokenClaims):
+    async with aget_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(_USER_STATE_SQL, (claims.user_id,))
+            row = await cur.fetchone()
+    if row is None:
+        auth.apply_user_state(claims.user_id, None, None)
+    else:
+        auth.apply_user_state(claims.user_id, row["status"], row["token_valid_after"])
+
+
+def auth_stats() -> dict:
+    return get_auth().stats()
+
+
+async def token_claims(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+) -> Optional[TokenClaims]:
+    """路由依赖：带了 Authorization: Bearer 就校验（失败 401），没带返回 None"""
+    if credentials is None:
+        return None
+    try:
+        auth = get_auth()
+        claims = auth.verify(credentials.credentials)
+        if auth.needs_check(claims.user_id):
+            await _acheck_user(auth, claims)
+            auth.check_revoked(claims)
+        return claims
+    except InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
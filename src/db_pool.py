@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolTimeoutError(Exception):
+    """在 timeout 秒内没有拿到可用连接"""
+
+
+class PooledConnection:
+    """连接代理：用法与 pymysql.Connection 一致，with 退出 / close() 时归还连接池而不是断开"""
+
+    def __init__(self, pool: "ConnectionPool", raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise pymysql.err.InterfaceError(0, "连接已归还连接池")
+        return getattr(raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 网络类异常说明底层连接可能已坏，直接丢弃
+        broken = isinstance(exc, (pymysql.err.OperationalError, pymysql.err.InterfaceError))
+        self._release(broken)
+
+    def close(self):
+        self._release(False)
+
+    def _release(self, broken: bool):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._put(raw, self._created_at, broken)
+
+
+class ConnectionPool:
+    """线程安全的 pymysql 连接池：最小/最大连接数、借出前 ping、超龄回收、限时等待"""
+
+    def __init__(self, connect: Callable[[], pymysql.connections.Connection], min_size: int = 1,
+                 max_size: int = 20, timeout: float = 10.0, max_lifetime: float = 3600.0,
+                 ping_interval: float = 0.0, autocommit: bool = True):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("连接池大小配置非法")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.autocommit = autocommit
+
+        self._cond = threading.Condition()
+        self._idle = deque()          # (raw, created_at, last_used)
+        self._size = 0                # 已创建（空闲 + 借出）的连接数
+        self._waiting = 0
+        self._closed = False
+        self._pid = os.getpid()
+        self._stats = {
+            "created": 0, "closed": 0, "checkouts": 0, "timeouts": 0,
+            "ping_failures": 0, "recycled": 0, "discarded": 0, "wait_seconds": 0.0,
+        }
+        self._fill_min()
+
+    # ------------- 借出 -------------
+    def connection(self, timeout: Optional[float] = None) -> PooledConnection:
+        """借出一个连接，超过 timeout 仍无可用连接则抛 PoolTimeoutError"""
+        self._check_fork()
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise pymysql.err.InterfaceError(0, "连接池已关闭")
+                if self._idle:
+                    raw, created_at, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    raw = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(f"等待数据库连接超时（{timeout:g}s，池上限 {self.max_size}）")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds"] += time.monotonic() - started
+
+        if raw is None:
+            raw, created_at = self._open()
+        else:
+            raw, created_at = self._validate(raw, created_at, last_used)
+        return PooledConnection(self, raw, created_at)
+
+    def _validate(self, raw, created_at: float, last_used: float):
+        """超龄的直接重建；空闲超过 ping_interval 的先 ping，失败则重建（沿用原名额）"""
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            self._stats["recycled"] += 1
+            self._close_raw(raw)
+            return self._open()
+        if now - last_used >= self.ping_interval:
+            try:
+                raw.ping(reconnect=False)
+            except pymysql.err.Error:
+                self._stats["ping_failures"] += 1
+                self._close_raw(raw)
+                return self._open()
+        return raw, created_at
+
+    def _open(self):
+        """新建连接；失败时把占用的名额还回去"""
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._stats["created"] += 1
+        return raw, time.monotonic()
+
+    # ------------- 归还 -------------
+    def _put(self, raw, created_at: float, broken: bool = False):
+        if not broken and os.getpid() == self._pid:
+            try:
+                # 调用方未提交的事务一律回滚，避免脏状态流到下一个借用者
+                if raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    raw.rollback()
+                if raw.get_autocommit() != self.autocommit:
+                    raw.autocommit(self.autocommit)
+            except pymysql.err.Error:
+                broken = True
+        expired = self.max_lifetime and time.monotonic() - created_at > self.max_lifetime
+        with self._cond:
+            if broken or expired or self._closed or os.getpid() != self._pid:
+                self._size -= 1
+                self._stats["discarded" if broken else "recycled"] += 1
+                keep = False
+            else:
+                self._idle.append((raw, created_at, time.monotonic()))
+                keep = True
+            self._cond.notify()
+        if not keep:
+            self._close_raw(raw)
+
+    # ------------- 维护 -------------
+    def _fill_min(self):
+        """预热到 min_size；数据库暂不可用时不阻塞启动，借出时再建"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw, created_at = self._open()
+            except pymysql.err.Error:
+                return
+            with self._cond:
+                self._idle.append((raw, created_at, time.monotonic()))
+                self._cond.notify()
+
+    def _check_fork(self):
+        """fork 出的子进程不能复用父进程的 socket，重置后重新建连"""
+        if os.getpid() == self._pid:
+            return
+        with self._cond:
+            if os.getpid() != self._pid:
+                self._idle.clear()
+                self._size = 0
+                self._pid = os.getpid()
+
+    def _close_raw(self, raw):
+        self._stats["closed"] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """关闭所有空闲连接；借出中的连接归还时再关闭"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _, _ in idle:
+            self._close_raw(raw)
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "waiting": self._waiting,
+                **self._stats,
+            }
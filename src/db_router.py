@@ -0,0 +1,136 @@
+"""
+读写分离路由
+get_conn(readonly=True) / aget_conn(readonly=True) 从 REPLICA_CFG 配置的从库里挑一个（轮询或最少连接），
+从库连不上时标记下线 retry_after 秒并换下一个，连接池占满时也换下一个（不下线），全部不可用时回落主库。
+读己之写：请求里绑定了当前用户（bind_session_user）时，只要借过主库连接就认为他刚写过，
+pin_seconds 秒内他的只读请求也走主库，避免刚改完就从延迟的从库读到旧数据。
+交给后台线程代写（积分组提交、审计缓冲）或替别的用户写（批量发积分）时，本上下文没有借主库或钉的不是被写的用户，
+由调用方在写完后显式调用 config.pin_session_user。
+钉住记录只在本进程内，多 worker 部署时可配合负载均衡按用户粘滞，或适当调大 pin_seconds。
+"""
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+_session_user: ContextVar[Optional[int]] = ContextVar("session_user", default=None)
+
+
+def bind_session_user(user_id: Optional[int]):
+    """在请求上下文里记下当前用户，用于读己之写"""
+    _session_user.set(user_id)
+
+
+def session_user() -> Optional[int]:
+    return _session_user.get()
+
+
+class ReplicaRouter:
+    """只负责"选哪个从库"和健康 / 钉住状态，连接池由 config / aio_db 各自维护"""
+
+    def __init__(self, names: List[str], strategy: str = "round_robin", pin_seconds: float = 2.0,
+                 retry_after: float = 10.0):
+        if strategy not in ("round_robin", "least_conn"):
+            raise ValueError("从库选择策略只能是 round_robin / least_conn")
+        self.names = names
+        self.strategy = strategy
+        self.pin_seconds = pin_seconds
+        self.retry_after = retry_after
+        self._rr = itertools.count()
+        self._in_use = [0] * len(names)
+        self._down_until = [0.0] * len(names)
+        self._pinned: Dict[int, float] = {}    # user_id -> 钉住到期时间
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"replica_reads": 0, "primary_reads": 0, "pinned_reads": 0,
+                       "fallbacks": 0, "failures": 0, "saturated": 0}
+        self._per_replica = [0] * len(names)
+
+    # ------------- 路由 -------------
+    def use_replica(self, readonly: bool) -> bool:
+        """本次借连接是否走从库；走主库时顺带记下读己之写"""
+        user_id = _session_user.get()
+        if not readonly:
+            if user_id is not None and self.names and self.pin_seconds > 0:
+                self._pin(user_id)
+            return False
+        if not self.names:
+            return False
+        if user_id is not None and self._is_pinned(user_id):
+            with self._lock:
+                self._stats["pinned_reads"] += 1
+                self._stats["primary_reads"] += 1
+            return False
+        return True
+
+    def candidates(self) -> List[int]:
+        """按策略排好序的可用从库下标"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [i for i in range(len(self.names)) if self._down_until[i] <= now]
+            if self.strategy == "least_conn":
+                healthy.sort(key=lambda i: self._in_use[i])
+            elif healthy:
+                start = next(self._rr) % len(healthy)
+                healthy = healthy[start:] + healthy[:start]
+        return healthy
+
+    def acquired(self, i: int):
+        with self._lock:
+            self._in_use[i] += 1
+            self._per_replica[i] += 1
+            self._stats["replica_reads"] += 1
+
+    def released(self, i: int):
+        with self._lock:
+            self._in_use[i] -= 1
+
+    def mark_down(self, i: int):
+        with self._lock:
+            self._down_until[i] = time.monotonic() + self.retry_after
+            self._stats["failures"] += 1
+
+    def saturated(self, i: int):
+        with self._lock:
+            self._stats["saturated"] += 1
+
+    def fell_back(self):
+        with self._lock:
+            self._stats["fallbacks"] += 1
+            self._stats["primary_reads"] += 1
+
+    # ------------- 读己之写 -------------
+    def pin(self, *user_ids: Optional[int]):
+        """把这些用户钉到主库 pin_seconds 秒；没配从库时什么都不做"""
+        user_ids = [u for u in user_ids if u is not None]
+        if user_ids and self.names and self.pin_seconds > 0:
+            self._pin(*user_ids)
+
+    def _pin(self, *user_ids: int):
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                self._pinned[user_id] = now + self.pin_seconds
+            if now >= self._next_prune:
+                self._next_prune = now + 60
+                self._pinned = {u: t for u, t in self._pinned.items() if t > now}
+
+    def _is_pinned(self, user_id: int) -> bool:
+        until = self._pinned.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "pin_seconds": self.pin_seconds,
+                "replicas": [
+                    {"name": name, "in_use": self._in_use[i], "checkouts": self._per_replica[i],
+                     "down": self._down_until[i] > now}
+                    for i, name in enumerate(self.names)
+                ],
+                "pinned_users": sum(1 for t in self._pinned.values() if t > now),
+                **self._stats,
+            }
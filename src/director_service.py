@@ -1,60 +1,133 @@
 import datetime
+import time
 
 from src.config import get_conn
-from decimal import Decimal
-from typing import List, Dict
+from src.aio_db import aget_conn
+from src.six_counter import rebuild_counters, arebuild_counters
+from src.sales_rollup import sales_between, asales_between, refresh_days, arefresh_days
+from src.pagination import decode_cursor, keyset_where, keyset_args
+from src.profile_cache import invalidate_profiles
+from decimal import Decimal, ROUND_DOWN
+from typing import List, Dict, Optional, Tuple
+
+# 晋升条件：本人六星 + 直推六星 ≥ 3 + 团队六星 ≥ 10
+PROMOTE_MIN_DIRECT = 3
+PROMOTE_MIN_TEAM = 10
+
+# 批量晋升：按 id 游标扫六星用户（走 idx_member_level），已是 active / 被冻结的不动
+_ELIGIBLE_SQL = """
+    SELECT u.id
+    FROM users u
+    LEFT JOIN directors d ON d.user_id = u.id
+    WHERE u.member_level = 6 AND u.id > %s
+      AND u.six_director >= %s AND u.six_team >= %s
+      AND (d.user_id IS NULL OR d.status = 'pending')
+    ORDER BY u.id
+    LIMIT %s
+"""
+_UPSERT_DIRECTORS_SQL = """
+    INSERT INTO directors(user_id, status, activated_at)
+    VALUES {values}
+    ON DUPLICATE KEY UPDATE status='active', activated_at=NOW()
+"""
+
+# 周分红：2% 加权池，按团队六星人数线性加权（至少为 1）
+DIVIDEND_RATE = Decimal("0.02")
+_CENT = Decimal("0.01")
+
+_WEIGHTS_SQL = """
+    SELECT d.user_id, GREATEST(1, u.six_team) AS weight
+    FROM directors d
+    JOIN users u ON u.id = d.user_id
+    WHERE d.status='active'
+    ORDER BY d.user_id
+"""
+# 先抢占周期记录：主键冲突 = 已发过（或正在另一个事务里发），本次什么都不做
+_CLAIM_RUN_SQL = """
+    INSERT IGNORE INTO director_dividend_runs(period_date, new_sales, pool_amount, total_paid, director_count)
+    VALUES (%s,%s,%s,%s,%s)
+"""
+_RUN_TOTAL_SQL = "SELECT total_paid FROM director_dividend_runs WHERE period_date=%s"
+_INSERT_DIVIDENDS_SQL = """
+    INSERT INTO director_dividends(user_id, period_date, dividend_amount, new_sales, weight)
+    VALUES (%s,%s,%s,%s,%s)
+"""
+# 余额 / 累计分红直接从本期明细 join 回写，两条语句搞定
+_CREDIT_BALANCE_SQL = """
+    UPDATE users u
+    JOIN director_dividends dd ON dd.user_id = u.id AND dd.period_date = %s
+    SET u.withdrawable_balance = u.withdrawable_balance + dd.dividend_amount
+"""
+_CREDIT_DIRECTORS_SQL = """
+    UPDATE directors d
+    JOIN director_dividends dd ON dd.user_id = d.user_id AND dd.period_date = %s
+    SET d.dividend_amount = d.dividend_amount + dd.dividend_amount
+"""
+
+
+def _split_pool(pool: Decimal, weights: List[Tuple[int, int]]) -> List[Tuple[int, Decimal, int]]:
+    """按权重把奖池拆到分：先向下取整，剩下的零头按余数从大到小（同余数按 user_id）逐分补齐，结果与执行顺序无关"""
+    pool_cents = int((pool / _CENT).to_integral_value(ROUND_DOWN))
+    total_weight = sum(w for _, w in weights)
+    shares = []
+    for uid, w in weights:
+        cents, rem = divmod(pool_cents * w, total_weight)
+        shares.append([uid, cents, w, rem])
+    leftover = pool_cents - sum(x[1] for x in shares)
+    for x in sorted(shares, key=lambda x: (-x[3], x[0]))[:leftover]:
+        x[1] += 1
+    return [(uid, Decimal(cents) * _CENT, w) for uid, cents, w, _ in shares if cents > 0]
+
+# 分页查询：传 cursor（上一页的 next_cursor）时走游标，忽略 page
+def _dividend_detail_sql(user_id: int, page: int, size: int, cursor: Optional[str]):
+    where, args = ["user_id=%s"], [user_id]
+    if cursor:
+        where.append(keyset_where(("period_date", "id")))
+        args.extend(keyset_args(decode_cursor(cursor, (datetime.date, int))))
+    args.extend([size] if cursor else [size, (page - 1) * size])
+    return f"""
+        SELECT id, period_date, dividend_amount, new_sales, weight, created_at
+        FROM director_dividends
+        WHERE {" AND ".join(where)}
+        ORDER BY period_date DESC, id DESC
+        {"LIMIT %s" if cursor else "LIMIT %s OFFSET %s"}
+    """, args
+
+
+def _director_list_sql(page: int, size: int, cursor: Optional[str]):
+    where, args = ["d.status='active'"], []
+    if cursor:
+        where.append("d.id < %s")
+        args.extend(decode_cursor(cursor, (int,)))
+    args.extend([size] if cursor else [size, (page - 1) * size])
+    return f"""
+        SELECT d.id, d.user_id, u.name, u.mobile,
+               d.dividend_amount, d.created_at
+        FROM directors d
+        JOIN users u ON u.id=d.user_id
+        WHERE {" AND ".join(where)}
+        ORDER BY d.id DESC
+        {"LIMIT %s" if cursor else "LIMIT %s OFFSET %s"}
+    """, args
+
 
 class DirectorService:
     """荣誉董事 晋升/分红/查询 原子接口"""
 
-    # ------------- 0. 刷新用户六星计数（后台每天或每周跑） -------------
+    # ------------- 0. 六星计数修复（仅修数 / 首次上线时手动跑） -------------
     @staticmethod
     def _refresh_six_counter():
-        """刷六星直推 & 团队人数，刷完即可直接判定晋升"""
+        """全量重算六星直推 & 团队人数；日常由等级变更 / 换绑增量维护，晋升判定不再依赖它"""
         with get_conn() as conn:
             with conn.cursor() as cur:
-                # 直推六星：用派生表+IFNULL 绕过 MySQL 1093 和 NULL 问题
-                cur.execute("""
-                    UPDATE users u
-                    SET six_director = IFNULL((
-                        SELECT cnt
-                        FROM (
-                            SELECT referrer_id, COUNT(*) AS cnt
-                            FROM user_referrals r
-                            JOIN users x ON x.id = r.user_id
-                            WHERE x.member_level = 6
-                            GROUP BY referrer_id
-                        ) AS t
-                        WHERE t.referrer_id = u.id
-                    ), 0)
-                """)
-                # 团队六星（含自己）：同样派生表+IFNULL
-                cur.execute("""
-                    UPDATE users u
-                    SET six_team = IFNULL((
-                        SELECT cnt
-                        FROM (
-                            SELECT u2.id, COUNT(*) AS cnt
-                            FROM users u2
-                            WHERE u2.id IN (
-                                SELECT user_id
-                                FROM user_referrals
-                                WHERE referrer_id = u.id
-                                UNION ALL
-                                SELECT u.id
-                            ) AND u2.member_level = 6
-                            GROUP BY u2.id
-                        ) AS t
-                        WHERE t.id = u.id
-                    ), 0)
-                """)
+                conn.begin()
+                rebuild_counters(cur)
             conn.commit()
 
     # ------------- 1. 晋升判定 -------------
     @staticmethod
     def try_promote(user_id: int) -> bool:
-        """单次晋升尝试，返回是否成功"""
-        DirectorService._refresh_six_counter()
+        """单次晋升尝试，返回是否成功（计数已增量维护，直接读）"""
         with get_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
@@ -64,7 +137,7 @@ class DirectorService:
                 row = cur.fetchone()
                 if not row or row['member_level'] != 6:
                     return False
-                if row['six_director'] < 3 or row['six_team'] < 10:
+                if row['six_director'] < PROMOTE_MIN_DIRECT or row['six_team'] < PROMOTE_MIN_TEAM:
                     return False
                 # 符合晋升
                 cur.execute("""
@@ -75,78 +148,101 @@ class DirectorService:
                 conn.commit()
                 return True
 
+    @staticmethod
+    def promote_all(chunk: int = 1000) -> Dict:
+        """批量晋升：一次扫描所有满足条件的六星用户，按 chunk 分批写 directors；返回数量与耗时"""
+        started = time.perf_counter()
+        promoted, batches, last_id = 0, 0, 0
+        scan_seconds = write_seconds = 0.0
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                while True:
+                    t0 = time.perf_counter()
+                    cur.execute(_ELIGIBLE_SQL, (last_id, PROMOTE_MIN_DIRECT, PROMOTE_MIN_TEAM, chunk))
+                    ids = [r['id'] for r in cur.fetchall()]
+                    t1 = time.perf_counter()
+                    scan_seconds += t1 - t0
+                    if not ids:
+                        break
+                    conn.begin()
+                    cur.execute(_UPSERT_DIRECTORS_SQL.format(values=",".join(["(%s,'active',NOW())"] * len(ids))), ids)
+                    conn.commit()
+                    write_seconds += time.perf_counter() - t1
+                    promoted += len(ids)
+                    batches += 1
+                    last_id = ids[-1]
+        return {
+            "promoted": promoted,
+            "batches": batches,
+            "scan_seconds": round(scan_seconds, 3),
+            "write_seconds": round(write_seconds, 3),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
     # ------------- 2. 每周分红计算 -------------
     @staticmethod
     def calc_week_dividend(period: datetime.date) -> Decimal:
         """
-        计算并发放本周荣誉董事分红
+        计算并发放本周荣誉董事分红（同一周期重复调用直接返回已发金额）
         返回总发放金额
         """
+        end = period + datetime.timedelta(days=6)
         with get_conn() as conn:
             with conn.cursor() as cur:
-                # 1. 本周新业绩 = 会员+普通商品销售额
-                cur.execute("""
-                    SELECT SUM(total_amount) AS s
-                    FROM orders
-                    WHERE DATE(created_at) BETWEEN %s AND DATE_ADD(%s, INTERVAL 6 DAY)
-                      AND status IN ('paid','completed')
-                """, (period, period))
-                new_sales = cur.fetchone()['s'] or 0
-                pool = new_sales * 0.02   # 2% 加权池
-
-                # 2. 所有活跃荣誉董事
-                cur.execute("""
-                    SELECT user_id
-                    FROM directors
-                    WHERE status='active'
-                """)
-                directors = cur.fetchall()
-                if not directors:
-                    return 0
-
-                # 3. 计算权重（简化：按团队六星人数线性加权）
-                total_weight = 0
-                rows = []
-                for d in directors:
-                    uid = d['user_id']
-                    cur.execute("SELECT six_team FROM users WHERE id=%s", (uid,))
-                    six_team = cur.fetchone()['six_team']
-                    weight = max(1, six_team)   # 至少为 1
-                    rows.append((uid, weight))
-                    total_weight += weight
-
-                # 4. 发放
-                paid = 0
-                for uid, w in rows:
-                    amt = round(pool * w / total_weight, 2)
-                    if amt <= 0:
-                        continue
-                    # 写分红明细
-                    cur.execute("""
-                        INSERT INTO director_dividends
-                        (user_id, period_date, dividend_amount, new_sales, weight)
-                        VALUES (%s,%s,%s,%s,%s)
-                    """, (uid, period, amt, new_sales, w))
-                    # 累加到可提现余额
-                    cur.execute("""
-                        UPDATE users
-                        SET withdrawable_balance=withdrawable_balance+%s
-                        WHERE id=%s
-                    """, (amt, uid))
-                    # 累加 directors 总分红
-                    cur.execute("""
-                        UPDATE directors
-                        SET dividend_amount=dividend_amount+%s
-                        WHERE user_id=%s
-                    """, (amt, uid))
-                    paid += amt
-                conn.commit()
+                # 0. 先单独提交一次这 7 天的日汇总重算，不依赖定时汇总任务是否已经跑到本周
+                #    （周期一旦抢占就不能再补发）；放在发放事务外，daily_sales 上的锁不会拖到发放结束
+                conn.begin()
+                try:
+                    refresh_days(cur, period, end)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+                conn.begin()
+                try:
+                    # 1. 本周新业绩 = 会员+普通商品销售额
+                    new_sales = sales_between(cur, period, end)
+                    pool = (new_sales * DIVIDEND_RATE).quantize(_CENT, ROUND_DOWN)
+
+                    # 2. 所有活跃荣誉董事及权重，一次查完
+                    cur.execute(_WEIGHTS_SQL)
+                    weights = [(r['user_id'], int(r['weight'])) for r in cur.fetchall()]
+                    if not weights:
+                        conn.commit()
+                        return Decimal(0)
+                    shares = _split_pool(pool, weights)
+                    paid = sum((amt for _, amt, _ in shares), Decimal(0))
+
+                    # 3. 抢占周期 + 批量发放
+                    cur.execute(_CLAIM_RUN_SQL, (period, new_sales, pool, paid, len(weights)))
+                    if not cur.rowcount:
+                        conn.rollback()
+                        cur.execute(_RUN_TOTAL_SQL, (period,))
+                        return cur.fetchone()['total_paid']
+                    if shares:
+                        cur.executemany(_INSERT_DIVIDENDS_SQL,
+                                        [(uid, period, amt, new_sales, w) for uid, amt, w in shares])
+                        cur.execute(_CREDIT_BALANCE_SQL, (period,))
+                        cur.execute(_CREDIT_DIRECTORS_SQL, (period,))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                invalidate_profiles(*(uid for uid, _, _ in shares))
                 return paid
 
     # ------------- 3. 查询接口 -------------
+    @staticmethod
+    def get_sales(start: datetime.date, end: datetime.date) -> Decimal:
+        """[start, end] 平台业绩（按天闭区间，读日汇总表）"""
+        with get_conn(readonly=True) as conn:
+            with conn.cursor() as cur:
+                return sales_between(cur, start, end)
+
     @staticmethod
     def is_director(user_id: int) -> bool:
-        with get_conn() as conn:
+        with get_conn(readonly=True) as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT 1 FROM directors
@@ -155,29 +251,155 @@ class DirectorService:
                 return cur.fetchone() is not None
 
     @staticmethod
-    def get_dividend_detail(user_id: int, page=1, size=10) -> List[Dict]:
-        with get_conn() as conn:
+    def get_dividend_detail(user_id: int, page=1, size=10, cursor: Optional[str] = None) -> List[Dict]:
+        sql, args = _dividend_detail_sql(user_id, page, size, cursor)
+        with get_conn(readonly=True) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT period_date, dividend_amount, new_sales, weight, created_at
-                    FROM director_dividends
-                    WHERE user_id=%s
-                    ORDER BY period_date DESC
-                    LIMIT %s OFFSET %s
-                """, (user_id, size, (page-1)*size))
+                cur.execute(sql, args)
                 return cur.fetchall()
 
     @staticmethod
-    def list_all_directors(page=1, size=10):
-        with get_conn() as conn:
+    def list_all_directors(page=1, size=10, cursor: Optional[str] = None):
+        sql, args = _director_list_sql(page, size, cursor)
+        with get_conn(readonly=True) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT d.user_id, u.name, u.mobile,
-                           d.dividend_amount, d.created_at
-                    FROM directors d
-                    JOIN users u ON u.id=d.user_id
-                    WHERE d.status='active'
-                    ORDER BY d.id DESC
-                    LIMIT %s OFFSET %s
-                """, (size, (page-1)*size))
-                return cur.fetchall()
\ No newline at end of file
+                cur.execute(sql, args)
+                return cur.fetchall()
+
+
+class AsyncDirectorService:
+    """DirectorService 的 asyncio 版本"""
+
+    @staticmethod
+    async def _refresh_six_counter():
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await arebuild_counters(cur)
+            await conn.commit()
+
+    @staticmethod
+    async def try_promote(user_id: int) -> bool:
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT member_level, six_director, six_team
+                    FROM users WHERE id=%s
+                """, (user_id,))
+                row = await cur.fetchone()
+                if not row or row['member_level'] != 6:
+                    return False
+                if row['six_director'] < PROMOTE_MIN_DIRECT or row['six_team'] < PROMOTE_MIN_TEAM:
+                    return False
+                await cur.execute("""
+                    INSERT INTO directors(user_id, status, activated_at)
+                    VALUES (%s,'active',NOW())
+                    ON DUPLICATE KEY UPDATE status='active', activated_at=NOW()
+                """, (user_id,))
+                await conn.commit()
+                return True
+
+    @staticmethod
+    async def promote_all(chunk: int = 1000) -> Dict:
+        started = time.perf_counter()
+        promoted, batches, last_id = 0, 0, 0
+        scan_seconds = write_seconds = 0.0
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                while True:
+                    t0 = time.perf_counter()
+                    await cur.execute(_ELIGIBLE_SQL, (last_id, PROMOTE_MIN_DIRECT, PROMOTE_MIN_TEAM, chunk))
+                    ids = [r['id'] for r in await cur.fetchall()]
+                    t1 = time.perf_counter()
+                    scan_seconds += t1 - t0
+                    if not ids:
+                        break
+                    await conn.begin()
+                    await cur.execute(_UPSERT_DIRECTORS_SQL.format(values=",".join(["(%s,'active',NOW())"] * len(ids))), ids)
+                    await conn.commit()
+                    write_seconds += time.perf_counter() - t1
+                    promoted += len(ids)
+                    batches += 1
+                    last_id = ids[-1]
+        return {
+            "promoted": promoted,
+            "batches": batches,
+            "scan_seconds": round(scan_seconds, 3),
+            "write_seconds": round(write_seconds, 3),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    @staticmethod
+    async def calc_week_dividend(period: datetime.date) -> Decimal:
+        end = period + datetime.timedelta(days=6)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                try:
+                    await arefresh_days(cur, period, end)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+                await conn.begin()
+                try:
+                    new_sales = await asales_between(cur, period, end)
+                    pool = (new_sales * DIVIDEND_RATE).quantize(_CENT, ROUND_DOWN)
+
+                    await cur.execute(_WEIGHTS_SQL)
+                    weights = [(r['user_id'], int(r['weight'])) for r in await cur.fetchall()]
+                    if not weights:
+                        await conn.commit()
+                        return Decimal(0)
+                    shares = _split_pool(pool, weights)
+                    paid = sum((amt for _, amt, _ in shares), Decimal(0))
+
+                    await cur.execute(_CLAIM_RUN_SQL, (period, new_sales, pool, paid, len(weights)))
+                    if not cur.rowcount:
+                        await conn.rollback()
+                        await cur.execute(_RUN_TOTAL_SQL, (period,))
+                        return (await cur.fetchone())['total_paid']
+                    if shares:
+                        await cur.executemany(_INSERT_DIVIDENDS_SQL,
+                                              [(uid, period, amt, new_sales, w) for uid, amt, w in shares])
+                        await cur.execute(_CREDIT_BALANCE_SQL, (period,))
+                        await cur.execute(_CREDIT_DIRECTORS_SQL, (period,))
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+                invalidate_profiles(*(uid for uid, _, _ in shares))
+                return paid
+
+    @staticmethod
+    async def get_sales(start: datetime.date, end: datetime.date) -> Decimal:
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                return await asales_between(cur, start, end)
+
+    @staticmethod
+    async def is_director(user_id: int) -> bool:
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT 1 FROM directors
+                    WHERE user_id=%s AND status='active'
+                """, (user_id,))
+                return await cur.fetchone() is not None
+
+    @staticmethod
+    async def get_dividend_detail(user_id: int, page=1, size=10, cursor: Optional[str] = None) -> List[Dict]:
+        sql, args = _dividend_detail_sql(user_id, page, size, cursor)
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, args)
+                return await cur.fetchall()
+
+    @staticmethod
+    async def list_all_directors(page=1, size=10, cursor: Optional[str] = None):
+        sql, args = _director_list_sql(page, size, cursor)
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, args)
+                return await cur.fetchall()
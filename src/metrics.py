@@ -0,0 +1,309 @@
+"""
+进程内指标 + Prometheus 文本格式输出（/metrics）
+不依赖 prometheus_client：计数器 / 直方图都是"标签元组 -> 数值"的字典，一把锁，observe 只做一次二分和几次加法。
+SQL 按指纹聚合：字面量、%s、IN 列表、多行 VALUES 都归一成 ?，同一条语句不管参数是什么只占一个标签；
+指纹数超过 MAX_FINGERPRINTS 后新的语句记到 "other"，防止标签爆炸。
+多 worker 部署时每个进程各自一份，由 Prometheus 按实例抓取后再聚合。
+"""
+import bisect
+import contextvars
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import aiomysql
+import pymysql
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BCRYPT_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+MAX_FINGERPRINTS = 500
+FINGERPRINT_LENGTH = 200
+_FP_CACHE_SIZE = 4096
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}    # labels -> [各桶计数..., +Inf 桶, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(labels)
+            if v is None:
+                v = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1
+            v[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for k, v in items:
+            cum = 0
+            for bound, n in zip(self.buckets + (float("inf"),), v):
+                cum += n
+                le = f'le="{_num(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {cum}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(v[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, k)} {cum}")
+        return lines
+
+
+class Collected:
+    """抓取时才取值的指标（连接池、队列深度等已有 stats 的东西），fn 返回 [(标签值元组, 数值)]"""
+
+    def __init__(self, name: str, doc: str, kind: str, labelnames: Sequence[str],
+                 fn: Callable[[], Iterable[Tuple[tuple, float]]]):
+        self.name = name
+        self.doc = doc
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in self.fn()]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            try:
+                lines += m.render()
+            except Exception as e:
+                # 某个采集函数出错不影响其它指标
+                lines.append(f"# {m.name} 采集失败：{_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP 请求数", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时", ("method", "route", "status"), HTTP_BUCKETS))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL 执行次数（按语句指纹）", ("fingerprint", "error")))
+db_latency = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL 执行耗时（按语句指纹，含读取结果集）", ("fingerprint",), DB_BUCKETS))
+db_connections_opened = registry.register(Counter(
+    "db_connections_opened_total", "新建的数据库连接数", ("pool",)))
+bcrypt_latency = registry.register(Histogram(
+    "bcrypt_duration_seconds", "bcrypt 耗时（含排队）", ("op",), BCRYPT_BUCKETS))
+bcrypt_rejected = registry.register(Counter(
+    "bcrypt_rejected_total", "bcrypt 排队超时被拒绝的次数", ("op",)))
+
+
+def collect(name: str, doc: str, fn: Callable[[], Iterable[Tuple[tuple, float]]],
+            labelnames: Sequence[str] = (), kind: str = "gauge"):
+    """注册一个抓取时才取值的指标"""
+    registry.register(Collected(name, doc, kind, labelnames, fn))
+
+
+def render() -> str:
+    return registry.render()
+
+
+# ------------- SQL 指纹 -------------
+_FP_RULES = (
+    (re.compile(r"/\*.*?\*/|--[^\n]*", re.S), " "),
+    (re.compile(r"'(?:[^'\\]|\\.|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s|%\(\w+\)s"), "?"),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?+)"),
+    (re.compile(r"(VALUES\s*\(\?\+\))(?:\s*,\s*\(\?\+\))+", re.I), r"\1"),
+)
+_fp_cache: Dict[str, str] = {}
+_fp_seen = set()
+_fp_lock = threading.Lock()
+
+
+def fingerprint(sql) -> str:
+    """归一化后的语句，截断到 FINGERPRINT_LENGTH"""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = bytes(sql).decode("utf-8", "replace")
+    fp = _fp_cache.get(sql)
+    if fp is not None:
+        return fp
+    fp = sql
+    for pattern, repl in _FP_RULES:
+        fp = pattern.sub(repl, fp)
+    fp = fp.strip()[:FINGERPRINT_LENGTH]
+    with _fp_lock:
+        if fp not in _fp_seen:
+            if len(_fp_seen) >= MAX_FINGERPRINTS:
+                fp = "other"
+            else:
+                _fp_seen.add(fp)
+        # 语句模板数量有限，缓存满了就不再加；超长语句（拼好的大批量 SQL）不缓存
+        if len(_fp_cache) < _FP_CACHE_SIZE and len(sql) < 4096:
+            _fp_cache[sql] = fp
+    return fp
+
+
+def observe_query(sql, seconds: float, error: bool = False):
+    fp = fingerprint(sql)
+    db_queries.inc(fp, "1" if error else "0")
+    db_latency.observe(seconds, fp)
+
+
+# ------------- 带计时的游标 -------------
+_slow_log = None
+
+
+def set_slow_query_log(log):
+    """慢查询日志（src/slow_query.py）挂到计时游标上；超过 log.threshold 的语句交给 log.record"""
+    global _slow_log
+    _slow_log = log
+
+
+def _observe(cursor, query, args, t0: float, error: bool):
+    elapsed = time.perf_counter() - t0
+    observe_query(cursor._template or query, elapsed, error)
+    if _slow_log is not None and elapsed >= _slow_log.threshold:
+        _slow_log.record(cursor, query, args, elapsed, error)
+
+
+class TimedCursor(pymysql.cursors.DictCursor):
+    """DictCursor + 每条语句计时；executemany 展开成的多条语句按原模板记"""
+    _template = None
+    _template_args = None
+
+    def execute(self, query, args=None):
+        t0 = time.perf_counter()
+        error = True
+        try:
+            result = super().execute(query, args)
+            error = False
+            return result
+        finally:
+            _observe(self, query, args, t0, error)
+
+    def executemany(self, query, args):
+        self._template, self._template_args = query, args
+        try:
+            return super().executemany(query, args)
+        finally:
+            self._template = self._template_args = None
+
+
+class ATimedCursor(aiomysql.DictCursor):
+    _template = None
+    _template_args = None
+
+    async def execute(self, query, args=None):
+        t0 = time.perf_counter()
+        error = True
+        try:
+            result = await super().execute(query, args)
+            error = False
+            return result
+        finally:
+            _observe(self, query, args, t0, error)
+
+    async def executemany(self, query, args):
+        self._template, self._template_args = query, args
+        try:
+            return await super().executemany(query, args)
+        finally:
+            self._template = self._template_args = None
+
+
+# ------------- ASGI 中间件 -------------
+_scope_var = contextvars.ContextVar("http_scope", default=None)
+
+
+def current_route() -> Optional[str]:
+    """当前请求的 "方法 路由模板"，不在请求里（后台线程、命令行工具）返回 None"""
+    scope = _scope_var.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
+
+
+class MetricsMiddleware:
+    """按路由模板（/address/{addr_id} 而不是具体 id）和状态码统计；没匹配上路由的记为 unmatched"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        token = _scope_var.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _scope_var.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            labels = (scope["method"], path, str(status[0]))
+            http_requests.inc(*labels)
+            http_latency.observe(time.perf_counter() - t0, *labels)
@@ -0,0 +1,216 @@
+"""
+版本化数据库迁移
+schema_version 记录已执行到的版本；部署时跑一次 python src/tools/init_db.py，业务请求路径不再做任何表结构检查。
+新增表结构变更：在 MIGRATIONS 末尾追加一个版本号更大的 Migration，已发布的不要再改。
+MySQL 的 DDL 会隐式提交，一个版本执行到一半失败时不会记版本号；
+所以每一步都写成可重复执行的（IF NOT EXISTS / 先查 information_schema），修好后直接重跑即可。
+加列 / 加索引默认 ALGORITHM=INPLACE, LOCK=NONE，大表上在线执行不锁读写。
+"""
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from src.config import CREATE_USERS, CREATE_REFS, CREATE_AUDIT, CREATE_POINTS_LOG, CREATE_ADDRESSES, \
+    CREATE_TEAM_REWARDS, CREATE_DIRECTORS, CREATE_DIRECTOR_DIVIDENDS, CREATE_REFERRAL_PATHS, \
+    CREATE_DIVIDEND_RUNS, CREATE_DAILY_SALES, CREATE_LEVEL_USER_COUNTS, CREATE_POINTS_LOG_COUNTS, \
+    CREATE_REFERRAL_CODE_SEQ, SEED_REFERRAL_CODE_SEQ, CREATE_PARTITION_ARCHIVES
+from src.totals import REBUILD_TOTALS_SQLS
+from src.team_counter import REBUILD_TEAM_SQLS
+
+MIGRATE_LOCK = "schema_migrate"
+MIGRATE_LOCK_TIMEOUT = 60
+ONLINE_DDL = "ALGORITHM=INPLACE, LOCK=NONE"
+
+CREATE_SCHEMA_VERSION = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    seconds DECIMAL(10,3) NOT NULL,
+    applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+Step = Callable[[object], None]
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    steps: List[Step]
+    hint: str = ""   # 执行完需要人工跟进的事项（例如跑回填脚本）
+
+
+# ------------- 步骤构造 -------------
+def _exists(cur, sql: str, args) -> bool:
+    cur.execute(sql, args)
+    return cur.fetchone() is not None
+
+
+def _column_type(cur, table: str, column: str) -> Optional[str]:
+    cur.execute(
+        "SELECT DATA_TYPE AS t FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME=%s",
+        (table, column)
+    )
+    row = cur.fetchone()
+    return row["t"] if row else None
+
+
+def sql(*statements: str) -> Step:
+    def step(cur):
+        for stmt in statements:
+            cur.execute(stmt)
+    return step
+
+
+def add_column(table: str, column: str, definition: str) -> Step:
+    def step(cur):
+        if _column_type(cur, table, column) is None:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}, {ONLINE_DDL}")
+    return step
+
+
+def add_index(table: str, name: str, columns: str, unique: bool = False) -> Step:
+    def step(cur):
+        if not _exists(cur, "SELECT 1 FROM information_schema.STATISTICS "
+                            "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND INDEX_NAME=%s LIMIT 1",
+                       (table, name)):
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            cur.execute(f"ALTER TABLE {table} ADD {kind} {name} ({columns}), {ONLINE_DDL}")
+    return step
+
+
+def widen_column(table: str, column: str, from_type: str, definition: str) -> Step:
+    """改列类型需要拷表，无法 INPLACE；只在当前类型仍是 from_type 时执行"""
+    def step(cur):
+        if _column_type(cur, table, column) == from_type:
+            cur.execute(f"ALTER TABLE {table} MODIFY COLUMN {column} {definition}, ALGORITHM=COPY, LOCK=SHARED")
+    return step
+
+
+def refuse_if(query: str, message: str) -> Step:
+    """前置检查：query 查得到行就中止迁移，交给人工处理；message 里的 {row} 替换成查到的第一行"""
+    def step(cur):
+        cur.execute(query)
+        row = cur.fetchone()
+        if row is not None:
+            raise RuntimeError(message.format(row=row))
+    return step
+
+
+# 老库的 director_dividends 里同一周期同一人可能已有多行（旧版重复发放），加唯一键前必须人工核对，不能静默删
+_DUP_DIVIDENDS_SQL = """
+    SELECT period_date, user_id, COUNT(*) AS n FROM director_dividends
+    GROUP BY period_date, user_id HAVING COUNT(*) > 1 LIMIT 1
+"""
+# 已发过的周期补进 director_dividend_runs，否则重跑这些周期会被当成没发过再发一遍；
+# 老周期没有记录奖池，按实发总额回填
+_BACKFILL_DIVIDEND_RUNS_SQL = """
+    INSERT IGNORE INTO director_dividend_runs(period_date, new_sales, pool_amount, total_paid, director_count)
+    SELECT period_date, MAX(new_sales), SUM(dividend_amount), SUM(dividend_amount), COUNT(DISTINCT user_id)
+    FROM director_dividends GROUP BY period_date
+"""
+# 有用户但闭包表一行都没有：迁移 4 之后没跑回填脚本
+_EMPTY_PATHS_SQL = "SELECT 1 FROM users WHERE NOT EXISTS (SELECT 1 FROM user_referral_paths) LIMIT 1"
+
+
+# ------------- 迁移列表（只追加，不修改） -------------
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline tables", [
+        sql(CREATE_USERS, CREATE_REFS, CREATE_AUDIT, CREATE_POINTS_LOG, CREATE_ADDRESSES,
+            CREATE_TEAM_REWARDS, CREATE_DIRECTORS, CREATE_DIRECTOR_DIVIDENDS),
+    ]),
+    Migration(2, "users six-star counters", [
+        add_column("users", "six_director", "INT NOT NULL DEFAULT 0 COMMENT '直推六星人数' AFTER member_level"),
+        add_column("users", "six_team", "INT NOT NULL DEFAULT 0 COMMENT '团队六星人数' AFTER six_director"),
+        # 早期版本是 TINYINT，直推超过 127 个六星会溢出
+        widen_column("users", "six_director", "tinyint", "INT NOT NULL DEFAULT 0 COMMENT '直推六星人数'"),
+    ]),
+    Migration(3, "users openid / is_merchant", [
+        add_column("users", "openid", "VARCHAR(64) NULL"),
+        add_index("users", "openid", "openid", unique=True),
+        add_column("users", "is_merchant", "TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否商户'"),
+    ]),
+    Migration(4, "referral closure table", [
+        sql(CREATE_REFERRAL_PATHS),
+    ], hint="老库需要执行 python src/tools/backfill_referral_paths.py，然后跑一次 DirectorService._refresh_six_counter"),
+    Migration(5, "dividend runs", [
+        refuse_if(_DUP_DIVIDENDS_SQL,
+                  "director_dividends 存在重复发放：{row}；核对并冲正多发的余额、删掉多余行后再重跑迁移"),
+        sql(CREATE_DIVIDEND_RUNS, _BACKFILL_DIVIDEND_RUNS_SQL),
+        add_index("director_dividends", "uk_period_user", "period_date, user_id", unique=True),
+    ]),
+    Migration(6, "daily sales rollup", [
+        sql(CREATE_DAILY_SALES),
+    ], hint="老库需要执行 python src/tools/rollup_sales.py --backfill"),
+    Migration(7, "keyset pagination indexes", [
+        add_index("points_log", "idx_user_type_dt", "user_id, points_type, created_at, id"),
+        add_index("audit_log", "idx_dt", "created_at, id"),
+    ]),
+    Migration(8, "totals counters", [
+        sql(CREATE_LEVEL_USER_COUNTS, CREATE_POINTS_LOG_COUNTS),
+        sql(*REBUILD_TOTALS_SQLS),
+    ]),
+    Migration(9, "referral code sequence", [
+        sql(CREATE_REFERRAL_CODE_SEQ, SEED_REFERRAL_CODE_SEQ),
+    ]),
+    Migration(10, "users direct_count / team_total", [
+        add_column("users", "direct_count", "INT NOT NULL DEFAULT 0 COMMENT '直推人数'"),
+        add_column("users", "team_total", "INT NOT NULL DEFAULT 0 COMMENT '1~6 层团队人数'"),
+        # team_total 由闭包表派生：闭包表还没回填就重算，会把所有人的团队人数算成 0
+        refuse_if(_EMPTY_PATHS_SQL,
+                  "user_referral_paths 为空但已有用户：先执行 python src/tools/backfill_referral_paths.py"
+                  "（会顺带重算直推 / 团队人数），再重跑迁移"),
+        sql(*REBUILD_TEAM_SQLS),
+    ]),
+    # 分区化要整表拷贝、期间锁写，不适合随部署自动执行，改成运维工具里的显式步骤
+    Migration(11, "monthly partitions for ledgers (manual)", [],
+              hint="流水表分区需在低峰手动执行 python src/tools/maintain_partitions.py --partition，"
+                   "之后每天执行 python src/tools/maintain_partitions.py 预建分区、归档冷数据"),
+    Migration(12, "users token_valid_after", [
+        add_column("users", "token_valid_after", "DATETIME(3) NULL COMMENT '早于此时签发的登录 token 作废'"),
+    ]),
+    Migration(13, "partition archive progress", [
+        sql(CREATE_PARTITION_ARCHIVES),
+    ]),
+    Migration(14, "referrals keyset index", [
+        add_index("user_referrals", "idx_referrer_dt", "referrer_id, created_at, user_id"),
+    ]),
+]
+
+
+# ------------- 执行 -------------
+def current_version(cur) -> int:
+    cur.execute(CREATE_SCHEMA_VERSION)
+    cur.execute("SELECT IFNULL(MAX(version), 0) AS v FROM schema_version")
+    return cur.fetchone()["v"]
+
+
+def pending(cur) -> List[Migration]:
+    v = current_version(cur)
+    return [m for m in MIGRATIONS if m.version > v]
+
+
+def migrate(conn, log=print) -> List[int]:
+    """按版本顺序执行未执行过的迁移，返回本次执行的版本号；多实例同时部署时用命名锁串行"""
+    applied = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT GET_LOCK(%s, %s) AS ok", (MIGRATE_LOCK, MIGRATE_LOCK_TIMEOUT))
+        if not cur.fetchone()["ok"]:
+            raise RuntimeError("另一个迁移正在执行")
+        try:
+            for m in pending(cur):
+                log(f"[{m.version}] {m.name} …")
+                t0 = time.perf_counter()
+                for step in m.steps:
+                    step(cur)
+                seconds = time.perf_counter() - t0
+                cur.execute("INSERT INTO schema_version(version, name, seconds) VALUES (%s,%s,%s)",
+                            (m.version, m.name, round(seconds, 3)))
+                conn.commit()
+                applied.append(m.version)
+                log(f"    完成，用时 {seconds:.1f}s")
+                if m.hint:
+                    log(f"    ⚠️ {m.hint}")
+        finally:
+            cur.execute("DO RELEASE_LOCK(%s)", (MIGRATE_LOCK,))
+    return applied
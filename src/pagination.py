@@ -0,0 +1,60 @@
+"""
+游标（keyset）分页
+按排序键 (created_at, id) 或 id 记住上一页最后一行，下一页用 WHERE 条件接着扫，
+配合 (过滤列..., 排序列..., id) 复合索引，翻到第 N 页和第 1 页代价相同。
+游标对调用方不透明：base64(JSON)，只能原样回传。
+"""
+import base64
+import datetime
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = [v.isoformat() if isinstance(v, (datetime.datetime, datetime.date)) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kinds: Sequence[type]) -> Tuple:
+    """kinds 与排序键一一对应（int / datetime.datetime / datetime.date），格式不对抛 ValueError"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(kinds):
+            raise ValueError
+        values = []
+        for v, kind in zip(raw, kinds):
+            if kind is int:
+                if not isinstance(v, int):
+                    raise ValueError
+                values.append(v)
+            else:
+                values.append(kind.fromisoformat(v))
+        return tuple(values)
+    except (ValueError, TypeError):
+        raise ValueError("无效的分页游标")
+
+
+def keyset_where(columns: Sequence[str], desc: bool = True) -> str:
+    """(a, b) 之后的行：a < ? OR (a = ? AND b < ?)；展开写法保证能走索引范围扫描"""
+    op = "<" if desc else ">"
+    parts = []
+    for i, col in enumerate(columns):
+        eqs = [f"{c} = %s" for c in columns[:i]]
+        parts.append("(" + " AND ".join(eqs + [f"{col} {op} %s"]) + ")")
+    return "(" + " OR ".join(parts) + ")"
+
+
+def keyset_args(values: Sequence) -> List:
+    """与 keyset_where 的占位符顺序对应"""
+    args = []
+    for i in range(len(values)):
+        args.extend(values[:i + 1])
+    return args
+
+
+def next_cursor(rows: List[Dict], size: int, keys: Sequence[str]) -> Optional[str]:
+    """满页时用最后一行的排序键生成下一页游标，不满页说明到底了"""
+    if len(rows) < size or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor([last[k] for k in keys])
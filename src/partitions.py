@@ -0,0 +1,277 @@
+"""
+流水类大表按月 RANGE 分区 + 冷数据归档
+每月一个分区 pYYYYMM（存 [当月1号, 次月1号)），末尾留一个 pmax 兜底；
+分区化要整表拷贝，不放进自动迁移，由运维低峰时执行 maintain_partitions.py --partition；
+之后 maintain_partitions.py 定时执行：提前建好未来几个月的分区（拆空的 pmax，瞬间完成），
+把超过保留期的整月分区归档后 DROP（按分区交换出去，不在热表上做大 DELETE）。
+带时间范围的查询写成 列 >= 起 AND 列 < 止 即可命中分区裁剪。
+MySQL 要求分区列出现在每个唯一键里，所以主键改成 (id, 分区列)；分区表不支持外键。
+"""
+import csv
+import datetime
+import gzip
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# 表 -> (分区列, 分区前需要改成的列定义；None 表示已经是 NOT NULL)
+PARTITIONED: Dict[str, Tuple[str, Optional[str]]] = {
+    "points_log": ("created_at", "DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"),
+    "audit_log": ("created_at", "DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"),
+    "team_rewards": ("created_at", None),
+    "director_dividends": ("period_date", None),
+}
+MAXVALUE = "pmax"
+EXPORT_BATCH = 10000
+
+# 归档 points_log 时从每人每类流水计数里扣掉移走的条数，/points/log 的 total 与在线数据保持一致；
+# 是否已扣记在 partition_archives.counts_adjusted
+_SUB_POINTS_COUNTS_SQL = """
+    UPDATE user_points_log_counts c
+    JOIN (
+        SELECT user_id, points_type, COUNT(*) AS cnt FROM {source} GROUP BY user_id, points_type
+    ) t ON t.user_id = c.user_id AND t.points_type = c.points_type
+    SET c.cnt = GREATEST(c.cnt - t.cnt, 0)
+"""
+
+
+class PartitionInfo(NamedTuple):
+    name: str
+    month: Optional[datetime.date]    # 分区所存月份的 1 号；pmax 为 None
+    rows: int                          # information_schema 的估算值
+
+
+# ------------- 月份工具 -------------
+def month_floor(d: datetime.date) -> datetime.date:
+    return datetime.date(d.year, d.month, 1)
+
+
+def add_months(d: datetime.date, n: int) -> datetime.date:
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return datetime.date(y, m + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _partition_defs(months: List[datetime.date], tail: bool = True) -> str:
+    parts = [f"PARTITION {partition_name(m)} VALUES LESS THAN ('{add_months(m, 1)}')" for m in months]
+    if tail:
+        parts.append(f"PARTITION {MAXVALUE} VALUES LESS THAN (MAXVALUE)")
+    return ",\n    ".join(parts)
+
+
+def prune_range(column: str, start: Optional[datetime.date], end: Optional[datetime.date]):
+    """[start, end] 两端都含的日期过滤，写成半开区间，分区裁剪和索引范围扫描都能用上"""
+    where, args = [], []
+    if start:
+        where.append(f"{column} >= %s")
+        args.append(start)
+    if end:
+        where.append(f"{column} < %s")
+        args.append(end + datetime.timedelta(days=1))
+    return where, args
+
+
+# ------------- 查询分区 -------------
+def list_partitions(cur, table: str) -> List[PartitionInfo]:
+    cur.execute(
+        "SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound, TABLE_ROWS AS `rows` "
+        "FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (table,)
+    )
+    result = []
+    for r in cur.fetchall():
+        month = None
+        if r["name"] != MAXVALUE:
+            upper = datetime.date.fromisoformat(r["bound"].strip("'")[:10])
+            month = add_months(upper, -1)
+        result.append(PartitionInfo(r["name"], month, r["rows"] or 0))
+    return result
+
+
+# ------------- 分区化（运维手动执行一次） -------------
+def _fill_null(cur, table: str, column: str) -> int:
+    """MODIFY 成 NOT NULL 之前补齐空值：严格模式下有 NULL 会直接失败，非严格模式会变成零日期落进最早的分区。
+    早期数据的时间已不可考，统一按表里最早的时间补，归档时最先被归走；按批更新避免大事务"""
+    cur.execute(f"SELECT MIN({column}) AS m FROM {table}")
+    fill = cur.fetchone()["m"] or datetime.datetime.now().replace(microsecond=0)
+    filled = 0
+    while True:
+        cur.execute(f"UPDATE {table} SET {column}=%s WHERE {column} IS NULL LIMIT %s", (fill, EXPORT_BATCH))
+        if not cur.rowcount:
+            return filled
+        filled += cur.rowcount
+
+
+def partition_table(cur, table: str, ahead: int = 3) -> Optional[str]:
+    """把普通表改成按月分区，返回第一个分区名；已分区返回 None。
+    需要整表拷贝（期间只读），只由 maintain_partitions.py --partition 在低峰手动执行，
+    数据量大时建议改用 pt-online-schema-change"""
+    if list_partitions(cur, table):
+        return None
+    column, definition = PARTITIONED[table]
+    modify = ""
+    if definition:
+        filled = _fill_null(cur, table, column)
+        if filled:
+            print(f"{table}：{filled} 行 {column} 为空，已补成最早时间")
+        modify = f"MODIFY {column} {definition}, "
+    cur.execute(f"SELECT MIN({column}) AS m FROM {table}")
+    oldest = cur.fetchone()["m"]
+    today = datetime.date.today()
+    first = month_floor(oldest if oldest else today)
+    months, m = [], first
+    while m <= add_months(month_floor(today), ahead):
+        months.append(m)
+        m = add_months(m, 1)
+    cur.execute(f"""
+        ALTER TABLE {table}
+          {modify}DROP PRIMARY KEY, ADD PRIMARY KEY (id, {column})
+        PARTITION BY RANGE COLUMNS({column}) (
+            {_partition_defs(months)}
+        )
+    """)
+    return partition_name(first)
+
+
+# ------------- 日常维护 -------------
+def ensure_future(cur, table: str, ahead: int = 3) -> List[str]:
+    """保证从本月起往后 ahead 个月都有独立分区，返回新建的分区名"""
+    parts = list_partitions(cur, table)
+    if not parts:
+        raise ValueError(f"{table} 还不是分区表，请先执行 python src/tools/maintain_partitions.py --partition")
+    bounded = [p.month for p in parts if p.month]
+    target = add_months(month_floor(datetime.date.today()), ahead)
+    m = add_months(max(bounded), 1) if bounded else month_floor(datetime.date.today())
+    months = []
+    while m <= target:
+        months.append(m)
+        m = add_months(m, 1)
+    if months:
+        # pmax 正常是空的，拆分只改元数据
+        cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {MAXVALUE} INTO ({_partition_defs(months)})")
+    return [partition_name(m) for m in months]
+
+
+def ensure_past(cur, table: str, since: datetime.date) -> List[str]:
+    """保证从 since 所在月份起都有独立分区：在最早的分区前面拆出来，返回新建的分区名。
+    空表分区化时只从本月开始建，导入历史数据（造数据集）前先调用，否则旧数据全挤进最早的分区；
+    最早分区里已有数据时 REORGANIZE 要拷贝这个分区"""
+    parts = list_partitions(cur, table)
+    if not parts:
+        raise ValueError(f"{table} 还不是分区表，请先执行 python src/tools/maintain_partitions.py --partition")
+    bounded = [p for p in parts if p.month]
+    first = bounded[0] if bounded else None
+    stop = first.month if first else add_months(month_floor(datetime.date.today()), 1)
+    months, m = [], month_floor(since)
+    while m < stop:
+        months.append(m)
+        m = add_months(m, 1)
+    if months:
+        if first:
+            cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {first.name} INTO "
+                        f"({_partition_defs(months + [first.month], tail=False)})")
+        else:
+            cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {MAXVALUE} INTO ({_partition_defs(months)})")
+    return [partition_name(m) for m in months]
+
+
+def cold_partitions(cur, table: str, keep_months: int) -> List[PartitionInfo]:
+    """整月都早于 (本月 - keep_months) 的分区"""
+    cutoff = add_months(month_floor(datetime.date.today()), -keep_months)
+    return [p for p in list_partitions(cur, table) if p.month and p.month < cutoff]
+
+
+def _table_exists(cur, name: str) -> bool:
+    cur.execute("SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s", (name,))
+    return cur.fetchone() is not None
+
+
+def _empty(cur, source: str) -> bool:
+    cur.execute(f"SELECT 1 FROM {source} LIMIT 1")
+    return cur.fetchone() is None
+
+
+def _compressed(cur, name: str) -> bool:
+    cur.execute("SELECT ROW_FORMAT AS f FROM information_schema.TABLES WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s",
+                (name,))
+    row = cur.fetchone()
+    return row is not None and (row["f"] or "").lower() == "compressed"
+
+
+# ------------- 归档进度 -------------
+def _start_archive(cur, table: str, part: PartitionInfo, target: str):
+    cur.execute("INSERT IGNORE INTO partition_archives(table_name, partition_name, target) VALUES (%s,%s,%s)",
+                (table, part.name, target))
+
+
+def _adjust_counts_once(cur, table: str, part: PartitionInfo, source: str):
+    """从 points_log 计数里扣掉归档走的条数；和进度标记同一事务，上次扣过就不再扣"""
+    if table != "points_log":
+        return
+    conn = cur.connection
+    conn.begin()
+    cur.execute("UPDATE partition_archives SET counts_adjusted=1 "
+                "WHERE table_name=%s AND partition_name=%s AND counts_adjusted=0", (table, part.name))
+    if cur.rowcount:
+        cur.execute(_SUB_POINTS_COUNTS_SQL.format(source=source))
+    conn.commit()
+
+
+def _drop_archived(cur, table: str, part: PartitionInfo):
+    cur.execute(f"ALTER TABLE {table} DROP PARTITION {part.name}")
+    cur.execute("UPDATE partition_archives SET finished_at=NOW() WHERE table_name=%s AND partition_name=%s",
+                (table, part.name))
+
+
+def archive_to_table(cur, table: str, part: PartitionInfo) -> str:
+    """分区交换到独立的压缩表 {table}_arch_YYYYMM，再删掉空分区；返回归档表名。
+    每一步都可重跑：进度记在 partition_archives，中途失败后再执行一次即可"""
+    arch = f"{table}_arch_{part.month:%Y%m}"
+    _start_archive(cur, table, part, arch)
+    if _table_exists(cur, arch) and not _empty(cur, f"{table} PARTITION ({part.name})"):
+        if not _empty(cur, arch):
+            raise ValueError(f"{arch} 已存在但分区 {part.name} 仍有数据，请人工核对")
+        # 上次建好归档表还没来得及交换
+        cur.execute(f"DROP TABLE {arch}")
+    if not _table_exists(cur, arch):
+        cur.execute(f"CREATE TABLE {arch} LIKE {table}")
+        cur.execute(f"ALTER TABLE {arch} REMOVE PARTITIONING")
+        # 交换只改元数据，热表上没有大事务
+        cur.execute(f"ALTER TABLE {table} EXCHANGE PARTITION {part.name} WITH TABLE {arch}")
+    _adjust_counts_once(cur, table, part, arch)
+    if not _compressed(cur, arch):
+        cur.execute(f"ALTER TABLE {arch} ROW_FORMAT=COMPRESSED")
+    _drop_archived(cur, table, part)
+    return arch
+
+
+def archive_to_file(cur, table: str, part: PartitionInfo, directory: str) -> Tuple[str, int]:
+    """分区按 id 分批导出成 gzip CSV（先写临时文件再改名），然后删掉分区；返回 (文件路径, 行数)。
+    中途失败重跑会重新导出覆盖同名文件，计数只扣一次"""
+    os.makedirs(os.path.join(directory, table), exist_ok=True)
+    path = os.path.join(directory, table, f"{part.name}.csv.gz")
+    _start_archive(cur, table, part, path)
+    tmp = path + ".tmp"
+    rows, last_id = 0, 0
+    with gzip.open(tmp, "wt", newline="", encoding="utf-8") as f:
+        writer = None
+        while True:
+            cur.execute(f"SELECT * FROM {table} PARTITION ({part.name}) WHERE id > %s ORDER BY id LIMIT %s",
+                        (last_id, EXPORT_BATCH))
+            batch = cur.fetchall()
+            if not batch:
+                break
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(batch[0].keys()))
+                writer.writeheader()
+            writer.writerows(batch)
+            rows += len(batch)
+            last_id = batch[-1]["id"]
+    os.replace(tmp, path)
+    _adjust_counts_once(cur, table, part, f"{table} PARTITION ({part.name})")
+    _drop_archived(cur, table, part)
+    return path, rows
@@ -1,19 +1,203 @@
-from src.config import get_conn
+import asyncio
+import csv
+import io
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from src.config import get_conn, pin_session_user
+from src.aio_db import aget_conn
+from src.points_writer import POINTS_TYPES, PointsChange, apply_points_batch, aapply_points_batch, points_writer
+from src.totals import bump_points_log_counts, abump_points_log_counts
+from src.profile_cache import invalidate_profiles
+
+_UPDATE_SQL = {
+    "member": "UPDATE users SET member_points=member_points+%s WHERE id=%s",
+    "merchant": "UPDATE users SET merchant_points=merchant_points+%s WHERE id=%s",
+}
+_INSERT_LOG_SQL = "INSERT INTO points_log(user_id, points_type, change_amount, reason) VALUES (%s,%s,%s,%s)"
 
 
 def add_points(user_id: int, points_type: str, amount: int, reason: str = "系统赠送"):
-    """积分变动：写流水 + 更新余额"""
-    if points_type not in ["member", "merchant"]:
+    """积分变动：写流水 + 更新余额（同一事务；启用组提交时排队合并写入，落库后返回）"""
+    if points_type not in POINTS_TYPES:
         raise ValueError("无效的积分类型")
+    writer = points_writer()
+    if writer:
+        writer.submit(user_id, points_type, amount, reason).result()
+        pin_session_user(user_id)
+        invalidate_profiles(user_id)
+        return
     with get_conn() as conn:
         with conn.cursor() as cur:
-            # 1. 更新余额
-            if points_type == "member":
-                cur.execute("UPDATE users SET member_points=member_points+%s WHERE id=%s", (amount, user_id))
-            else:
-                cur.execute("UPDATE users SET merchant_points=merchant_points+%s WHERE id=%s", (amount, user_id))
-            # 2. 写流水
-            cur.execute(
-                "INSERT INTO points_log(user_id, points_type, change_amount, reason) VALUES (%s,%s,%s,%s)",
-                (user_id, points_type, amount, reason)
-            )
\ No newline at end of file
+            conn.begin()
+            try:
+                # 1. 更新余额
+                cur.execute(_UPDATE_SQL[points_type], (amount, user_id))
+                # 2. 写流水
+                cur.execute(_INSERT_LOG_SQL, (user_id, points_type, amount, reason))
+                bump_points_log_counts(cur, [(user_id, points_type)])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    invalidate_profiles(user_id)
+
+
+async def add_points_async(user_id: int, points_type: str, amount: int, reason: str = "系统赠送"):
+    """add_points 的 asyncio 版本"""
+    if points_type not in POINTS_TYPES:
+        raise ValueError("无效的积分类型")
+    writer = points_writer()
+    if writer:
+        await asyncio.wrap_future(writer.submit(user_id, points_type, amount, reason))
+        pin_session_user(user_id)
+        invalidate_profiles(user_id)
+        return
+    async with aget_conn() as conn:
+        async with conn.cursor() as cur:
+            await conn.begin()
+            try:
+                await cur.execute(_UPDATE_SQL[points_type], (amount, user_id))
+                await cur.execute(_INSERT_LOG_SQL, (user_id, points_type, amount, reason))
+                await abump_points_log_counts(cur, [(user_id, points_type)])
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+    invalidate_profiles(user_id)
+
+
+# ------------- 批量发放（活动用） -------------
+_RESOLVE_MOBILES_SQL = "SELECT id, mobile FROM users WHERE mobile IN ({marks})"
+_EXISTING_IDS_SQL = "SELECT id FROM users WHERE id IN ({marks})"
+
+
+def parse_points_csv(text: str) -> List[Dict]:
+    """CSV 表头：mobile,user_id,points_type,amount,reason（mobile / user_id 二选一，reason 可省略）"""
+    return [dict(r) for r in csv.DictReader(io.StringIO(text.lstrip("\ufeff")))]
+
+
+def _validate_rows(rows: Iterable[Dict]) -> Tuple[List[Tuple], List[Dict]]:
+    """校验每一行，返回 ([(行号, mobile, user_id, 类型, 数量, 原因)], 失败列表)"""
+    valid, failures = [], []
+    for idx, r in enumerate(rows):
+        mobile = (r.get("mobile") or "").strip() or None
+        user_id = r.get("user_id") or None
+        points_type = (r.get("points_type") or "").strip()
+        reason = r.get("reason") or "系统赠送"
+        try:
+            if user_id is not None:
+                user_id = int(user_id)
+            amount = int(r.get("amount"))
+        except (TypeError, ValueError):
+            failures.append({"row": idx, "error": "user_id / amount 必须是整数"})
+            continue
+        if not mobile and not user_id:
+            failures.append({"row": idx, "error": "mobile 和 user_id 至少填一个"})
+        elif points_type not in POINTS_TYPES:
+            failures.append({"row": idx, "error": "无效的积分类型"})
+        elif len(reason) > 255:
+            failures.append({"row": idx, "error": "reason 不能超过 255 个字符"})
+        else:
+            valid.append((idx, mobile, user_id, points_type, amount, reason))
+    return valid, failures
+
+
+def _chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _in_sql(sql: str, n: int) -> str:
+    return sql.format(marks=",".join(["%s"] * n))
+
+
+def _plan_changes(valid, by_mobile: Dict[str, int], known_ids: set, failures: List[Dict]):
+    """把行映射成 (行号, PointsChange)，找不到用户的记入失败"""
+    planned = []
+    for idx, mobile, user_id, points_type, amount, reason in valid:
+        uid = user_id if user_id else by_mobile.get(mobile)
+        if not uid or (user_id and user_id not in known_ids):
+            failures.append({"row": idx, "error": "用户不存在"})
+            continue
+        planned.append((idx, PointsChange(uid, points_type, amount, reason)))
+    return planned
+
+
+def _report(total: int, applied: int, chunks: int, failures: List[Dict], started: float) -> Dict:
+    elapsed = time.perf_counter() - started
+    failures.sort(key=lambda f: f["row"])
+    return {
+        "total": total,
+        "succeeded": applied,
+        "failed": len(failures),
+        "failures": failures,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(applied / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def bulk_add_points(rows: List[Dict], chunk: int = 1000) -> Dict:
+    """批量积分变动：批量解析用户 → 每 chunk 行一个事务（按用户合并余额 + executemany 写流水）
+    单行校验 / 找不到用户记入 failures；某个事务失败只影响该 chunk 内的行"""
+    started = time.perf_counter()
+    valid, failures = _validate_rows(rows)
+    mobiles = sorted({v[1] for v in valid if not v[2]})
+    user_ids = sorted({v[2] for v in valid if v[2]})
+    by_mobile, known_ids, applied, chunks = {}, set(), 0, 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for part in _chunks(mobiles, chunk):
+                cur.execute(_in_sql(_RESOLVE_MOBILES_SQL, len(part)), part)
+                by_mobile.update((r["mobile"], r["id"]) for r in cur.fetchall())
+            for part in _chunks(user_ids, chunk):
+                cur.execute(_in_sql(_EXISTING_IDS_SQL, len(part)), part)
+                known_ids.update(r["id"] for r in cur.fetchall())
+            planned = _plan_changes(valid, by_mobile, known_ids, failures)
+            for part in _chunks(planned, chunk):
+                chunks += 1
+                conn.begin()
+                try:
+                    apply_points_batch(cur, [c for _, c in part])
+                    conn.commit()
+                    applied += len(part)
+                    touched = {c.user_id for _, c in part}
+                    pin_session_user(*touched)
+                    invalidate_profiles(*touched)
+                except Exception as e:
+                    conn.rollback()
+                    failures.extend({"row": idx, "error": str(e)} for idx, _ in part)
+    return _report(len(rows), applied, chunks, failures, started)
+
+
+async def bulk_add_points_async(rows: List[Dict], chunk: int = 1000) -> Dict:
+    """bulk_add_points 的 asyncio 版本"""
+    started = time.perf_counter()
+    valid, failures = _validate_rows(rows)
+    mobiles = sorted({v[1] for v in valid if not v[2]})
+    user_ids = sorted({v[2] for v in valid if v[2]})
+    by_mobile, known_ids, applied, chunks = {}, set(), 0, 0
+    async with aget_conn() as conn:
+        async with conn.cursor() as cur:
+            for part in _chunks(mobiles, chunk):
+                await cur.execute(_in_sql(_RESOLVE_MOBILES_SQL, len(part)), part)
+                by_mobile.update((r["mobile"], r["id"]) for r in await cur.fetchall())
+            for part in _chunks(user_ids, chunk):
+                await cur.execute(_in_sql(_EXISTING_IDS_SQL, len(part)), part)
+                known_ids.update(r["id"] for r in await cur.fetchall())
+            planned = _plan_changes(valid, by_mobile, known_ids, failures)
+            for part in _chunks(planned, chunk):
+                chunks += 1
+                await conn.begin()
+                try:
+                    await aapply_points_batch(cur, [c for _, c in part])
+                    await conn.commit()
+                    applied += len(part)
+                    touched = {c.user_id for _, c in part}
+                    pin_session_user(*touched)
+                    invalidate_profiles(*touched)
+                except Exception as e:
+                    await conn.rollback()
+                    failures.extend({"row": idx, "error": str(e)} for idx, _ in part)
+    return _report(len(rows), applied, chunks, failures, started)
@@ -0,0 +1,193 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, NamedTuple
+
+import pymysql
+
+from src.config import get_conn, POINTS_WRITER_CFG, PoolTimeoutError
+from src.totals import bump_points_log_counts, abump_points_log_counts
+
+POINTS_TYPES = ("member", "merchant")
+
+
+class PointsWriterBusyError(Exception):
+    """组提交队列已满（写入跟不上时快速失败，而不是无限堆积）"""
+
+
+class PointsChange(NamedTuple):
+    user_id: int
+    points_type: str
+    amount: int
+    reason: str
+
+
+_INSERT_LOG_SQL = "INSERT INTO points_log(user_id, points_type, change_amount, reason) VALUES (%s,%s,%s,%s)"
+# 按用户合并后的余额增量，一条 UPDATE ... JOIN 派生表写完
+_APPLY_DELTA_SQL = """
+    UPDATE users u
+    JOIN ({rows}) d ON d.id = u.id
+    SET u.member_points = u.member_points + d.m, u.merchant_points = u.merchant_points + d.n
+"""
+_DELTA_ROW = "SELECT %s AS id, %s AS m, %s AS n"
+
+_STOP = object()
+# 连接类异常：重试单条也没用，整批直接失败
+_TRANSIENT_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError, PoolTimeoutError)
+
+
+def _delta_args(changes: List[PointsChange]):
+    deltas = {}
+    for c in changes:
+        m, n = deltas.get(c.user_id, (0, 0))
+        if c.points_type == "member":
+            m += c.amount
+        else:
+            n += c.amount
+        deltas[c.user_id] = (m, n)
+    args = [v for uid, (m, n) in sorted(deltas.items()) for v in (uid, m, n)]
+    return _APPLY_DELTA_SQL.format(rows=" UNION ALL ".join([_DELTA_ROW] * len(deltas))), args
+
+
+def apply_points_batch(cur, changes: List[PointsChange]):
+    """一批积分变动：按用户合并余额增量 + 批量写流水，调用方负责事务"""
+    cur.execute(*_delta_args(changes))
+    cur.executemany(_INSERT_LOG_SQL, [tuple(c) for c in changes])
+    bump_points_log_counts(cur, [(c.user_id, c.points_type) for c in changes])
+
+
+async def aapply_points_batch(cur, changes: List[PointsChange]):
+    await cur.execute(*_delta_args(changes))
+    await cur.executemany(_INSERT_LOG_SQL, [tuple(c) for c in changes])
+    await abump_points_log_counts(cur, [(c.user_id, c.points_type) for c in changes])
+
+
+class PointsWriter:
+    """积分组提交：后台线程攒 window 秒（或 max_batch 条）后一个事务落库，提交成功才 ack
+
+    一次 commit 覆盖整批，吞吐随批大小增长而不是受限于每次 fsync。
+    库连不上 / 连接池耗尽时批内所有 future 都拿到同一个异常；其它异常（超长、约束等数据问题）
+    把批对半拆开分别重试，最终只有出问题的那条变动失败，不连累同批的其他调用方。
+    """
+
+    def __init__(self, window: float = 0.005, max_batch: int = 500, max_queue: int = 10000):
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue" = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {"submitted": 0, "flushes": 0, "flushed": 0, "failed": 0, "splits": 0,
+                       "rejected": 0, "max_batch_seen": 0, "flush_seconds": 0.0, "max_flush_seconds": 0.0}
+
+    def submit(self, user_id: int, points_type: str, amount: int, reason: str) -> Future:
+        """排队一条变动，返回在该变动提交后完成的 Future"""
+        self._ensure_started()
+        fut = Future()
+        try:
+            self._queue.put_nowait((PointsChange(user_id, points_type, amount, reason), fut))
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise PointsWriterBusyError("积分写入繁忙，请稍后重试")
+        with self._lock:
+            self._stats["submitted"] += 1
+        return fut
+
+    # ------------- 内部 -------------
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="points-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        t0 = time.perf_counter()
+        try:
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    conn.begin()
+                    try:
+                        apply_points_batch(cur, [c for c, _ in batch])
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+        except Exception as e:
+            if len(batch) > 1 and not isinstance(e, _TRANSIENT_ERRORS):
+                with self._lock:
+                    self._stats["splits"] += 1
+                mid = len(batch) // 2
+                self._flush(batch[:mid])
+                self._flush(batch[mid:])
+                return
+            with self._lock:
+                self._stats["failed"] += len(batch)
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            s = self._stats
+            s["flushes"] += 1
+            s["flushed"] += len(batch)
+            s["max_batch_seen"] = max(s["max_batch_seen"], len(batch))
+            s["flush_seconds"] += elapsed
+            s["max_flush_seconds"] = max(s["max_flush_seconds"], elapsed)
+        for _, fut in batch:
+            fut.set_result(True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self._queue.qsize()
+        s["avg_batch"] = s["flushed"] / s["flushes"] if s["flushes"] else 0.0
+        s["avg_flush_seconds"] = s["flush_seconds"] / s["flushes"] if s["flushes"] else 0.0
+        return s
+
+    def shutdown(self, timeout: float = 10.0):
+        """把已排队的变动刷完再退出"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+
+_writer = PointsWriter(**{k: v for k, v in POINTS_WRITER_CFG.items() if k != "enabled"}) \
+    if POINTS_WRITER_CFG["enabled"] else None
+
+
+def points_writer():
+    """启用组提交时返回全局 writer，否则 None"""
+    return _writer
+
+
+def points_writer_stats() -> dict:
+    return _writer.stats() if _writer else {"enabled": False}
+
+
+def shutdown_points_writer():
+    if _writer:
+        _writer.shutdown()
@@ -0,0 +1,168 @@
+"""
+个人中心（/user/info）聚合数据：一条 SQL 取齐本人资料、资产、推荐人和团队计数，外面套一层按 user_id 的缓存
+资料 / 积分 / 等级 / 推荐关系写入后由写方调用 invalidate_profiles；
+推荐人改昵称 / 等级不会逐个清下级的缓存，最多陈旧 ttl 秒。
+同一用户并发未命中时只有第一个请求查库，其余等它的结果（防热点账号击穿）。
+只在本进程内有效，多 worker 部署时其它进程最多陈旧 ttl 秒。
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from src.config import PROFILE_CFG
+from src.aio_db import aget_conn
+
+_PROFILE_SQL = """
+    SELECT u.id, u.mobile, u.name, u.avatar_path, u.member_level, u.referral_code,
+           u.direct_count, u.team_total, u.member_points, u.merchant_points, u.withdrawable_balance,
+           ru.mobile AS ref_mobile, ru.name AS ref_name, ru.member_level AS ref_level
+    FROM users u
+    LEFT JOIN user_referrals r ON r.user_id = u.id
+    LEFT JOIN users ru ON ru.id = r.referrer_id
+    WHERE u.id=%s AND u.status != %s
+"""
+_STATUS_DELETED = 2   # 与 UserStatus.DELETED 一致；这里不 import user_service，避免循环依赖
+
+
+def _to_profile(row: dict) -> dict:
+    return {
+        "uid": row["id"],
+        "mobile": row["mobile"],
+        "name": row["name"],
+        "avatar_path": row["avatar_path"],
+        "member_level": row["member_level"],
+        "referral_code": row["referral_code"],
+        "direct_count": row["direct_count"],
+        "team_total": row["team_total"],
+        "assets": {
+            "member_points": row["member_points"],
+            "merchant_points": row["merchant_points"],
+            "withdrawable_balance": row["withdrawable_balance"],
+        },
+        "referrer": {
+            "mobile": row["ref_mobile"],
+            "name": row["ref_name"],
+            "member_level": row["ref_level"],
+        } if row["ref_mobile"] is not None else None,
+    }
+
+
+async def _load(user_id: int) -> Optional[dict]:
+    async with aget_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(_PROFILE_SQL, (user_id, _STATUS_DELETED))
+            row = await cur.fetchone()
+    return _to_profile(row) if row else None
+
+
+class ProfileCache:
+    """user_id → 个人中心数据 的 LRU + TTL 缓存，未命中时按 user_id 合并并发加载"""
+
+    def __init__(self, max_size: int = 50000, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()   # user_id -> (profile, expire_at)
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._lock = threading.Lock()    # 失效可能来自积分组提交线程
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._invalidations = 0
+
+    async def aget(self, user_id: int) -> Optional[dict]:
+        now = time.monotonic()
+        leader = False
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(user_id)
+                self._hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[user_id]
+            fut = self._inflight.get(user_id)
+            if fut is not None:
+                self._coalesced += 1
+            else:
+                self._misses += 1
+                fut = asyncio.get_running_loop().create_future()
+                self._inflight[user_id] = fut
+                leader = True
+        if not leader:
+            try:
+                # shield：某个等待者被取消不影响其它人
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if fut.cancelled():
+                    # 领头的请求被取消（客户端断开），重新排一次
+                    return await self.aget(user_id)
+                raise
+        try:
+            profile = await _load(user_id)
+        except BaseException as e:
+            with self._lock:
+                if self._inflight.get(user_id) is fut:
+                    del self._inflight[user_id]
+            if isinstance(e, Exception):
+                fut.set_exception(e)
+                fut.exception()   # 没有等待者时也不报 "exception was never retrieved"
+            else:
+                fut.cancel()
+            raise
+        with self._lock:
+            # 加载期间被失效过（_inflight 已被清掉）就不回填，避免把旧数据写回缓存
+            if self._inflight.get(user_id) is fut:
+                del self._inflight[user_id]
+                if profile is not None and self.ttl > 0:
+                    self._data[user_id] = (profile, time.monotonic() + self.ttl)
+                    self._data.move_to_end(user_id)
+                    while len(self._data) > self.max_size:
+                        self._data.popitem(last=False)
+        fut.set_result(profile)
+        return profile
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            for uid in user_ids:
+                if self._data.pop(uid, None) is not None:
+                    self._invalidations += 1
+                self._inflight.pop(uid, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._inflight.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "hit_rate": (self._hits + self._coalesced) / lookups if lookups else 0.0,
+                "inflight": len(self._inflight),
+                "invalidations": self._invalidations,
+            }
+
+
+_cache = ProfileCache(**PROFILE_CFG)
+
+
+async def aget_profile(user_id: int) -> Optional[dict]:
+    """个人中心数据；用户不存在或已注销返回 None"""
+    return await _cache.aget(user_id)
+
+
+def invalidate_profiles(*user_ids: int):
+    """资料 / 积分 / 等级 / 推荐关系写入提交后调用"""
+    _cache.invalidate(*user_ids)
+
+
+def profile_cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,214 @@
+import asyncio
+import multiprocessing
+import secrets
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+from src.config import BCRYPT_CFG
+from src.metrics import bcrypt_latency, bcrypt_rejected
+
+# 微信等免密账号使用的占位哈希，bcrypt 不可能生成 '!' 开头的值，校验恒为 False
+UNUSABLE_PREFIX = "!"
+
+
+class HasherBusyError(Exception):
+    """排队等待哈希槽位超时（登录洪峰时快速失败，而不是无限堆积）"""
+
+
+# ------------- 子进程里执行的函数（必须是模块级才能被 pickle） -------------
+def _hash_job(pwd: bytes, rounds: int):
+    t0 = time.perf_counter()
+    hashed = bcrypt.hashpw(pwd, bcrypt.gensalt(rounds))
+    return hashed, time.perf_counter() - t0
+
+
+def _verify_job(pwd: bytes, hashed: bytes):
+    t0 = time.perf_counter()
+    ok = bcrypt.checkpw(pwd, hashed)
+    return ok, time.perf_counter() - t0
+
+
+class PasswordHasher:
+    """bcrypt 计算后端：process（多进程，随 CPU 核数扩展）/ thread / inline，带并发上限和耗时统计"""
+
+    def __init__(self, backend: str = "process", workers: int = 2, max_concurrency: int = 0,
+                 rounds: int = 12, timeout: float = 10.0):
+        if backend not in ("process", "thread", "inline"):
+            raise ValueError(f"未知的 bcrypt 后端：{backend}")
+        self.backend = backend
+        self.workers = max(1, workers)
+        # 同时在算 + 在排队的任务上限，默认每个 worker 最多排 2 个
+        self.max_concurrency = max_concurrency or self.workers * 2
+        self.rounds = rounds
+        self.timeout = timeout
+
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._sync_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._async_slots_loop = None
+        self._stats = {
+            op: {"count": 0, "total_seconds": 0.0, "cpu_seconds": 0.0, "max_seconds": 0.0, "rejected": 0}
+            for op in ("hash", "verify")
+        }
+        self._inflight = 0
+
+    # ------------- 同步接口（脚本 / 工具用） -------------
+    def hash(self, pwd: str) -> str:
+        hashed = self._run_sync("hash", _hash_job, pwd.encode(), self.rounds)
+        return hashed.decode()
+
+    def verify(self, pwd: str, hashed: str) -> bool:
+        if not hashed or hashed.startswith(UNUSABLE_PREFIX):
+            return False
+        return self._run_sync("verify", _verify_job, pwd.encode(), hashed.encode())
+
+    # ------------- 异步接口（路由用，不占事件循环） -------------
+    async def hash_async(self, pwd: str) -> str:
+        hashed = await self._run_async("hash", _hash_job, pwd.encode(), self.rounds)
+        return hashed.decode()
+
+    async def verify_async(self, pwd: str, hashed: str) -> bool:
+        if not hashed or hashed.startswith(UNUSABLE_PREFIX):
+            return False
+        return await self._run_async("verify", _verify_job, pwd.encode(), hashed.encode())
+
+    # ------------- 内部 -------------
+    def _run_sync(self, op: str, fn, *args):
+        if not self._sync_slots.acquire(timeout=self.timeout):
+            self._reject(op)
+        t0 = time.perf_counter()
+        self._enter()
+        try:
+            if self.backend == "inline":
+                result, cpu = fn(*args)
+            else:
+                result, cpu = self._get_executor().submit(fn, *args).result()
+        finally:
+            self._leave()
+            self._sync_slots.release()
+        self._record(op, time.perf_counter() - t0, cpu)
+        return result
+
+    async def _run_async(self, op: str, fn, *args):
+        slots = self._get_async_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._reject(op)
+        t0 = time.perf_counter()
+        self._enter()
+        try:
+            if self.backend == "inline":
+                result, cpu = fn(*args)
+            else:
+                loop = asyncio.get_running_loop()
+                result, cpu = await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._leave()
+            slots.release()
+        self._record(op, time.perf_counter() - t0, cpu)
+        return result
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.backend == "process":
+                        # spawn：不继承父进程里的连接池 socket / 事件循环线程
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _get_async_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._async_slots is None or self._async_slots_loop is not loop:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+            self._async_slots_loop = loop
+        return self._async_slots
+
+    def _enter(self):
+        with self._lock:
+            self._inflight += 1
+
+    def _leave(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def _reject(self, op: str):
+        with self._lock:
+            self._stats[op]["rejected"] += 1
+        bcrypt_rejected.inc(op)
+        raise HasherBusyError(f"密码校验繁忙，请稍后重试（并发上限 {self.max_concurrency}）")
+
+    def _record(self, op: str, elapsed: float, cpu: float):
+        bcrypt_latency.observe(elapsed, op)
+        with self._lock:
+            s = self._stats[op]
+            s["count"] += 1
+            s["total_seconds"] += elapsed
+            s["cpu_seconds"] += cpu
+            s["max_seconds"] = max(s["max_seconds"], elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            ops = {}
+            for op, s in self._stats.items():
+                avg = s["total_seconds"] / s["count"] if s["count"] else 0.0
+                ops[op] = {**s, "avg_seconds": avg}
+            return {
+                "backend": self.backend,
+                "workers": self.workers,
+                "max_concurrency": self.max_concurrency,
+                "rounds": self.rounds,
+                "inflight": self._inflight,
+                **ops,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher = PasswordHasher(**BCRYPT_CFG)
+
+
+def hash_pwd(pwd: str) -> str:
+    """密码加密"""
+    return _hasher.hash(pwd)
+
+
+def verify_pwd(pwd: str, hashed: str) -> bool:
+    """密码校验"""
+    return _hasher.verify(pwd, hashed)
+
+
+async def hash_pwd_async(pwd: str) -> str:
+    """密码加密（在进程池里算，不阻塞事件循环）"""
+    return await _hasher.hash_async(pwd)
+
+
+async def verify_pwd_async(pwd: str, hashed: str) -> bool:
+    """密码校验（在进程池里算，不阻塞事件循环）"""
+    return await _hasher.verify_async(pwd, hashed)
+
+
+def make_unusable_hash() -> str:
+    """免密账号的占位哈希：不跑 bcrypt，也永远校验不通过"""
+    return UNUSABLE_PREFIX + secrets.token_hex(16)
+
+
+def hasher_stats() -> dict:
+    return _hasher.stats()
+
+
+def shutdown_hasher():
+    _hasher.shutdown()
@@ -0,0 +1,168 @@
+"""
+推荐码分配：序号 → 带密钥的 Feistel 置换（2^30 内的双射）→ 6 位 32 进制（不含 0O1I）
+不同序号必然得到不同的码，注册时不需要查库判重；看起来仍是随机的，无法从码反推注册顺序。
+序号按块从 referral_code_seq 领取（每 block_size 个号才写一次库），进程内顺序发放；
+领号段总是用一条单独借出的自动提交连接，不进调用方的注册事务：号段行锁不会跟着长事务，
+注册事务回滚也不会把已经在用的号段"退回去"再发给别的进程。
+历史数据里的随机码可能与新码撞上，INSERT 报 1062 时换下一个号重试即可。
+密钥上线后不要再改，否则新码会与已发出的码大量冲突。
+"""
+import hashlib
+import os
+import threading
+from collections import deque
+
+import pymysql
+
+from src.config import REFERRAL_CODE_CFG, get_conn
+from src.aio_db import aget_conn
+
+ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH   # 2^30
+_HALF_BITS = 15
+_HALF_MASK = (1 << _HALF_BITS) - 1
+# 撞上历史随机码的概率很低，连续撞这么多次基本说明配置有问题
+CODE_RETRIES = 5
+
+_NEXT_BLOCK_SQL = "UPDATE referral_code_seq SET next_val = LAST_INSERT_ID(next_val + %s) WHERE id = 1"
+_LAST_ID_SQL = "SELECT LAST_INSERT_ID() AS v"
+_SEED_SQL = "INSERT IGNORE INTO referral_code_seq(id, next_val) VALUES (1, 0)"
+# 早期版本写死的默认密钥，代码公开后码可被推算；没配 REFERRAL_CODE_KEY 时沿用它以免与已发出的码冲突
+_LEGACY_KEY = "user_mgr_referral_code"
+
+
+def is_code_conflict(e: Exception) -> bool:
+    return isinstance(e, pymysql.err.IntegrityError) and e.args[0] == 1062 and "referral_code" in str(e.args[1])
+
+
+class ReferralCodeAllocator:
+    def __init__(self, key: str, block_size: int = 1000, rounds: int = 4):
+        if not key:
+            key = _LEGACY_KEY
+            print("⚠️ 未配置 REFERRAL_CODE_KEY，推荐码使用公开的默认密钥，可从码反推注册顺序；"
+                  "生产环境请在首次上线前配置（上线后不能再改）")
+        self.block_size = max(1, block_size)
+        self._round_keys = [hashlib.blake2b(f"{key}:{i}".encode(), digest_size=16).digest() for i in range(rounds)]
+        self._blocks: deque = deque()   # [next, end)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    # ------------- 编码 -------------
+    def _f(self, half: int, rk: bytes) -> int:
+        digest = hashlib.blake2b(half.to_bytes(2, "big"), key=rk, digest_size=2).digest()
+        return int.from_bytes(digest, "big") & _HALF_MASK
+
+    def permute(self, seq: int) -> int:
+        """[0, 2^30) 上的双射"""
+        left, right = seq >> _HALF_BITS, seq & _HALF_MASK
+        for rk in self._round_keys:
+            left, right = right, left ^ self._f(right, rk)
+        return (left << _HALF_BITS) | right
+
+    def encode(self, seq: int) -> str:
+        if not 0 <= seq < CODE_SPACE:
+            raise RuntimeError("推荐码序号已用尽")
+        n = self.permute(seq)
+        chars = []
+        for _ in range(CODE_LENGTH):
+            n, r = divmod(n, len(ALPHABET))
+            chars.append(ALPHABET[r])
+        return "".join(reversed(chars))
+
+    # ------------- 发号 -------------
+    def _take(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork 出来的子进程不能接着用父进程领到的号段
+                self._blocks.clear()
+                self._pid = os.getpid()
+            while self._blocks:
+                start, end = self._blocks[0]
+                if start < end:
+                    self._blocks[0] = (start + 1, end)
+                    return start
+                self._blocks.popleft()
+            return None
+
+    def _add_block(self, end: int):
+        with self._lock:
+            self._blocks.append((end - self.block_size, end))
+
+    def next_code(self) -> str:
+        """领一个新码；号段用完时借一条单独的连接领下一段（每 block_size 个号一次）"""
+        seq = self._take()
+        while seq is None:
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(_NEXT_BLOCK_SQL, (self.block_size,))
+                    if not cur.rowcount:
+                        cur.execute(_SEED_SQL)
+                        continue
+                    cur.execute(_LAST_ID_SQL)
+                    self._add_block(cur.fetchone()["v"])
+            seq = self._take()
+        return self.encode(seq)
+
+    async def anext_code(self) -> str:
+        seq = self._take()
+        while seq is None:
+            async with aget_conn() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(_NEXT_BLOCK_SQL, (self.block_size,))
+                    if not cur.rowcount:
+                        await cur.execute(_SEED_SQL)
+                        continue
+                    await cur.execute(_LAST_ID_SQL)
+                    self._add_block((await cur.fetchone())["v"])
+            seq = self._take()
+        return self.encode(seq)
+
+
+_allocator = ReferralCodeAllocator(**REFERRAL_CODE_CFG)
+
+
+def next_referral_code() -> str:
+    return _allocator.next_code()
+
+
+async def anext_referral_code() -> str:
+    return await _allocator.anext_code()
+
+
+def reserve_referral_seqs(cur, n: int) -> range:
+    """批量导入用：一次领 n 个连续序号（不经过进程内号段），用 referral_code_of 编码"""
+    cur.execute(_SEED_SQL)
+    cur.execute(_NEXT_BLOCK_SQL, (n,))
+    cur.execute(_LAST_ID_SQL)
+    end = cur.fetchone()["v"]
+    return range(end - n, end)
+
+
+def referral_code_of(seq: int) -> str:
+    return _allocator.encode(seq)
+
+
+def insert_with_code(cur, sql: str, args: tuple, code: str) -> str:
+    """执行 referral_code 为最后一个参数的 INSERT；撞上历史随机码时换号重试，返回最终写入的码"""
+    for _ in range(CODE_RETRIES):
+        try:
+            cur.execute(sql, (*args, code))
+            return code
+        except pymysql.err.IntegrityError as e:
+            if not is_code_conflict(e):
+                raise
+            code = _allocator.next_code()
+    raise RuntimeError("推荐码分配失败，请检查 REFERRAL_CODE_KEY 是否被改动")
+
+
+async def ainsert_with_code(cur, sql: str, args: tuple, code: str) -> str:
+    for _ in range(CODE_RETRIES):
+        try:
+            await cur.execute(sql, (*args, code))
+            return code
+        except pymysql.err.IntegrityError as e:
+            if not is_code_conflict(e):
+                raise
+            code = await _allocator.anext_code()
+    raise RuntimeError("推荐码分配失败，请检查 REFERRAL_CODE_KEY 是否被改动")
@@ -0,0 +1,116 @@
+"""
+推荐关系闭包表 user_referral_paths 的维护
+每对 (祖先, 后代) 一行，depth=0 是自身；团队查询变成按 (ancestor_id, depth) 的索引范围扫描。
+所有函数都接收调用方的 cursor，和 user_referrals 的写入放在同一个事务里。
+"""
+from typing import List
+
+from src.six_counter import detach_counters, attach_counters, adetach_counters, aattach_counters
+from src.team_counter import on_join, detach_team, attach_team, aon_join, adetach_team, aattach_team
+
+# 换绑会改动整棵子树，串行执行避免并发换绑拼出环
+TREE_LOCK = "user_referral_tree"
+TREE_LOCK_TIMEOUT = 10
+
+_LINK_NEW_SQL = """
+    INSERT INTO user_referral_paths(ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, %s, depth + 1 FROM user_referral_paths WHERE descendant_id=%s
+"""
+_ENSURE_SELF_SQL = "INSERT IGNORE INTO user_referral_paths(ancestor_id, descendant_id, depth) VALUES (%s,%s,0)"
+_IS_DESCENDANT_SQL = "SELECT 1 FROM user_referral_paths WHERE ancestor_id=%s AND descendant_id=%s"
+# 断开：子树（含自身）与原来所有上级之间的路径
+_DETACH_SQL = """
+    DELETE p FROM user_referral_paths p
+    JOIN user_referral_paths sub ON sub.descendant_id = p.descendant_id AND sub.ancestor_id = %s
+    JOIN user_referral_paths sup ON sup.ancestor_id = p.ancestor_id AND sup.descendant_id = %s AND sup.depth > 0
+"""
+_UPSERT_REFERRAL_SQL = """
+    INSERT INTO user_referrals(user_id, referrer_id) VALUES (%s,%s) ON DUPLICATE KEY UPDATE referrer_id=%s
+"""
+# 挂接：新推荐人的所有上级（含推荐人自身） × 子树（含自身）
+_ATTACH_SQL = """
+    INSERT INTO user_referral_paths(ancestor_id, descendant_id, depth)
+    SELECT sup.ancestor_id, sub.descendant_id, sup.depth + sub.depth + 1
+    FROM user_referral_paths sup
+    JOIN user_referral_paths sub ON sub.ancestor_id = %s
+    WHERE sup.descendant_id = %s
+"""
+
+# 团队列表：某人 1~N 层的下级
+TEAM_LIST_SQL = """
+    SELECT u.id, u.mobile, u.name, u.member_level, p.depth AS layer
+    FROM user_referral_paths p
+    JOIN users u ON u.id = p.descendant_id
+    WHERE p.ancestor_id=%s AND p.depth BETWEEN 1 AND %s
+    ORDER BY p.depth, p.descendant_id
+"""
+
+
+def link_new_user(cur, user_id: int, referrer_id: int = None) -> List[int]:
+    """新用户入树：自身一行 + 继承推荐人的全部上级；返回团队人数变了的上级 id"""
+    cur.execute(_ENSURE_SELF_SQL, (user_id, user_id))
+    if referrer_id:
+        cur.execute(_ENSURE_SELF_SQL, (referrer_id, referrer_id))
+        cur.execute(_LINK_NEW_SQL, (user_id, referrer_id))
+    return on_join(cur, user_id, referrer_id)
+
+
+def move_subtree(cur, user_id: int, referrer_id: int) -> List[int]:
+    """把 user_id 连同整棵子树挂到 referrer_id 下（含 user_referrals、六星计数与团队人数）；
+    推荐人是自己或自己的下级时抛 ValueError；返回个人中心数据变了的用户 id"""
+    cur.execute(_ENSURE_SELF_SQL, (user_id, user_id))
+    cur.execute(_ENSURE_SELF_SQL, (referrer_id, referrer_id))
+    cur.execute(_IS_DESCENDANT_SQL, (user_id, referrer_id))
+    if cur.fetchone():
+        raise ValueError("不能把自己或自己的下级设为推荐人")
+    snap = detach_counters(cur, user_id)
+    old_ids = detach_team(cur, user_id)
+    cur.execute(_DETACH_SQL, (user_id, user_id))
+    cur.execute(_UPSERT_REFERRAL_SQL, (user_id, referrer_id, referrer_id))
+    cur.execute(_ATTACH_SQL, (user_id, referrer_id))
+    attach_counters(cur, user_id, snap)
+    return sorted({user_id, *old_ids, *attach_team(cur, user_id)})
+
+
+def acquire_tree_lock(cur):
+    cur.execute("SELECT GET_LOCK(%s, %s) AS ok", (TREE_LOCK, TREE_LOCK_TIMEOUT))
+    if not cur.fetchone()["ok"]:
+        raise ValueError("推荐关系调整繁忙，请稍后重试")
+
+
+def release_tree_lock(cur):
+    cur.execute("DO RELEASE_LOCK(%s)", (TREE_LOCK,))
+
+
+# ------------- asyncio 版本 -------------
+async def alink_new_user(cur, user_id: int, referrer_id: int = None) -> List[int]:
+    await cur.execute(_ENSURE_SELF_SQL, (user_id, user_id))
+    if referrer_id:
+        await cur.execute(_ENSURE_SELF_SQL, (referrer_id, referrer_id))
+        await cur.execute(_LINK_NEW_SQL, (user_id, referrer_id))
+    return await aon_join(cur, user_id, referrer_id)
+
+
+async def amove_subtree(cur, user_id: int, referrer_id: int) -> List[int]:
+    await cur.execute(_ENSURE_SELF_SQL, (user_id, user_id))
+    await cur.execute(_ENSURE_SELF_SQL, (referrer_id, referrer_id))
+    await cur.execute(_IS_DESCENDANT_SQL, (user_id, referrer_id))
+    if await cur.fetchone():
+        raise ValueError("不能把自己或自己的下级设为推荐人")
+    snap = await adetach_counters(cur, user_id)
+    old_ids = await adetach_team(cur, user_id)
+    await cur.execute(_DETACH_SQL, (user_id, user_id))
+    await cur.execute(_UPSERT_REFERRAL_SQL, (user_id, referrer_id, referrer_id))
+    await cur.execute(_ATTACH_SQL, (user_id, referrer_id))
+    await aattach_counters(cur, user_id, snap)
+    return sorted({user_id, *old_ids, *await aattach_team(cur, user_id)})
+
+
+async def aacquire_tree_lock(cur):
+    await cur.execute("SELECT GET_LOCK(%s, %s) AS ok", (TREE_LOCK, TREE_LOCK_TIMEOUT))
+    if not (await cur.fetchone())["ok"]:
+        raise ValueError("推荐关系调整繁忙，请稍后重试")
+
+
+async def arelease_tree_lock(cur):
+    await cur.execute("DO RELEASE_LOCK(%s)", (TREE_LOCK,))
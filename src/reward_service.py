@@ -1,7 +1,26 @@
+import datetime
 from typing import Optional
 from src.config import get_conn
+from src.aio_db import aget_conn
+from src.pagination import decode_cursor, keyset_where, keyset_args
 
 
+def _reward_list_sql(user_id: int, page: int, size: int, cursor: Optional[str]):
+    where, args = ["tr.user_id=%s"], [user_id]
+    if cursor:
+        where.append(keyset_where(("tr.created_at", "tr.id")))
+        args.extend(keyset_args(decode_cursor(cursor, (datetime.datetime, int))))
+    args.extend([size] if cursor else [size, (page - 1) * size])
+    return f"""
+        SELECT tr.id, tr.from_user_id, tr.order_id, tr.layer, tr.reward_amount, tr.created_at,
+               u.mobile AS from_mobile, u.name AS from_name
+        FROM team_rewards tr
+        JOIN users u ON u.id = tr.from_user_id
+        WHERE {" AND ".join(where)}
+        ORDER BY tr.created_at DESC, tr.id DESC
+        {"LIMIT %s" if cursor else "LIMIT %s OFFSET %s"}
+    """, args
+
 
 class TeamRewardService:
     @staticmethod
@@ -14,23 +33,17 @@ class TeamRewardService:
                 """, (user_id, from_user_id, order_id, layer, amount))
 
     @staticmethod
-    def get_reward_list_by_user(user_id: int, page: int = 1, size: int = 10):
-        with get_conn() as conn:
+    def get_reward_list_by_user(user_id: int, page: int = 1, size: int = 10, cursor: Optional[str] = None):
+        """cursor 为上一页返回的 next_cursor 时按 (created_at, id) 游标翻页，忽略 page"""
+        sql, args = _reward_list_sql(user_id, page, size, cursor)
+        with get_conn(readonly=True) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT tr.id, tr.from_user_id, tr.order_id, tr.layer, tr.reward_amount, tr.created_at,
-                           u.mobile AS from_mobile, u.name AS from_name
-                    FROM team_rewards tr
-                    JOIN users u ON u.id = tr.from_user_id
-                    WHERE tr.user_id=%s
-                    ORDER BY tr.created_at DESC
-                    LIMIT %s OFFSET %s
-                """, (user_id, size, (page - 1) * size))
+                cur.execute(sql, args)
                 return cur.fetchall()
 
     @staticmethod
     def get_reward_by_order(order_id: int):
-        with get_conn() as conn:
+        with get_conn(readonly=True) as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT tr.id, tr.user_id, tr.from_user_id, tr.layer, tr.reward_amount, tr.created_at,
@@ -42,4 +55,41 @@ class TeamRewardService:
                     WHERE tr.order_id=%s
                     ORDER BY tr.layer, tr.id
                 """, (order_id,))
-                return cur.fetchall()
\ No newline at end of file
+                return cur.fetchall()
+
+
+class AsyncTeamRewardService:
+    """TeamRewardService 的 asyncio 版本"""
+
+    @staticmethod
+    async def add_reward(user_id: int, from_user_id: int, layer: int, amount: float, order_id: Optional[int] = None):
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    INSERT INTO team_rewards(user_id, from_user_id, order_id, layer, reward_amount)
+                    VALUES (%s,%s,%s,%s,%s)
+                """, (user_id, from_user_id, order_id, layer, amount))
+
+    @staticmethod
+    async def get_reward_list_by_user(user_id: int, page: int = 1, size: int = 10, cursor: Optional[str] = None):
+        sql, args = _reward_list_sql(user_id, page, size, cursor)
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, args)
+                return await cur.fetchall()
+
+    @staticmethod
+    async def get_reward_by_order(order_id: int):
+        async with aget_conn(readonly=True) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT tr.id, tr.user_id, tr.from_user_id, tr.layer, tr.reward_amount, tr.created_at,
+                           u.mobile AS user_mobile, u.name AS user_name,
+                           fu.mobile AS from_mobile, fu.name AS from_name
+                    FROM team_rewards tr
+                    JOIN users u ON u.id = tr.user_id
+                    JOIN users fu ON fu.id = tr.from_user_id
+                    WHERE tr.order_id=%s
+                    ORDER BY tr.layer, tr.id
+                """, (order_id,))
+                return await cur.fetchall()
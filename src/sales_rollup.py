@@ -0,0 +1,63 @@
+"""
+订单日汇总 daily_sales 的维护与查询
+orders.created_at 只用半开区间过滤（可走 created_at 索引），不再 DATE(created_at) 全表扫。
+重算某天 = 删掉该天的汇总行再从 orders 聚合插回，可重复执行；
+订单状态会在事后变化（退款等），所以增量任务每次回看最近几天。
+"""
+import datetime
+from decimal import Decimal
+from typing import Iterable
+
+# 计入业绩的订单状态
+PAID_STATUSES = ("paid", "completed")
+
+_CLEAR_SQL = "DELETE FROM daily_sales WHERE sale_date BETWEEN %s AND %s"
+_ROLLUP_SQL = """
+    INSERT INTO daily_sales(sale_date, status_bucket, amount, order_count)
+    SELECT DATE(created_at), status, IFNULL(SUM(total_amount), 0), COUNT(*)
+    FROM orders
+    WHERE created_at >= %s AND created_at < %s
+    GROUP BY DATE(created_at), status
+"""
+_SUM_SQL = """
+    SELECT SUM(amount) AS s
+    FROM daily_sales
+    WHERE sale_date BETWEEN %s AND %s AND status_bucket IN ({marks})
+"""
+
+
+def _rollup_args(start: datetime.date, end: datetime.date):
+    return start, end + datetime.timedelta(days=1)
+
+
+def _sum_sql(statuses: Iterable[str]):
+    statuses = tuple(statuses)
+    return _SUM_SQL.format(marks=",".join(["%s"] * len(statuses))), statuses
+
+
+def refresh_days(cur, start: datetime.date, end: datetime.date) -> int:
+    """重算 [start, end] 这几天的汇总，调用方负责事务；返回写入行数"""
+    cur.execute(_CLEAR_SQL, (start, end))
+    cur.execute(_ROLLUP_SQL, _rollup_args(start, end))
+    return cur.rowcount
+
+
+def sales_between(cur, start: datetime.date, end: datetime.date, statuses: Iterable[str] = PAID_STATUSES) -> Decimal:
+    """[start, end] 的业绩金额（按天闭区间）"""
+    sql, statuses = _sum_sql(statuses)
+    cur.execute(sql, (start, end, *statuses))
+    return Decimal(cur.fetchone()['s'] or 0)
+
+
+# ------------- asyncio 版本 -------------
+async def arefresh_days(cur, start: datetime.date, end: datetime.date) -> int:
+    await cur.execute(_CLEAR_SQL, (start, end))
+    await cur.execute(_ROLLUP_SQL, _rollup_args(start, end))
+    return cur.rowcount
+
+
+async def asales_between(cur, start: datetime.date, end: datetime.date,
+                         statuses: Iterable[str] = PAID_STATUSES) -> Decimal:
+    sql, statuses = _sum_sql(statuses)
+    await cur.execute(sql, (start, end, *statuses))
+    return Decimal((await cur.fetchone())['s'] or 0)
@@ -0,0 +1,115 @@
+"""
+users.six_director / six_team 增量维护
+six_director = 直推中的六星人数；six_team = 整个团队（含自己，不限层级）中的六星人数。
+只在某人跨过 6 星、或带着子树换绑时，沿闭包表把 ±delta 推给推荐人和所有上级，O(层数)。
+所有函数都接收调用方的 cursor，和等级 / 推荐关系的写入放在同一个事务里。
+"""
+
+_TEAM_DELTA_SQL = """
+    UPDATE users u
+    JOIN user_referral_paths p ON p.ancestor_id = u.id
+    SET u.six_team = u.six_team + %s
+    WHERE p.descendant_id=%s AND p.depth >= %s
+"""
+_DIRECT_DELTA_SQL = """
+    UPDATE users u
+    JOIN user_referrals r ON r.referrer_id = u.id
+    SET u.six_director = u.six_director + %s
+    WHERE r.user_id=%s
+"""
+_SUBTREE_SQL = "SELECT member_level, six_team FROM users WHERE id=%s FOR UPDATE"
+# 全量重算（只用于修数 / 首次上线），派生表先聚合再回写，绕过 MySQL 1093
+_REBUILD_SQLS = (
+    "UPDATE users SET six_director = 0, six_team = 0",
+    """
+    UPDATE users u
+    JOIN (
+        SELECT r.referrer_id AS id, COUNT(*) AS cnt
+        FROM user_referrals r
+        JOIN users x ON x.id = r.user_id
+        WHERE x.member_level = 6
+        GROUP BY r.referrer_id
+    ) t ON t.id = u.id
+    SET u.six_director = t.cnt
+    """,
+    """
+    UPDATE users u
+    JOIN (
+        SELECT p.ancestor_id AS id, COUNT(*) AS cnt
+        FROM user_referral_paths p
+        JOIN users x ON x.id = p.descendant_id
+        WHERE x.member_level = 6
+        GROUP BY p.ancestor_id
+    ) t ON t.id = u.id
+    SET u.six_team = t.cnt
+    """,
+)
+
+
+def _level_delta(old_level: int, new_level: int) -> int:
+    return int(new_level == 6) - int(old_level == 6)
+
+
+def on_level_change(cur, user_id: int, old_level: int, new_level: int):
+    """等级跨过 6 星时：自己及所有上级 six_team ±1，直接推荐人 six_director ±1"""
+    delta = _level_delta(old_level, new_level)
+    if not delta:
+        return
+    cur.execute(_TEAM_DELTA_SQL, (delta, user_id, 0))
+    cur.execute(_DIRECT_DELTA_SQL, (delta, user_id))
+
+
+def detach_counters(cur, user_id: int) -> dict:
+    """换绑前调用：从原上级链扣掉整棵子树的六星数，返回子树快照供 attach_counters 使用"""
+    cur.execute(_SUBTREE_SQL, (user_id,))
+    snap = cur.fetchone()
+    if snap["six_team"]:
+        cur.execute(_TEAM_DELTA_SQL, (-snap["six_team"], user_id, 1))
+    if snap["member_level"] == 6:
+        cur.execute(_DIRECT_DELTA_SQL, (-1, user_id))
+    return snap
+
+
+def attach_counters(cur, user_id: int, snap: dict):
+    """换绑后调用：把子树六星数加到新上级链"""
+    if snap["six_team"]:
+        cur.execute(_TEAM_DELTA_SQL, (snap["six_team"], user_id, 1))
+    if snap["member_level"] == 6:
+        cur.execute(_DIRECT_DELTA_SQL, (1, user_id))
+
+
+def rebuild_counters(cur):
+    """按 user_referrals + 闭包表全量重算；日常由上面的增量函数维护，不需要定时跑"""
+    for sql in _REBUILD_SQLS:
+        cur.execute(sql)
+
+
+# ------------- asyncio 版本 -------------
+async def aon_level_change(cur, user_id: int, old_level: int, new_level: int):
+    delta = _level_delta(old_level, new_level)
+    if not delta:
+        return
+    await cur.execute(_TEAM_DELTA_SQL, (delta, user_id, 0))
+    await cur.execute(_DIRECT_DELTA_SQL, (delta, user_id))
+
+
+async def adetach_counters(cur, user_id: int) -> dict:
+    await cur.execute(_SUBTREE_SQL, (user_id,))
+    snap = await cur.fetchone()
+    if snap["six_team"]:
+        await cur.execute(_TEAM_DELTA_SQL, (-snap["six_team"], user_id, 1))
+    if snap["member_level"] == 6:
+        await cur.execute(_DIRECT_DELTA_SQL, (-1, user_id))
+    return snap
+
+
+async def aattach_counters(cur, user_id: int, snap: dict):
+    if snap["six_team"]:
+        await cur.execute(_TEAM_DELTA_SQL, (snap["six_team"], user_id, 1))
+    if snap["member_level"] == 6:
+        await cur.execute(_DIRECT_DELTA_SQL, (1, user_id))
+
+
+async def arebuild_counters(cur):
+    for sql in _REBUILD_SQLS:
+        await cur.execute(sql)
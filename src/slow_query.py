@@ -0,0 +1,286 @@
+"""
+慢查询日志
+计时游标（src/metrics.py）发现单条语句超过阈值时调用 record：在请求线程里只取指纹、参数形状、调用方和待 EXPLAIN 的语句，
+放进队列后立即返回；后台线程用一条独立连接做 EXPLAIN（同一指纹 explain_interval 秒内只做一次），
+再按 JSON 行写入滚动日志，同时按指纹累计次数/耗时供 /admin/slow-queries 排行。
+日志里只有参数形状（类型、长度、行数），不落参数值；具体值只用于拼 EXPLAIN 语句。
+EXPLAIN 走主库的新连接，引用临时表等会话内对象的语句会失败，失败原因记在 explain_error。
+"""
+import datetime
+import decimal
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+import pymysql
+
+from src.config import CFG, SLOW_QUERY_CFG
+from src.metrics import current_route, fingerprint, set_slow_query_log
+
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(_SRC_DIR)
+# 调用链里跳过的文件：计时游标自身
+_SKIP_FILES = {os.path.join(_SRC_DIR, "metrics.py"), os.path.join(_SRC_DIR, "slow_query.py")}
+_CALLER_DEPTH = 3
+_EXPLAINABLE = re.compile(r"^\s*(?:/\*.*?\*/\s*)*(SELECT|WITH|UPDATE|DELETE|INSERT|REPLACE)\b", re.I | re.S)
+
+_STOP = object()
+
+
+def param_shape(args):
+    """参数的形状：类型 + 长度，长列表折叠成 list[类型]*N"""
+    if args is None:
+        return None
+    if isinstance(args, dict):
+        return {k: param_shape(v) for k, v in args.items()}
+    if isinstance(args, (list, tuple)):
+        shapes = [param_shape(a) for a in args]
+        if len(shapes) > 10 and all(s == shapes[0] for s in shapes):
+            return f"list[{shapes[0]}]*{len(shapes)}"
+        return shapes
+    if isinstance(args, bool):
+        return "bool"
+    if isinstance(args, int):
+        return "int"
+    if isinstance(args, float):
+        return "float"
+    if isinstance(args, decimal.Decimal):
+        return "decimal"
+    if isinstance(args, str):
+        return f"str({len(args)})"
+    if isinstance(args, (bytes, bytearray)):
+        return f"bytes({len(args)})"
+    if isinstance(args, datetime.datetime):
+        return "datetime"
+    if isinstance(args, datetime.date):
+        return "date"
+    return type(args).__name__
+
+
+def _caller() -> Optional[str]:
+    """项目内最近的几层调用方，例如 director_service.py:130 DirectorService._refresh_six_counter <- ..."""
+    frames = []
+    f = sys._getframe(1)
+    while f is not None and len(frames) < _CALLER_DEPTH:
+        path = f.f_code.co_filename
+        if path.startswith(_SRC_DIR) and path not in _SKIP_FILES:
+            frames.append(f"{os.path.relpath(path, _ROOT_DIR)}:{f.f_lineno} {f.f_code.co_qualname}")
+        f = f.f_back
+    return " <- ".join(frames) or None
+
+
+def _statement(cursor, query, args) -> Optional[str]:
+    """待 EXPLAIN 的语句；executemany 按模板 + 第一行参数拼一条"""
+    if cursor._template is not None:
+        query = cursor._template
+        args = next(iter(cursor._template_args), None) if cursor._template_args is not None else None
+    if isinstance(query, (bytes, bytearray)):
+        query = bytes(query).decode("utf-8", "replace")
+    if not _EXPLAINABLE.match(query):
+        return None
+    try:
+        return cursor.mogrify(query, args)
+    except Exception:
+        return None
+
+
+class SlowQueryLog:
+    """慢查询采集 + 后台 EXPLAIN/写日志线程 + 按指纹的排行"""
+
+    def __init__(self, threshold: float = 0.2, path: str = "slow_query.log", max_bytes: int = 50 * 1024 * 1024,
+                 backups: int = 5, explain_interval: float = 300.0, max_queue: int = 1000):
+        self.threshold = threshold
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.explain_interval = explain_interval
+        self._queue: "queue.Queue" = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._logger = None
+        self._explain_conn = None
+        self._explained: Dict[str, float] = {}     # 指纹 -> 上次 EXPLAIN 的时刻
+        self._top: Dict[str, dict] = {}
+        self._stats = {"recorded": 0, "dropped": 0, "explained": 0, "explain_errors": 0}
+
+    def record(self, cursor, query, args, seconds: float, error: bool):
+        """由计时游标在请求线程里调用；只做轻量的采集，不能抛异常影响业务"""
+        try:
+            template = cursor._template
+            if template is not None:
+                args = cursor._template_args
+                shape = {"rows": len(args), "row": param_shape(next(iter(args), None))} \
+                    if hasattr(args, "__len__") else None
+            else:
+                shape = param_shape(args)
+            entry = {
+                "time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+                "seconds": round(seconds, 6),
+                "fingerprint": fingerprint(template or query),
+                "params": shape,
+                "route": current_route(),
+                "caller": _caller(),
+                "error": error,
+                "statement": _statement(cursor, query, args),
+            }
+        except Exception as e:
+            print(f"⚠️ 慢查询采集失败：{e}")
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return
+        with self._lock:
+            self._stats["recorded"] += 1
+            self._aggregate(entry)
+
+    def _aggregate(self, entry: dict):
+        t = self._top.get(entry["fingerprint"])
+        if t is None:
+            t = self._top[entry["fingerprint"]] = {
+                "fingerprint": entry["fingerprint"], "count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                "callers": [], "routes": [], "explain": None}
+        t["count"] += 1
+        t["total_seconds"] += entry["seconds"]
+        t["max_seconds"] = max(t["max_seconds"], entry["seconds"])
+        t["last_seen"] = entry["time"]
+        t["params"] = entry["params"]
+        for key, value in (("callers", entry["caller"]), ("routes", entry["route"])):
+            if value and value not in t[key] and len(t[key]) < 5:
+                t[key].append(value)
+
+    def top(self, limit: int = 20, order: str = "total") -> List[dict]:
+        key = {"total": "total_seconds", "count": "count", "max": "max_seconds"}.get(order)
+        if key is None:
+            raise ValueError("order 只能是 total / count / max")
+        with self._lock:
+            rows = [dict(t, avg_seconds=t["total_seconds"] / t["count"]) for t in self._top.values()]
+        rows.sort(key=lambda t: t[key], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._top.clear()
+            self._explained.clear()
+
+    # ------------- 内部 -------------
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="slow-query-log", daemon=True)
+                    self._thread.start()
+
+    def _open_logger(self) -> logging.Logger:
+        logger = logging.getLogger("slow_query")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                          encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        return logger
+
+    def _run(self):
+        self._logger = self._open_logger()
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            try:
+                self._write(entry)
+            except Exception as e:
+                print(f"⚠️ 慢查询日志写入失败：{e}")
+        self._close_explain_conn()
+
+    def _write(self, entry: dict):
+        statement = entry.pop("statement")
+        fp = entry["fingerprint"]
+        now = time.monotonic()
+        if statement and now - self._explained.get(fp, -self.explain_interval) >= self.explain_interval:
+            self._explained[fp] = now
+            try:
+                entry["explain"] = self._explain(statement)
+            except Exception as e:
+                entry["explain_error"] = str(e)
+                with self._lock:
+                    self._stats["explain_errors"] += 1
+            else:
+                with self._lock:
+                    self._stats["explained"] += 1
+                    t = self._top.get(fp)
+                    if t is not None:
+                        t["explain"] = entry["explain"]
+        self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def _explain(self, statement: str) -> List[dict]:
+        """独立连接、普通游标，EXPLAIN 本身不计时也不会再进慢查询日志"""
+        if self._explain_conn is None:
+            self._explain_conn = pymysql.connect(**CFG, cursorclass=pymysql.cursors.DictCursor)
+        try:
+            with self._explain_conn.cursor() as cur:
+                cur.execute("EXPLAIN " + statement)
+                return list(cur.fetchall())
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self._close_explain_conn()
+            raise
+
+    def _close_explain_conn(self):
+        conn, self._explain_conn = self._explain_conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["fingerprints"] = len(self._top)
+        s["threshold_seconds"] = self.threshold
+        s["queue_depth"] = self._queue.qsize()
+        return s
+
+    def shutdown(self, timeout: float = 5.0):
+        """写完已排队的慢查询再退出"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+
+_log = SlowQueryLog(**{k: v for k, v in SLOW_QUERY_CFG.items() if k != "enabled"}) \
+    if SLOW_QUERY_CFG["enabled"] else None
+# 导入即生效：服务进程经由路由导入本模块；命令行工具不导入就不记
+set_slow_query_log(_log)
+
+
+def slow_queries(limit: int = 20, order: str = "total") -> List[dict]:
+    return _log.top(limit, order) if _log else []
+
+
+def reset_slow_queries():
+    if _log:
+        _log.reset()
+
+
+def slow_query_stats() -> dict:
+    return _log.stats() if _log else {"enabled": False}
+
+
+def shutdown_slow_query_log():
+    if _log:
+        _log.shutdown()
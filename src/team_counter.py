@@ -0,0 +1,109 @@
+"""
+users.direct_count / team_total 增量维护（个人中心展示用）
+direct_count = 直推人数；team_total = 1~6 层内的团队人数（不含自己）。
+新人入树时给 6 层内的上级各 +1；带子树换绑时按"上级深度 + 子树内深度 ≤ 6"精确扣减 / 增加。
+所有函数都接收调用方的 cursor，和推荐关系的写入放在同一个事务里，返回计数变了的上级 id（用于清个人中心缓存）。
+"""
+from typing import List
+
+TEAM_DEPTH = 6
+
+_ANCESTORS_SQL = "SELECT ancestor_id FROM user_referral_paths WHERE descendant_id=%s AND depth BETWEEN 1 AND %s"
+_JOIN_SQL = "UPDATE users SET team_total = team_total + 1, direct_count = direct_count + (id = %s) WHERE id IN ({marks})"
+_DIRECT_DELTA_SQL = """
+    UPDATE users u
+    JOIN user_referrals r ON r.referrer_id = u.id
+    SET u.direct_count = u.direct_count + %s
+    WHERE r.user_id=%s
+"""
+# 子树里第 d 层的人只算进上级链里深度 ≤ 6 - d 的上级
+_SUBTREE_DELTA_SQL = """
+    UPDATE users u
+    JOIN (
+        SELECT sup.ancestor_id AS id, COUNT(*) AS cnt
+        FROM user_referral_paths sup
+        JOIN user_referral_paths sub ON sub.ancestor_id = %s AND sub.depth <= %s - sup.depth
+        WHERE sup.descendant_id = %s AND sup.depth BETWEEN 1 AND %s
+        GROUP BY sup.ancestor_id
+    ) t ON t.id = u.id
+    SET u.team_total = u.team_total + %s * t.cnt
+"""
+# 全量重算（迁移 / 修数用）
+REBUILD_TEAM_SQLS = (
+    "UPDATE users SET direct_count = 0, team_total = 0",
+    """
+    UPDATE users u
+    JOIN (SELECT referrer_id AS id, COUNT(*) AS cnt FROM user_referrals GROUP BY referrer_id) t ON t.id = u.id
+    SET u.direct_count = t.cnt
+    """,
+    f"""
+    UPDATE users u
+    JOIN (
+        SELECT ancestor_id AS id, COUNT(*) AS cnt
+        FROM user_referral_paths
+        WHERE depth BETWEEN 1 AND {TEAM_DEPTH}
+        GROUP BY ancestor_id
+    ) t ON t.id = u.id
+    SET u.team_total = t.cnt
+    """,
+)
+
+
+def _subtree_args(user_id: int, sign: int):
+    return user_id, TEAM_DEPTH, user_id, TEAM_DEPTH, sign
+
+
+def on_join(cur, user_id: int, referrer_id: int = None) -> List[int]:
+    """新人入树（闭包路径已写好）后调用：6 层内上级 team_total +1，推荐人 direct_count +1"""
+    if not referrer_id:
+        return []
+    cur.execute(_ANCESTORS_SQL, (user_id, TEAM_DEPTH))
+    ids = [r["ancestor_id"] for r in cur.fetchall()]
+    if ids:
+        cur.execute(_JOIN_SQL.format(marks=",".join(["%s"] * len(ids))), (referrer_id, *ids))
+    return ids
+
+
+def detach_team(cur, user_id: int) -> List[int]:
+    """换绑前调用（旧路径、旧推荐关系还在）：从原上级链扣掉子树"""
+    cur.execute(_ANCESTORS_SQL, (user_id, TEAM_DEPTH))
+    ids = [r["ancestor_id"] for r in cur.fetchall()]
+    if ids:
+        cur.execute(_SUBTREE_DELTA_SQL, _subtree_args(user_id, -1))
+        cur.execute(_DIRECT_DELTA_SQL, (-1, user_id))
+    return ids
+
+
+def attach_team(cur, user_id: int) -> List[int]:
+    """换绑后调用（新路径、新推荐关系已写入）：把子树加到新上级链"""
+    cur.execute(_SUBTREE_DELTA_SQL, _subtree_args(user_id, 1))
+    cur.execute(_DIRECT_DELTA_SQL, (1, user_id))
+    cur.execute(_ANCESTORS_SQL, (user_id, TEAM_DEPTH))
+    return [r["ancestor_id"] for r in cur.fetchall()]
+
+
+# ------------- asyncio 版本 -------------
+async def aon_join(cur, user_id: int, referrer_id: int = None) -> List[int]:
+    if not referrer_id:
+        return []
+    await cur.execute(_ANCESTORS_SQL, (user_id, TEAM_DEPTH))
+    ids = [r["ancestor_id"] for r in await cur.fetchall()]
+    if ids:
+        await cur.execute(_JOIN_SQL.format(marks=",".join(["%s"] * len(ids))), (referrer_id, *ids))
+    return ids
+
+
+async def adetach_team(cur, user_id: int) -> List[int]:
+    await cur.execute(_ANCESTORS_SQL, (user_id, TEAM_DEPTH))
+    ids = [r["ancestor_id"] for r in await cur.fetchall()]
+    if ids:
+        await cur.execute(_SUBTREE_DELTA_SQL, _subtree_args(user_id, -1))
+        await cur.execute(_DIRECT_DELTA_SQL, (-1, user_id))
+    return ids
+
+
+async def aattach_team(cur, user_id: int) -> List[int]:
+    await cur.execute(_SUBTREE_DELTA_SQL, _subtree_args(user_id, 1))
+    await cur.execute(_DIRECT_DELTA_SQL, (1, user_id))
+    await cur.execute(_ANCESTORS_SQL, (user_id, TEAM_DEPTH))
+    return [r["ancestor_id"] for r in await cur.fetchall()]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+根据 user_referrals 全量重建推荐关系闭包表 user_referral_paths
+上线闭包表 / 发现数据不一致时执行一次，之后由 register / bind_referrer 增量维护
+用法：在项目根目录下
+    python src/tools/backfill_referral_paths.py [--chunk 50000] [--max-depth 1000]
+"""
+import argparse
+import sys
+import pathlib
+import time
+
+# 把项目根目录塞进 PYTHONPATH，否则无法 import src.*
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.parent))
+
+from src.config import get_conn
+from src.referral_tree import acquire_tree_lock, release_tree_lock
+from src.team_counter import REBUILD_TEAM_SQLS
+
+
+def backfill(chunk: int = 50000, max_depth: int = 1000) -> int:
+    """逐层展开：第 d 层路径 = 第 d-1 层路径 + 一条推荐边；按 user_id 分段提交避免大事务"""
+    total = 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # 重建期间禁止换绑，避免边重建边改树
+            acquire_tree_lock(cur)
+            try:
+                cur.execute("TRUNCATE TABLE user_referral_paths")
+                cur.execute("SELECT IFNULL(MAX(id), 0) AS m FROM users")
+                max_id = cur.fetchone()["m"]
+
+                for lo in range(0, max_id + 1, chunk):
+                    cur.execute(
+                        "INSERT INTO user_referral_paths(ancestor_id, descendant_id, depth) "
+                        "SELECT id, id, 0 FROM users WHERE id BETWEEN %s AND %s",
+                        (lo, lo + chunk - 1)
+                    )
+                    total += cur.rowcount
+                print(f"depth 0：{total} 行")
+
+                for depth in range(1, max_depth + 1):
+                    added = 0
+                    for lo in range(0, max_id + 1, chunk):
+                        cur.execute("""
+                            INSERT IGNORE INTO user_referral_paths(ancestor_id, descendant_id, depth)
+                            SELECT p.ancestor_id, r.user_id, p.depth + 1
+                            FROM user_referrals r
+                            JOIN user_referral_paths p ON p.descendant_id = r.referrer_id AND p.depth = %s
+                            WHERE r.user_id BETWEEN %s AND %s
+                        """, (depth - 1, lo, lo + chunk - 1))
+                        added += cur.rowcount
+                    if not added:
+                        break
+                    total += added
+                    print(f"depth {depth}：{added} 行")
+                else:
+                    # 超过 max_depth 仍在增长，基本可以断定 user_referrals 里有环
+                    print(f"⚠️ 超过 {max_depth} 层仍未收敛，请检查 user_referrals 是否存在循环推荐")
+
+                # 直推 / 团队人数由闭包表派生，一并重算
+                for sql in REBUILD_TEAM_SQLS:
+                    cur.execute(sql)
+                print("直推 / 团队人数已重算")
+            finally:
+                release_tree_lock(cur)
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重建推荐关系闭包表")
+    parser.add_argument("--chunk", type=int, default=50000, help="每批处理的 user_id 区间大小")
+    parser.add_argument("--max-depth", type=int, default=1000, help="最大展开层数（防环）")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    total = backfill(args.chunk, args.max_depth)
+    print(f"---- 闭包表重建完毕 ✅ 共 {total} 行，用时 {time.perf_counter() - started:.1f}s ----")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+服务层基准测试：在本地 MySQL 的专用库里按不同数据规模 / 推荐树形状造数，逐个压测热点路径，
+输出 p50 / p99 延迟和吞吐，保存 JSON 基线，超过回归阈值时退出码为 1（可直接挂 CI）
+    python src/tools/benchmark.py --sizes 10000 --update-baseline        # 先跑一遍存基线
+    python src/tools/benchmark.py --sizes 10000                          # 改完代码再跑，和基线比较
+    python src/tools/benchmark.py --sizes 100000 --shapes deep --cases refer_team calc_week_dividend
+专用库（BENCH_CFG.database）每个规模都会被清空重建，不要指向业务库；不要配置 MYSQL_REPLICAS。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import pathlib
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+# 把项目根目录塞进 PYTHONPATH，否则无法 import src.*
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.parent))
+
+from src.config import CFG, BENCH_CFG, REPLICAS, get_conn
+from src.user_service import UserService
+from src.points_service import add_points
+from src.director_service import DirectorService
+from src.pwd_hasher import hash_pwd
+from src.referral_code import reserve_referral_seqs, referral_code_of
+from src.referral_tree import TEAM_LIST_SQL
+from src.team_counter import TEAM_DEPTH
+from src.six_counter import rebuild_counters
+from src.totals import REBUILD_TOTALS_SQLS
+from src.tools.init_db import init_database
+from src.tools.backfill_referral_paths import backfill
+from src.tools.gen_dataset import CREATE_ORDERS
+from src.sales_rollup import refresh_days
+
+# 推荐树形状 -> 每人直推人数（按 id 顺序铺成完全 N 叉树，层数约 log_N(用户数)）
+SHAPES = {"wide": 50, "balanced": 8, "deep": 2}
+BENCH_PASSWORD = "bench123"
+SEED_BATCH = 5000
+LEVEL_WEIGHTS = (50, 20, 10, 8, 5, 4, 3)    # 0~6 星的人数占比
+SALES_WEEKS = 52
+DAILY_ORDERS = (5, 15)                      # 合成订单：每天的单数范围，分红按订单重算日汇总
+# 推荐码序号不能回退，否则进程里已领到的号段会与重新发出的码冲突
+KEEP_TABLES = ("schema_version", "referral_code_seq")
+
+
+class Context(NamedTuple):
+    users: int
+    fanout: int
+    rng: random.Random
+    period: datetime.date          # 最近一个完整自然周的周一；第 i 次分红算往前第 i 周
+    counter: List[int]             # 已注册的新用户数（register 用）
+
+
+class Case(NamedTuple):
+    name: str
+    op: Callable[[Context, int], None]
+    ops: int
+    warmup: int
+
+
+def mobile_of(i: int) -> str:
+    return f"199{i:08d}"
+
+
+def parent_of(i: int, fanout: int) -> int:
+    return (i - 2) // fanout + 1
+
+
+# ------------- 造数 -------------
+def reset_database():
+    """建库 + 迁移到最新版本 + 合成 orders 表，然后清空除 KEEP_TABLES 外的所有表"""
+    init_database(log=lambda *_: None)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(CREATE_ORDERS)
+            cur.execute("SELECT TABLE_NAME AS t FROM information_schema.TABLES "
+                        "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_TYPE='BASE TABLE'")
+            tables = [r["t"] for r in cur.fetchall() if r["t"] not in KEEP_TABLES]
+            cur.execute("SET FOREIGN_KEY_CHECKS=0")
+            for t in tables:
+                cur.execute(f"TRUNCATE TABLE `{t}`")
+            cur.execute("SET FOREIGN_KEY_CHECKS=1")
+
+
+def seed(users: int, fanout: int, rng: random.Random, period: datetime.date):
+    """users 个用户铺成 fanout 叉推荐树 + 闭包表 / 计数器 + 0.1% 六星董事 + SALES_WEEKS 周的订单和日业绩"""
+    pwd_hash = hash_pwd(BENCH_PASSWORD)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            seqs = reserve_referral_seqs(cur, users)
+            for lo in range(1, users + 1, SEED_BATCH):
+                ids = range(lo, min(lo + SEED_BATCH, users + 1))
+                conn.begin()
+                cur.executemany(
+                    "INSERT INTO users(id, mobile, password_hash, member_level, referral_code) VALUES (%s,%s,%s,%s,%s)",
+                    [(i, mobile_of(i), pwd_hash, rng.choices(range(7), LEVEL_WEIGHTS)[0],
+                      referral_code_of(seqs[i - 1])) for i in ids]
+                )
+                cur.executemany("INSERT INTO user_referrals(user_id, referrer_id) VALUES (%s,%s)",
+                                [(i, parent_of(i, fanout)) for i in ids if i > 1])
+                conn.commit()
+    # 闭包表 + 直推 / 团队人数
+    backfill()
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            conn.begin()
+            rebuild_counters(cur)
+            for sql in REBUILD_TOTALS_SQLS:
+                cur.execute(sql)
+            cur.execute("""
+                INSERT INTO directors(user_id, status, activated_at)
+                SELECT id, 'active', NOW() FROM users WHERE member_level = 6 ORDER BY id LIMIT %s
+            """, (max(10, users // 1000),))
+            # 分红会按 orders 重算当周日汇总，所以造订单而不是直接写 daily_sales
+            first = period - datetime.timedelta(weeks=SALES_WEEKS - 1)
+            last = period + datetime.timedelta(days=6)
+            orders = []
+            for d in range(SALES_WEEKS * 7):
+                day = datetime.datetime.combine(first + datetime.timedelta(days=d), datetime.time())
+                for _ in range(rng.randint(*DAILY_ORDERS)):
+                    created = day + datetime.timedelta(seconds=rng.randrange(86400))
+                    orders.append((len(orders) + 1, rng.randint(1, users), rng.randint(100, 5000),
+                                   rng.choice(("paid", "completed")), created))
+            cur.executemany(
+                "INSERT INTO orders(id, user_id, total_amount, status, created_at) VALUES (%s,%s,%s,%s,%s)", orders)
+            refresh_days(cur, first, last)
+            conn.commit()
+
+
+# ------------- 压测用例 -------------
+def op_register(ctx: Context, i: int):
+    ctx.counter[0] += 1
+    UserService.register(f"198{ctx.counter[0]:08d}", BENCH_PASSWORD, None, mobile_of(ctx.rng.randint(1, ctx.users)))
+
+
+def op_login(ctx: Context, i: int):
+    UserService.login(mobile_of(ctx.rng.randint(1, ctx.users)), BENCH_PASSWORD)
+
+
+def op_add_points(ctx: Context, i: int):
+    add_points(ctx.rng.randint(1, ctx.users), "member", 1, "bench")
+
+
+def op_refer_team(ctx: Context, i: int):
+    # 只挑下面至少还有两层的人，否则大多数抽到叶子节点，测不出团队查询
+    uid = ctx.rng.randint(1, max(1, ctx.users // (ctx.fanout ** 2)))
+    with get_conn(readonly=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute(TEAM_LIST_SQL, (uid, TEAM_DEPTH))
+            cur.fetchall()
+
+
+def op_calc_week_dividend(ctx: Context, i: int):
+    # 每次一个没发过的周期，测的是真正发放而不是"已发过"的快速返回
+    paid = DirectorService.calc_week_dividend(ctx.period - datetime.timedelta(weeks=i))
+    if i == 0 and paid <= 0:
+        raise SystemExit("calc_week_dividend 发放金额为 0：造数没有产生业绩，测到的只是空跑")
+
+
+def op_refresh_six_counter(ctx: Context, i: int):
+    DirectorService._refresh_six_counter()
+
+
+CASES = [
+    Case("register", op_register, 50, 5),
+    Case("login", op_login, 50, 5),
+    Case("add_points", op_add_points, 500, 50),
+    Case("refer_team", op_refer_team, 200, 20),
+    Case("calc_week_dividend", op_calc_week_dividend, 10, 0),
+    Case("refresh_six_counter", op_refresh_six_counter, 3, 0),
+]
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+
+def run_case(case: Case, ctx: Context, scale: float) -> dict:
+    ops = max(1, int(case.ops * scale))
+    if case.name == "calc_week_dividend":
+        ops = min(ops, SALES_WEEKS)
+    for i in range(case.warmup):
+        case.op(ctx, i)
+    samples = []
+    started = time.perf_counter()
+    for i in range(case.warmup, case.warmup + ops):
+        t0 = time.perf_counter()
+        case.op(ctx, i)
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "ops": ops,
+        "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 0.99) * 1000, 3),
+        "mean_ms": round(sum(samples) / ops * 1000, 3),
+        "ops_per_sec": round(ops / elapsed, 2),
+    }
+
+
+# ------------- 基线 -------------
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float, p99_threshold: float) -> List[str]:
+    """返回超过阈值的回归；基线里没有的用例跳过"""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if cur["p50_ms"] > base["p50_ms"] * (1 + threshold):
+            regressions.append(f"{key} p50 {base['p50_ms']}ms → {cur['p50_ms']}ms")
+        if cur["p99_ms"] > base["p99_ms"] * (1 + p99_threshold):
+            regressions.append(f"{key} p99 {base['p99_ms']}ms → {cur['p99_ms']}ms")
+        if cur["ops_per_sec"] < base["ops_per_sec"] / (1 + threshold):
+            regressions.append(f"{key} 吞吐 {base['ops_per_sec']}/s → {cur['ops_per_sec']}/s")
+    return regressions
+
+
+def _meta() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=pathlib.Path(__file__).parent).stdout.strip()
+    except OSError:
+        commit = ""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT VERSION() AS v")
+            mysql = cur.fetchone()["v"]
+    return {"at": datetime.datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "mysql": mysql, "host": platform.node()}
+
+
+def _load(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def _save(path: str, results: Dict[str, dict], meta: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def main() -> None:
+    names = [c.name for c in CASES]
+    parser = argparse.ArgumentParser(description="服务层基准测试")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10000, 100000, 1000000], help="用户数规模")
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES), default=sorted(SHAPES),
+                        help="推荐树形状：wide=50 叉，balanced=8 叉，deep=2 叉")
+    parser.add_argument("--cases", nargs="+", choices=names, default=names, help="要跑的用例")
+    parser.add_argument("--scale", type=float, default=1.0, help="每个用例的次数倍率")
+    parser.add_argument("--database", default=BENCH_CFG["database"], help="专用库名（会被清空）")
+    parser.add_argument("--baseline", default=BENCH_CFG["baseline"], help="基线 JSON 文件")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入基线，不做比较")
+    parser.add_argument("--threshold", type=float, default=BENCH_CFG["threshold"], help="p50 / 吞吐允许变差的比例")
+    parser.add_argument("--p99-threshold", type=float, default=BENCH_CFG["p99_threshold"], help="p99 允许变差的比例")
+    parser.add_argument("--out", help="本次结果另存为 JSON")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    if args.database == CFG["db"]:
+        parser.error(f"--database 不能与业务库 {CFG['db']} 相同")
+    if REPLICAS:
+        parser.error("基准测试请不要配置 MYSQL_REPLICAS")
+    # 连接池都是第一次用时才建，这里改库名即可让所有服务连到专用库
+    CFG["db"] = args.database
+
+    cases = [c for c in CASES if c.name in args.cases]
+    today = datetime.date.today()
+    period = today - datetime.timedelta(days=today.weekday() + 7)
+    results: Dict[str, dict] = {}
+    started = time.perf_counter()
+    for users in args.sizes:
+        for shape in args.shapes:
+            rng = random.Random(args.seed)
+            t0 = time.perf_counter()
+            reset_database()
+            seed(users, SHAPES[shape], rng, period)
+            print(f"== {users} 用户 / {shape}：造数 {time.perf_counter() - t0:.1f}s")
+            ctx = Context(users, SHAPES[shape], rng, period, [0])
+            for case in cases:
+                r = run_case(case, ctx, args.scale)
+                key = f"{case.name}/{users}/{shape}"
+                results[key] = r
+                print(f"   {case.name:<22} p50 {r['p50_ms']:>10.3f}ms  p99 {r['p99_ms']:>10.3f}ms  "
+                      f"{r['ops_per_sec']:>10.2f} ops/s  ({r['ops']} 次)")
+
+    meta = {**_meta(), "seed": args.seed, "scale": args.scale}
+    if args.out:
+        _save(args.out, results, meta)
+    if args.update_baseline:
+        _save(args.baseline, {**_load(args.baseline), **results}, meta)
+        print(f"---- 基准测试完毕 ✅ 基线已写入 {args.baseline}，用时 {time.perf_counter() - started:.1f}s ----")
+        return
+
+    baseline = _load(args.baseline)
+    if not baseline:
+        print(f"⚠️ 没有基线文件 {args.baseline}，先用 --update-baseline 跑一次")
+    regressions = compare(results, baseline, args.threshold, args.p99_threshold)
+    if regressions:
+        print(f"❌ {len(regressions)} 项超过回归阈值：")
+        for r in regressions:
+            print(f"    {r}")
+        sys.exit(1)
+    print(f"---- 基准测试完毕 ✅ 无回归，用时 {time.perf_counter() - started:.1f}s ----")
+
+
+if __name__ == '__main__':
+    main()
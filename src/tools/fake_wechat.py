@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+本地假 jscode2session 服务，用于联调 / 压测微信登录
+同一个 code 永远返回同一个 openid；可以模拟延迟、5xx 和「系统繁忙」
+用法：
+    python src/tools/fake_wechat.py [--port 8081] [--delay 0.05] [--fail-rate 0.1] [--busy-rate 0.05]
+    然后在 .env 里设置 WECHAT_API_BASE=http://127.0.0.1:8081（WECHAT_APP_ID / SECRET 随便填）
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_handler(delay: float, fail_rate: float, busy_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # 支持 keep-alive
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/sns/jscode2session":
+                return self._send(404, {"errcode": 404, "errmsg": "not found"})
+            if delay:
+                time.sleep(delay)
+            if random.random() < fail_rate:
+                return self._send(502, {"errcode": 502, "errmsg": "bad gateway"})
+            if random.random() < busy_rate:
+                return self._send(200, {"errcode": -1, "errmsg": "system error"})
+            code = parse_qs(url.query).get("js_code", [""])[0]
+            if not code:
+                return self._send(200, {"errcode": 40029, "errmsg": "invalid code"})
+            digest = hashlib.sha1(code.encode()).hexdigest()
+            self._send(200, {"openid": "o" + digest[:27], "session_key": digest[-24:]})
+
+        def _send(self, status: int, body: dict):
+            raw = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地假微信 code2session 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 502 的比例")
+    parser.add_argument("--busy-rate", type=float, default=0.0, help="返回 errcode=-1 的比例")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.delay, args.fail_rate, args.busy_rate))
+    print(f"---- 假微信服务已启动 ✅ http://{args.host}:{args.port}/sns/jscode2session ----")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+造一份接近生产规模 / 分布的数据集，用于本地复现性能问题
+    python src/tools/gen_dataset.py --users 1000000                    # 空库上造 100 万用户
+    python src/tools/gen_dataset.py --users 200000 --truncate --workers 4
+    python src/tools/gen_dataset.py --users 1000000 --database userdb_big --method insert
+推荐树按优先连接生成（直推人数呈幂律分布，少数大 V 直推成千上万）；等级按占比抽样，直推多的人等级偏高；
+每人若干地址、订单（合成 orders 表），订单派生积分流水和 6 层团队奖励；
+闭包表、计数器、日业绩、董事晋升和每周分红在导入后用现有的重建 SQL / 服务接口补齐。
+按用户 id 分段交给多个进程并行生成，默认 LOAD DATA LOCAL INFILE 导入（服务端需开启 local_infile），
+否则用 --method insert 走大批量 executemany。所有用户密码都是 DATASET_PASSWORD，哈希预先算好几份轮流使用。
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import shutil
+import sys
+import pathlib
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pymysql
+
+# 把项目根目录塞进 PYTHONPATH，否则无法 import src.*
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.parent))
+
+from src.config import CFG, get_conn
+from src.pwd_hasher import hash_pwd
+from src.referral_code import reserve_referral_seqs, referral_code_of
+from src.team_counter import REBUILD_TEAM_SQLS
+from src.six_counter import rebuild_counters
+from src.totals import REBUILD_TOTALS_SQLS
+from src.sales_rollup import refresh_days, PAID_STATUSES
+from src.director_service import DirectorService
+from src.tools.init_db import init_database
+from src.partitions import PARTITIONED, list_partitions, ensure_past
+
+DATASET_PASSWORD = "test1234"
+HASH_VARIANTS = 8                              # 预先算好的哈希份数（盐不同）
+ORGANIC_RATIO = 0.03                           # 没有推荐人的自然注册占比
+LEVEL_WEIGHTS = (55, 15, 10, 7, 5, 4, 4)       # 0~6 星的人数占比
+STATUS_WEIGHTS = (980, 15, 5)                  # 正常 / 冻结 / 注销（千分比）
+MERCHANT_RATIO = 0.01
+MAX_ORDERS = 99                                # 订单 id = user_id * 100 + 序号，各进程无需协调
+ORDER_STATUSES = ("completed", "paid", "pending", "refunded")
+ORDER_STATUS_WEIGHTS = (45, 40, 10, 5)
+REWARD_RATES = {1: 0.05, 2: 0.03, 3: 0.02, 4: 0.01, 5: 0.01, 6: 0.01}   # 团队奖励：层 -> 订单金额比例
+CHUNK = 20000
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘蒋蔡余杜叶程苏魏吕丁任沈"
+GIVEN = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华建国文辉鹏飞婷雪琳晨宇浩然子涵欣怡思远"
+REGIONS = (
+    ("广东省", "深圳市", "南山区"), ("广东省", "广州市", "天河区"), ("浙江省", "杭州市", "西湖区"),
+    ("江苏省", "南京市", "鼓楼区"), ("北京市", "北京市", "朝阳区"), ("上海市", "上海市", "浦东新区"),
+    ("四川省", "成都市", "武侯区"), ("湖北省", "武汉市", "洪山区"), ("山东省", "济南市", "历下区"),
+    ("福建省", "厦门市", "思明区"), ("河南省", "郑州市", "金水区"), ("陕西省", "西安市", "雁塔区"),
+)
+
+# 真实的 orders 表属于订单系统，这里只建日汇总 / 奖励需要的列
+CREATE_ORDERS = """
+CREATE TABLE IF NOT EXISTS orders (
+    id BIGINT UNSIGNED PRIMARY KEY,
+    user_id BIGINT UNSIGNED NOT NULL,
+    total_amount DECIMAL(12,2) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    created_at DATETIME NOT NULL,
+    INDEX idx_user (user_id),
+    INDEX idx_created (created_at)
+);
+"""
+
+# 表 -> 导入列（与 _gen_chunk 生成的元组顺序一致）
+COLUMNS = {
+    "users": ("id", "mobile", "password_hash", "name", "member_level", "referral_code", "member_points",
+              "merchant_points", "status", "is_merchant", "created_at"),
+    "user_referrals": ("user_id", "referrer_id", "created_at"),
+    "user_referral_paths": ("ancestor_id", "descendant_id", "depth"),
+    "addresses": ("user_id", "name", "phone", "province", "city", "district", "detail", "is_default", "created_at"),
+    "orders": ("id", "user_id", "total_amount", "status", "created_at"),
+    "points_log": ("user_id", "points_type", "change_amount", "reason", "related_order", "created_at"),
+    "team_rewards": ("user_id", "from_user_id", "order_id", "layer", "reward_amount", "created_at"),
+}
+# --truncate 时清空（推荐码序号表不动，避免与已发出的码冲突）
+TRUNCATE_TABLES = (
+    "users", "user_referrals", "user_referral_paths", "addresses", "orders", "points_log", "team_rewards",
+    "directors", "director_dividends", "director_dividend_runs", "daily_sales", "audit_log",
+    "level_user_counts", "user_points_log_counts",
+)
+
+
+# ------------- 推荐树（主进程，顺序生成） -------------
+def build_tree(users: int, rng: random.Random):
+    """优先连接：新用户以 (直推人数 + 1) 的比例挑推荐人，直推人数呈幂律分布；返回 (parent, level) 数组"""
+    parent = array("q", [0]) * (users + 1)
+    direct = array("l", [0]) * (users + 1)
+    pool = array("q")            # 每人出现 (直推人数 + 1) 次
+    for i in range(1, users + 1):
+        if pool and rng.random() >= ORGANIC_RATIO:
+            p = pool[rng.randrange(len(pool))]
+            parent[i] = p
+            direct[p] += 1
+            pool.append(p)
+        pool.append(i)
+    level = bytearray(users + 1)
+    for i in range(1, users + 1):
+        # 直推越多等级越高：8 人起 3 星，64 人起 6 星
+        floor = min(6, max(0, direct[i].bit_length() - 1)) if direct[i] >= 8 else 0
+        level[i] = max(floor, rng.choices(range(7), LEVEL_WEIGHTS)[0])
+    return parent, level
+
+
+# ------------- 分段生成（子进程） -------------
+_STATE = {}
+
+
+def _init_worker(state: dict):
+    _STATE.update(state)
+    # 子进程自己建连接，不用父进程的连接池
+    _STATE["conn"] = None
+
+
+def _cell(v) -> str:
+    if v is None:
+        return r"\N"
+    if isinstance(v, str):
+        return v.replace("\\", "\\\\").replace("\t", " ").replace("\n", " ")
+    return str(v)
+
+
+def _ancestors(parent, uid: int):
+    p = parent[uid]
+    while p:
+        yield p
+        p = parent[p]
+
+
+def _gen_chunk(lo: int, hi: int):
+    s = _STATE
+    parent, level = s["parent"], s["level"]
+    rng = random.Random(s["seed"] * 1000003 + lo)
+    start, span, now = s["start"], s["span"], s["now"]
+    rows = {t: [] for t in COLUMNS}
+    for uid in range(lo, hi):
+        created = start + datetime.timedelta(seconds=int(span * (uid - 1) / s["users"]) + rng.randrange(60))
+        merchant = rng.random() < MERCHANT_RATIO
+        status = rng.choices((0, 1, 2), STATUS_WEIGHTS)[0]
+        name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+        mobile = f"1{rng.choice('356789')}{uid:09d}"
+
+        # 推荐关系 + 闭包路径
+        rows["user_referral_paths"].append((uid, uid, 0))
+        if parent[uid]:
+            rows["user_referrals"].append((uid, parent[uid], created))
+            for depth, anc in enumerate(_ancestors(parent, uid), 1):
+                rows["user_referral_paths"].append((anc, uid, depth))
+
+        # 地址：0~3 个，第一个默认
+        for k in range(rng.choices((0, 1, 2, 3), (20, 50, 20, 10))[0]):
+            prov, city, district = rng.choice(REGIONS)
+            rows["addresses"].append((uid, name, mobile, prov, city, district,
+                                      f"{rng.randint(1, 999)}号{rng.randint(1, 30)}栋{rng.randint(101, 3201)}",
+                                      int(k == 0), created))
+
+        # 订单 -> 积分流水 + 团队奖励
+        member_points = merchant_points = 0
+        live = (now - created).total_seconds()
+        for k in range(min(MAX_ORDERS, int(rng.expovariate(1 / s["orders"])))):
+            oid = uid * 100 + k + 1
+            at = created + datetime.timedelta(seconds=int(rng.random() * live))
+            amount = round(min(50000.0, rng.lognormvariate(5, 0.8)), 2)
+            st = rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0]
+            rows["orders"].append((oid, uid, f"{amount:.2f}", st, at))
+            if st not in PAID_STATUSES:
+                continue
+            pts = int(amount)
+            member_points += pts
+            rows["points_log"].append((uid, "member", pts, "购物积分", oid, at))
+            for layer, anc in enumerate(_ancestors(parent, uid), 1):
+                if layer > 6:
+                    break
+                if level[anc] >= 1:
+                    rows["team_rewards"].append((anc, uid, oid, layer, f"{amount * REWARD_RATES[layer]:.2f}", at))
+        if merchant:
+            for _ in range(rng.randint(1, 20)):
+                pts = rng.randint(10, 5000)
+                merchant_points += pts
+                rows["points_log"].append((uid, "merchant", pts, "销售积分", None,
+                                           created + datetime.timedelta(seconds=int(rng.random() * live))))
+        if rng.random() < 0.1:
+            rows["points_log"].append((uid, "member", 10, "系统赠送", None, created))
+            member_points += 10
+
+        rows["users"].append((uid, mobile, s["hashes"][uid % len(s["hashes"])], name, level[uid],
+                              referral_code_of(s["seq_start"] + uid - 1), member_points, merchant_points,
+                              status, int(merchant), created))
+    return rows
+
+
+def _conn():
+    if _STATE["conn"] is None:
+        cfg = {**CFG, "db": _STATE["db"]}
+        conn = pymysql.connect(**cfg, local_infile=True)
+        with conn.cursor() as cur:
+            # 数据是新生成的，不需要逐行做唯一 / 外键检查
+            cur.execute("SET unique_checks=0, foreign_key_checks=0")
+        _STATE["conn"] = conn
+    return _STATE["conn"]
+
+
+def _load_file(cur, table: str, rows, tmpdir: str):
+    path = os.path.join(tmpdir, f"{table}.tsv")
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for r in rows:
+            f.write("\t".join(_cell(v) for v in r))
+            f.write("\n")
+    cur.execute(f"""
+        LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n'
+        ({", ".join(COLUMNS[table])})
+    """, (path,))
+
+
+def _load_insert(cur, table: str, rows, batch: int):
+    cols = COLUMNS[table]
+    sql = f"INSERT INTO {table}({', '.join(cols)}) VALUES ({','.join(['%s'] * len(cols))})"
+    for i in range(0, len(rows), batch):
+        # pymysql 会把 INSERT ... VALUES 的 executemany 拼成多行语句
+        cur.executemany(sql, rows[i:i + batch])
+
+
+def load_chunk(lo: int, hi: int) -> dict:
+    """生成并导入 [lo, hi) 这段用户的全部数据，返回各表行数"""
+    rows = _gen_chunk(lo, hi)
+    conn = _conn()
+    tmpdir = tempfile.mkdtemp(prefix="gen_dataset_")
+    try:
+        with conn.cursor() as cur:
+            for table in COLUMNS:
+                if not rows[table]:
+                    continue
+                if _STATE["method"] == "load":
+                    _load_file(cur, table, rows[table], tmpdir)
+                else:
+                    _load_insert(cur, table, rows[table], _STATE["batch"])
+        conn.commit()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {t: len(r) for t, r in rows.items()}
+
+
+# ------------- 主流程 -------------
+def prepare(truncate: bool, since: datetime.date):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(CREATE_ORDERS)
+            cur.execute("SELECT 1 FROM users LIMIT 1")
+            if cur.fetchone() and not truncate:
+                raise SystemExit(f"{CFG['db']}.users 不是空表；确认可以清空后加 --truncate")
+            if truncate:
+                cur.execute("SET FOREIGN_KEY_CHECKS=0")
+                for t in TRUNCATE_TABLES:
+                    cur.execute(f"TRUNCATE TABLE {t}")
+                cur.execute("SET FOREIGN_KEY_CHECKS=1")
+            # 已分区的流水表在空表上分区化时只建了本月往后的分区，先把数据时间段的月份补齐
+            for table in PARTITIONED:
+                if list_partitions(cur, table):
+                    created = ensure_past(cur, table, since)
+                    if created:
+                        print(f"{table}：预建分区 {created[0]} ~ {created[-1]}")
+
+
+def local_infile_enabled() -> bool:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SHOW GLOBAL VARIABLES LIKE 'local_infile'")
+            row = cur.fetchone()
+    return bool(row) and str(row["Value"]).upper() in ("ON", "1")
+
+
+def finish(start: datetime.datetime, now: datetime.datetime, weeks: int):
+    """导入后补齐派生数据：计数器、日业绩、董事晋升、每周分红"""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            conn.begin()
+            try:
+                for sql in REBUILD_TEAM_SQLS:
+                    cur.execute(sql)
+                rebuild_counters(cur)
+                for sql in REBUILD_TOTALS_SQLS:
+                    cur.execute(sql)
+                refresh_days(cur, start.date(), now.date())
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    print("计数器 / 日业绩已重算")
+    promoted = DirectorService.promote_all()["promoted"]
+    today = now.date()
+    monday = today - datetime.timedelta(days=today.weekday() + 7)
+    paid = sum(DirectorService.calc_week_dividend(monday - datetime.timedelta(weeks=w)) for w in range(weeks))
+    print(f"晋升董事 {promoted} 人，补发 {weeks} 周分红共 {paid}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="造生产规模的测试数据")
+    parser.add_argument("--users", type=int, default=1000000, help="用户数")
+    parser.add_argument("--days", type=int, default=365, help="数据跨越的天数（注册 / 下单时间均匀分布在这段时间里）")
+    parser.add_argument("--orders", type=float, default=3.0, help="人均订单数（指数分布）")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1), help="并行进程数")
+    parser.add_argument("--method", choices=("load", "insert"), default="load",
+                        help="load=LOAD DATA LOCAL INFILE，insert=批量 executemany")
+    parser.add_argument("--batch", type=int, default=5000, help="insert 模式每批行数")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="每个任务负责的用户数")
+    parser.add_argument("--database", default=CFG["db"], help="目标库名，默认 MYSQL_DATABASE")
+    parser.add_argument("--truncate", action="store_true", help="先清空相关表")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，相同参数生成相同数据")
+    args = parser.parse_args()
+    if args.users < 1:
+        parser.error("--users 至少为 1")
+
+    started = time.perf_counter()
+    CFG["db"] = args.database
+    init_database(log=lambda *_: None)
+    now = datetime.datetime.now().replace(microsecond=0)
+    start = now - datetime.timedelta(days=args.days)
+    prepare(args.truncate, start.date())
+    method = args.method
+    if method == "load" and not local_infile_enabled():
+        print("⚠️ 服务端未开启 local_infile（SET GLOBAL local_infile=1），改用 --method insert")
+        method = "insert"
+
+    rng = random.Random(args.seed)
+    parent, level = build_tree(args.users, rng)
+    hashes = [hash_pwd(DATASET_PASSWORD) for _ in range(HASH_VARIANTS)]
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            seq_start = reserve_referral_seqs(cur, args.users).start
+    print(f"推荐树 / 密码哈希就绪，用时 {time.perf_counter() - started:.1f}s")
+
+    state = {
+        "parent": parent, "level": level, "hashes": hashes, "seq_start": seq_start, "users": args.users,
+        "seed": args.seed, "start": start, "span": args.days * 86400 - 3600, "now": now,
+        "orders": args.orders, "method": method, "batch": args.batch, "db": args.database,
+    }
+    chunks = [(lo, min(lo + args.chunk, args.users + 1)) for lo in range(1, args.users + 1, args.chunk)]
+    totals = {t: 0 for t in COLUMNS}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(state,)) as pool:
+        futures = [pool.submit(load_chunk, lo, hi) for lo, hi in chunks]
+        for done, fut in enumerate(as_completed(futures), 1):
+            for t, n in fut.result().items():
+                totals[t] += n
+            if done % max(1, len(chunks) // 20) == 0 or done == len(chunks):
+                elapsed = time.perf_counter() - t0
+                print(f"  {done}/{len(chunks)} 段，{totals['users']} 用户，{totals['users'] / elapsed:.0f} 用户/s")
+    for t, n in totals.items():
+        print(f"  {t:<20} {n:>12} 行")
+
+    finish(start, now, min(52, math.ceil(args.days / 7)))
+    print(f"---- 数据集生成完毕 ✅ {args.users} 用户，用时 {time.perf_counter() - started:.1f}s ----")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+流水表分区维护：预建未来分区 + 归档超过保留期的整月分区
+    python src/tools/maintain_partitions.py                       # 每天定时跑，参数默认取 PARTITION_CFG
+    python src/tools/maintain_partitions.py --list                # 只看各表分区
+    python src/tools/maintain_partitions.py --keep 6 --mode file --dir /data/archive
+    python src/tools/maintain_partitions.py --dry-run             # 只打印将要归档的分区
+    python src/tools/maintain_partitions.py --partition --tables points_log   # 一次性：把普通表改成分区表
+--partition 要整表拷贝，期间该表只读，请在低峰逐表执行；还没分区的表日常维护会跳过。
+"""
+import argparse
+import sys
+import pathlib
+import time
+
+# 把项目根目录塞进 PYTHONPATH，否则无法 import src.*
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.parent))
+
+from src.config import get_conn, PARTITION_CFG
+from src.partitions import PARTITIONED, list_partitions, ensure_future, cold_partitions, \
+    archive_to_table, archive_to_file, partition_table
+
+
+def show(tables):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for table in tables:
+                parts = list_partitions(cur, table)
+                if not parts:
+                    print(f"{table}：未分区")
+                    continue
+                print(f"{table}：{len(parts)} 个分区")
+                for p in parts:
+                    print(f"    {p.name:<8} {str(p.month or '-'):<12} ≈{p.rows} 行")
+
+
+def partition(tables, ahead: int, dry_run: bool) -> int:
+    done = 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for table in tables:
+                if list_partitions(cur, table):
+                    print(f"{table}：已是分区表，跳过")
+                    continue
+                if dry_run:
+                    print(f"{table}：将改成按月分区（整表拷贝）")
+                    continue
+                t0 = time.perf_counter()
+                first = partition_table(cur, table, ahead)
+                print(f"{table}：已分区，最早分区 {first}（{time.perf_counter() - t0:.1f}s）")
+                done += 1
+    return done
+
+
+def maintain(tables, ahead: int, keep: int, mode: str, directory: str, dry_run: bool) -> int:
+    archived = 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for table in tables:
+                if not list_partitions(cur, table):
+                    print(f"{table}：未分区，跳过（先执行 --partition）")
+                    continue
+                if not dry_run:
+                    created = ensure_future(cur, table, ahead)
+                    if created:
+                        print(f"{table}：新建分区 {', '.join(created)}")
+                for part in cold_partitions(cur, table, keep):
+                    if dry_run:
+                        print(f"{table}：将归档 {part.name}（≈{part.rows} 行）")
+                        continue
+                    t0 = time.perf_counter()
+                    if mode == "file":
+                        path, rows = archive_to_file(cur, table, part, directory)
+                        print(f"{table}：{part.name} → {path}（{rows} 行，{time.perf_counter() - t0:.1f}s）")
+                    else:
+                        arch = archive_to_table(cur, table, part)
+                        print(f"{table}：{part.name} → {arch}（{time.perf_counter() - t0:.1f}s）")
+                    archived += 1
+    return archived
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流水表分区维护")
+    parser.add_argument("--tables", nargs="+", choices=sorted(PARTITIONED), default=sorted(PARTITIONED),
+                        help="要维护的表，默认全部")
+    parser.add_argument("--ahead", type=int, default=PARTITION_CFG["ahead"], help="提前建好几个月的分区")
+    parser.add_argument("--keep", type=int, default=PARTITION_CFG["keep_months"], help="在线保留几个月（不含本月）")
+    parser.add_argument("--mode", choices=("table", "file"), default=PARTITION_CFG["archive_mode"],
+                        help="归档方式：table=压缩归档表，file=gzip CSV")
+    parser.add_argument("--dir", default=PARTITION_CFG["archive_dir"], help="file 模式的输出目录")
+    parser.add_argument("--list", action="store_true", help="只列出分区")
+    parser.add_argument("--partition", action="store_true", help="把还没分区的表改成按月分区（整表拷贝，低峰执行）")
+    parser.add_argument("--dry-run", action="store_true", help="不做任何修改，只打印将要归档的分区")
+    args = parser.parse_args()
+
+    if args.list:
+        show(args.tables)
+        return
+    if args.partition:
+        started = time.perf_counter()
+        done = partition(args.tables, args.ahead, args.dry_run)
+        print(f"---- 分区化完毕 ✅ {done} 张表，用时 {time.perf_counter() - started:.1f}s ----")
+        return
+    if args.keep < 1:
+        parser.error("--keep 至少为 1")
+
+    started = time.perf_counter()
+    archived = maintain(args.tables, args.ahead, args.keep, args.mode, args.dir, args.dry_run)
+    print(f"---- 分区维护完毕 ✅ 归档 {archived} 个分区，用时 {time.perf_counter() - started:.1f}s ----")
+
+
+if __name__ == '__main__':
+    main()
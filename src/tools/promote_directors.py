@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+批量晋升荣誉董事：一次扫描所有满足「直推六星 ≥ 3 + 团队六星 ≥ 10」的六星用户并写入 directors
+每周分红前跑一次（也可以调 POST /admin/director/promote-all）
+用法：在项目根目录下
+    python src/tools/promote_directors.py [--chunk 1000]
+"""
+import argparse
+import sys
+import pathlib
+
+# 把项目根目录塞进 PYTHONPATH，否则无法 import src.*
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.parent))
+
+from src.director_service import DirectorService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量晋升荣誉董事")
+    parser.add_argument("--chunk", type=int, default=1000, help="每个事务写入的人数")
+    args = parser.parse_args()
+
+    report = DirectorService.promote_all(args.chunk)
+    print(f"---- 批量晋升完毕 ✅ 新晋 {report['promoted']} 人，{report['batches']} 批，"
+          f"扫描 {report['scan_seconds']}s / 写入 {report['write_seconds']}s / 共 {report['seconds']}s ----")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+维护订单日汇总 daily_sales
+    增量：python src/tools/rollup_sales.py [--days 3]             # 每天定时跑，重算最近几天
+    回填：python src/tools/rollup_sales.py --backfill [--chunk-days 31]
+周分红发放前会自己重算当周 7 天，不依赖本任务是否已跑；orders 上建议有 created_at 索引。
+"""
+import argparse
+import datetime
+import sys
+import pathlib
+import time
+
+# 把项目根目录塞进 PYTHONPATH，否则无法 import src.*
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.parent))
+
+from src.config import get_conn
+from src.sales_rollup import refresh_days
+
+
+def refresh(start: datetime.date, end: datetime.date, chunk_days: int) -> int:
+    """按 chunk_days 天一个事务重算 [start, end]"""
+    total = 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            lo = start
+            while lo <= end:
+                hi = min(end, lo + datetime.timedelta(days=chunk_days - 1))
+                conn.begin()
+                try:
+                    rows = refresh_days(cur, lo, hi)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                total += rows
+                print(f"{lo} ~ {hi}：{rows} 行")
+                lo = hi + datetime.timedelta(days=1)
+    return total
+
+
+def first_order_date():
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(created_at) AS m FROM orders")
+            m = cur.fetchone()['m']
+    return m.date() if m else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="订单日汇总")
+    parser.add_argument("--days", type=int, default=3, help="增量模式回看天数（含今天）")
+    parser.add_argument("--backfill", action="store_true", help="从最早一笔订单开始全量重算")
+    parser.add_argument("--chunk-days", type=int, default=31, help="每个事务重算的天数")
+    args = parser.parse_args()
+
+    today = datetime.date.today()
+    if args.backfill:
+        start = first_order_date()
+        if start is None:
+            print("orders 为空，无需回填")
+            return
+    else:
+        start = today - datetime.timedelta(days=max(1, args.days) - 1)
+
+    started = time.perf_counter()
+    total = refresh(start, today, max(1, args.chunk_days))
+    print(f"---- 日汇总完毕 ✅ {start} ~ {today} 共 {total} 行，用时 {time.perf_counter() - started:.1f}s ----")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+分页总数
+1. 常用过滤条件走计数器表（与写入同一事务增量维护，精确）：
+   按等级的用户数 level_user_counts、每人每类积分流水条数 user_points_log_counts；
+2. 其它过滤组合 COUNT(*) 一次后按 (表, 条件, 参数) 缓存 ttl 秒；
+3. approximate=True 时用 EXPLAIN 的估算行数，不扫表。
+返回 (total, exact)，缓存命中和估算都算不精确。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence, Tuple
+
+from src.config import TOTALS_CFG
+
+LEVEL_SLOTS = 16
+
+_BUMP_LEVEL_SQL = """
+    INSERT INTO level_user_counts(member_level, slot, cnt) VALUES (%s,%s,%s)
+    ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)
+"""
+_BUMP_POINTS_LOG_SQL = """
+    INSERT INTO user_points_log_counts(user_id, points_type, cnt) VALUES (%s,%s,%s)
+    ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)
+"""
+_LEVEL_TOTAL_SQL = "SELECT IFNULL(SUM(cnt), 0) AS c FROM level_user_counts WHERE member_level BETWEEN %s AND %s"
+_POINTS_LOG_TOTAL_SQL = "SELECT cnt FROM user_points_log_counts WHERE user_id=%s AND points_type=%s"
+
+# 全量重建（上线 / 修数用）
+REBUILD_TOTALS_SQLS = (
+    "DELETE FROM level_user_counts",
+    f"""
+    INSERT INTO level_user_counts(member_level, slot, cnt)
+    SELECT member_level, id % {LEVEL_SLOTS}, COUNT(*) FROM users GROUP BY member_level, id % {LEVEL_SLOTS}
+    """,
+    "DELETE FROM user_points_log_counts",
+    """
+    INSERT INTO user_points_log_counts(user_id, points_type, cnt)
+    SELECT user_id, points_type, COUNT(*) FROM points_log GROUP BY user_id, points_type
+    """,
+)
+
+
+def _level_rows(user_id: int, old_level: Optional[int], new_level: Optional[int]):
+    slot = user_id % LEVEL_SLOTS
+    rows = []
+    if old_level is not None:
+        rows.append((old_level, slot, -1))
+    if new_level is not None:
+        rows.append((new_level, slot, 1))
+    return sorted(rows)
+
+
+def _points_log_rows(changes: Iterable[Tuple[int, str]]):
+    counts = {}
+    for user_id, points_type in changes:
+        counts[(user_id, points_type)] = counts.get((user_id, points_type), 0) + 1
+    return sorted((uid, t, n) for (uid, t), n in counts.items())
+
+
+def bump_level_count(cur, user_id: int, old_level: Optional[int], new_level: Optional[int]):
+    """用户新建（old=None）或等级变化后调用，调用方负责事务"""
+    if old_level == new_level:
+        return
+    cur.executemany(_BUMP_LEVEL_SQL, _level_rows(user_id, old_level, new_level))
+
+
+def bump_points_log_counts(cur, changes: Iterable[Tuple[int, str]]):
+    """写入积分流水后调用，changes 为每条流水的 (user_id, points_type)"""
+    rows = _points_log_rows(changes)
+    if rows:
+        cur.executemany(_BUMP_POINTS_LOG_SQL, rows)
+
+
+async def abump_level_count(cur, user_id: int, old_level: Optional[int], new_level: Optional[int]):
+    if old_level == new_level:
+        return
+    await cur.executemany(_BUMP_LEVEL_SQL, _level_rows(user_id, old_level, new_level))
+
+
+async def abump_points_log_counts(cur, changes: Iterable[Tuple[int, str]]):
+    rows = _points_log_rows(changes)
+    if rows:
+        await cur.executemany(_BUMP_POINTS_LOG_SQL, rows)
+
+
+class TotalsCache:
+    """(表, 条件, 参数) → 总数 的 LRU + TTL 缓存，只在本进程内有效"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()   # key -> (total, expire_at)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: tuple) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: tuple, total: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (total, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = TotalsCache(**TOTALS_CFG)
+
+
+async def acount_total(cur, from_where: str, args: Sequence = (), approximate: bool = False) -> Tuple[int, bool]:
+    """from_where 形如 "audit_log WHERE user_id=%s"；返回 (total, exact)"""
+    key = (from_where, tuple(args))
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached, False
+    if approximate:
+        await cur.execute(f"EXPLAIN SELECT 1 FROM {from_where}", args)
+        plan = (await cur.fetchall())[0]
+        rows = plan.get("rows") or 0
+        filtered = plan.get("filtered") or 100
+        return int(rows * filtered / 100), False
+    await cur.execute(f"SELECT COUNT(*) AS c FROM {from_where}", args)
+    total = (await cur.fetchone())["c"]
+    _cache.put(key, total)
+    return total, True
+
+
+async def alevel_user_total(cur, level_start: int, level_end: int) -> Tuple[int, bool]:
+    await cur.execute(_LEVEL_TOTAL_SQL, (level_start, level_end))
+    return int((await cur.fetchone())["c"]), True
+
+
+async def apoints_log_total(cur, user_id: int, points_type: str) -> Tuple[int, bool]:
+    await cur.execute(_POINTS_LOG_TOTAL_SQL, (user_id, points_type))
+    row = await cur.fetchone()
+    return (row["cnt"] if row else 0), True
+
+
+def totals_stats() -> dict:
+    return _cache.stats()
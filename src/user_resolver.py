@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from src.config import get_conn, RESOLVER_CFG
+from src.aio_db import aget_conn
+
+
+class ResolvedUser(NamedTuple):
+    id: int
+    status: int
+
+
+_MISS = object()
+
+
+class UserResolver:
+    """mobile → (id, status) 的进程内 LRU + TTL 缓存
+
+    只在本进程内失效，多 worker 部署时其它进程最多陈旧 ttl 秒；
+    不存在的手机号也会缓存 negative_ttl 秒，注册时会主动失效。
+    未命中时先记下当前代数再查库；查库期间该手机号被失效过（代数更新）就不回填，
+    避免把失效前读到的旧状态写回缓存。
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl: float = 300.0, negative_ttl: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()   # mobile -> (ResolvedUser|None, expire_at)
+        self._gen = 0
+        self._loading: Dict[str, int] = {}        # mobile -> 正在查库的请求数
+        self._invalidated: Dict[str, int] = {}    # mobile -> 查库期间最近一次失效时的代数
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._stale_drops = 0
+
+    # ------------- 查询 -------------
+    def resolve(self, mobile: str) -> Optional[ResolvedUser]:
+        hit, gen = self._get(mobile)
+        if hit is not _MISS:
+            return hit
+        row = _MISS
+        try:
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT id, status FROM users WHERE mobile=%s", (mobile,))
+                    row = cur.fetchone()
+        finally:
+            value = self._put(mobile, row, gen)
+        return value
+
+    async def aresolve(self, mobile: str) -> Optional[ResolvedUser]:
+        hit, gen = self._get(mobile)
+        if hit is not _MISS:
+            return hit
+        row = _MISS
+        try:
+            async with aget_conn() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT id, status FROM users WHERE mobile=%s", (mobile,))
+                    row = await cur.fetchone()
+        finally:
+            value = self._put(mobile, row, gen)
+        return value
+
+    # ------------- 失效 -------------
+    def invalidate(self, mobile: str):
+        with self._lock:
+            self._gen += 1
+            if mobile in self._loading:
+                self._invalidated[mobile] = self._gen
+            if self._data.pop(mobile, None) is not None:
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._gen += 1
+            for mobile in self._loading:
+                self._invalidated[mobile] = self._gen
+            self._data.clear()
+
+    # ------------- 内部 -------------
+    def _get(self, mobile: str):
+        """返回 (命中的值或 _MISS, 当前代数)；未命中时登记为查库中，之后必须调用 _put"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(mobile)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(mobile)
+                self._hits += 1
+                return entry[0], self._gen
+            if entry is not None:
+                del self._data[mobile]
+            self._misses += 1
+            self._loading[mobile] = self._loading.get(mobile, 0) + 1
+            return _MISS, self._gen
+
+    def _put(self, mobile: str, row, gen: int) -> Optional[ResolvedUser]:
+        """查库结束（row 为 _MISS 表示查库失败）：注销查库登记，期间没被失效过才回填"""
+        value = ResolvedUser(row["id"], row["status"]) if row and row is not _MISS else None
+        ttl = self.ttl if value else self.negative_ttl
+        with self._lock:
+            left = self._loading[mobile] - 1
+            stale = self._invalidated.get(mobile, 0) > gen
+            if left:
+                self._loading[mobile] = left
+            else:
+                del self._loading[mobile]
+                self._invalidated.pop(mobile, None)
+            if row is _MISS or ttl <= 0:
+                return value
+            if stale:
+                self._stale_drops += 1
+                return value
+            self._data[mobile] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(mobile)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._evictions += 1
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "stale_drops": self._stale_drops,
+            }
+
+
+_resolver = UserResolver(**RESOLVER_CFG)
+
+
+def resolve_user(mobile: str) -> Optional[ResolvedUser]:
+    """按手机号取 (id, status)，优先走缓存；不存在返回 None"""
+    return _resolver.resolve(mobile)
+
+
+async def aresolve_user(mobile: str) -> Optional[ResolvedUser]:
+    return await _resolver.aresolve(mobile)
+
+
+def invalidate_user(mobile: str):
+    """用户状态变更 / 注册 / 注销后调用"""
+    _resolver.invalidate(mobile)
+
+
+def resolver_stats() -> dict:
+    return _resolver.stats()
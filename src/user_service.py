@@ -1,10 +1,17 @@
-import uuid
-import bcrypt
 from typing import Optional
 from enum import IntEnum
 from src.config import get_conn
-import string
-import random  # 在文件头部加这两行
+from src.aio_db import aget_conn
+from src.pwd_hasher import hash_pwd, verify_pwd, hash_pwd_async, verify_pwd_async
+from src.user_resolver import resolve_user, aresolve_user, invalidate_user
+from src.auth import issue_token, revoke_user_tokens, token_cutoff
+from src.profile_cache import invalidate_profiles
+from src.audit_sink import audit_entry, insert_audit, ainsert_audit
+from src.six_counter import on_level_change, aon_level_change
+from src.totals import bump_level_count, abump_level_count
+from src.referral_tree import link_new_user, move_subtree, acquire_tree_lock, release_tree_lock, \
+    alink_new_user, amove_subtree, aacquire_tree_lock, arelease_tree_lock
+from src.referral_code import next_referral_code, anext_referral_code, insert_with_code, ainsert_with_code
 
 
 
@@ -16,22 +23,10 @@ class UserStatus(IntEnum):
     DELETED = 2  # 已注销（逻辑删除，所有业务拦截）
 
 
-def hash_pwd(pwd: str) -> str:
-    """密码加密"""
-    return bcrypt.hashpw(pwd.encode(), bcrypt.gensalt()).decode()
-
-
-def verify_pwd(pwd: str, hashed: str) -> bool:
-    """密码校验"""
-    return bcrypt.checkpw(pwd.encode(), hashed.encode())
-
-
-
-def _generate_code(length: int = 6) -> str:
-    """生成 6 位不含 0O1I 的随机码"""
-    chars = string.ascii_uppercase.replace('O', '').replace('I', '') + \
-            string.digits.replace('0', '').replace('1', '')
-    return ''.join(random.choices(chars, k=length))
+_INSERT_USER_SQL = (
+    "INSERT INTO users(mobile, password_hash, name, member_points, merchant_points, withdrawable_balance, status, referral_code) "
+    "VALUES (%s,%s,%s,0,0,0,%s,%s)"
+)
 
 class UserService:
     @staticmethod
@@ -44,28 +39,25 @@ class UserService:
                     raise ValueError("手机号已注册")
                 pwd_hash = hash_pwd(pwd)
 
-                # 1. 生成唯一推荐码
-                code = _generate_code()
-                cur.execute("SELECT 1 FROM users WHERE referral_code=%s", (code,))
-                while cur.fetchone():
-                    code = _generate_code()
-                    cur.execute("SELECT 1 FROM users WHERE referral_code=%s", (code,))
+                # 1. 分配推荐码（由序号置换得到，天然唯一，不用查库）
+                code = next_referral_code()
 
-                # 2. 插入用户（只多了 referral_code 字段 & 参数）
-                cur.execute(
-                    "INSERT INTO users(mobile, password_hash, name, member_points, merchant_points, withdrawable_balance, status, referral_code) "
-                    "VALUES (%s,%s,%s,0,0,0,%s,%s)",
-                    (mobile, pwd_hash, name, int(UserStatus.NORMAL), code)  # ← 这里把 code 写进库
-                )
+                ref = resolve_user(referrer_mobile) if referrer_mobile else None
+
+                # 2. 插入用户（只多了 referral_code 字段 & 参数），与推荐关系、闭包路径同一事务
+                conn.begin()
+                insert_with_code(cur, _INSERT_USER_SQL, (mobile, pwd_hash, name, int(UserStatus.NORMAL)), code)
                 uid = cur.lastrowid
 
                 # 3. 绑定推荐人（原逻辑不变）
-                if referrer_mobile:
-                    cur.execute("SELECT id FROM users WHERE mobile=%s", (referrer_mobile,))
-                    ref = cur.fetchone()
-                    if ref:
-                        cur.execute("INSERT INTO user_referrals(user_id, referrer_id) VALUES (%s,%s)",
-                                    (uid, ref["id"]))
+                if ref:
+                    cur.execute("INSERT INTO user_referrals(user_id, referrer_id) VALUES (%s,%s)",
+                                (uid, ref.id))
+                ancestors = link_new_user(cur, uid, ref.id if ref else None)
+                bump_level_count(cur, uid, None, 0)
+                conn.commit()
+                invalidate_user(mobile)
+                invalidate_profiles(*ancestors)
                 return uid
 
     @staticmethod
@@ -88,7 +80,7 @@ class UserService:
                 if status == UserStatus.DELETED:
                     raise ValueError("账号已注销")
 
-                token = str(uuid.uuid4())
+                token = issue_token(row["id"])
                 return {"uid": row["id"], "level": row["member_level"], "token": token}
 
     @staticmethod
@@ -96,7 +88,8 @@ class UserService:
         """用户升级一星"""
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT id, member_level FROM users WHERE mobile=%s", (mobile,))
+                conn.begin()
+                cur.execute("SELECT id, member_level FROM users WHERE mobile=%s FOR UPDATE", (mobile,))
                 row = cur.fetchone()
                 if not row:
                     raise ValueError("用户不存在")
@@ -106,44 +99,57 @@ class UserService:
                 new_level = current + 1
                 cur.execute("UPDATE users SET member_level=%s, level_changed_at=NOW() WHERE mobile=%s",
                             (new_level, mobile))
+                on_level_change(cur, row["id"], current, new_level)
+                bump_level_count(cur, row["id"], current, new_level)
+                insert_audit(cur, [audit_entry(row["id"], "SET_LEVEL", current, new_level, "升 1 星")])
+                conn.commit()
+                invalidate_profiles(row["id"])
                 return new_level
 
     @staticmethod
     def bind_referrer(mobile: str, referrer_mobile: str):
         """绑定推荐人"""
+        u = resolve_user(mobile)
+        if not u:
+            raise ValueError("被推荐人不存在")
+        ref = resolve_user(referrer_mobile)
+        if not ref:
+            raise ValueError("推荐人不存在")
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
-                u = cur.fetchone()
-                if not u:
-                    raise ValueError("被推荐人不存在")
-                cur.execute("SELECT id FROM users WHERE mobile=%s", (referrer_mobile,))
-                ref = cur.fetchone()
-                if not ref:
-                    raise ValueError("推荐人不存在")
-                cur.execute(
-                    "INSERT INTO user_referrals(user_id, referrer_id) VALUES (%s,%s) ON DUPLICATE KEY UPDATE referrer_id=%s",
-                    (u["id"], ref["id"], ref["id"])
-                )
+                # 换绑会整棵子树搬家：推荐关系、闭包路径、六星计数同一事务
+                acquire_tree_lock(cur)
+                try:
+                    conn.begin()
+                    changed = move_subtree(cur, u.id, ref.id)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    release_tree_lock(cur)
+        invalidate_profiles(*changed)
 
     @staticmethod
     def set_level(mobile: str, new_level: int, reason: str = "后台手动调整"):
         """设置会员等级"""
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT id, member_level FROM users WHERE mobile=%s", (mobile,))
+                conn.begin()
+                cur.execute("SELECT id, member_level FROM users WHERE mobile=%s FOR UPDATE", (mobile,))
                 row = cur.fetchone()
                 if not row:
                     raise ValueError("用户不存在")
                 old_level = row["member_level"]
                 if old_level == new_level:
                     return old_level
-                cur.execute(
-                    "INSERT INTO audit_log(user_id, op_type, old_val, new_val, reason) VALUES (%s,'SET_LEVEL',%s,%s,%s)",
-                    (row["id"], old_level, new_level, reason)
-                )
                 cur.execute("UPDATE users SET member_level=%s, level_changed_at=NOW() WHERE mobile=%s",
                             (new_level, mobile))
+                on_level_change(cur, row["id"], old_level, new_level)
+                bump_level_count(cur, row["id"], old_level, new_level)
+                insert_audit(cur, [audit_entry(row["id"], "SET_LEVEL", old_level, new_level, reason)])
+                conn.commit()
+                invalidate_profiles(row["id"])
                 return new_level
 
     @staticmethod
@@ -171,7 +177,9 @@ class UserService:
 
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT id, status FROM users WHERE mobile=%s", (mobile,))
+                # 状态变更与审计同一事务
+                conn.begin()
+                cur.execute("SELECT id, status FROM users WHERE mobile=%s FOR UPDATE", (mobile,))
                 row = cur.fetchone()
                 if not row:
                     raise ValueError("用户不存在")
@@ -180,15 +188,187 @@ class UserService:
                 if old_status == new_status:
                     return False  # 无变化
 
-                # 写审计（重点：把枚举转 int）
-                cur.execute(
-                    "INSERT INTO audit_log(user_id, op_type, old_val, new_val, reason) VALUES (%s,'SET_STATUS',%s,%s,%s)",
-                    (row["id"], int(old_status), int(new_status), reason)
-                )
                 # 更新状态（重点：把枚举转 int）
+                # 非正常状态同时写 token 截止时间，之后解冻也不会让旧 token 复活
                 cur.execute(
-                    "UPDATE users SET status=%s WHERE mobile=%s",
-                    (int(new_status), mobile)
+                    "UPDATE users SET status=%s, token_valid_after=IF(%s, %s, token_valid_after) WHERE mobile=%s",
+                    (int(new_status), new_status != UserStatus.NORMAL, token_cutoff(), mobile)
                 )
+                changed = cur.rowcount > 0
+                insert_audit(cur, [audit_entry(row["id"], "SET_STATUS", old_status, new_status, reason)])
                 conn.commit()
-                return cur.rowcount > 0
\ No newline at end of file
+                invalidate_user(mobile)
+                invalidate_profiles(row["id"])
+                if new_status != UserStatus.NORMAL:
+                    revoke_user_tokens(row["id"])
+                return changed
+
+
+class AsyncUserService:
+    """UserService 的 asyncio 版本，供 async 路由使用，SQL 与同步版保持一致"""
+
+    @staticmethod
+    async def register(mobile: str, pwd: str, name: Optional[str] = None, referrer_mobile: Optional[str] = None) -> int:
+        """用户注册"""
+        pwd_hash = await hash_pwd_async(pwd)
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id FROM users WHERE mobile=%s", (mobile,))
+                if await cur.fetchone():
+                    raise ValueError("手机号已注册")
+
+                code = await anext_referral_code()
+
+                ref = await aresolve_user(referrer_mobile) if referrer_mobile else None
+
+                await conn.begin()
+                await ainsert_with_code(cur, _INSERT_USER_SQL, (mobile, pwd_hash, name, int(UserStatus.NORMAL)), code)
+                uid = cur.lastrowid
+
+                if ref:
+                    await cur.execute("INSERT INTO user_referrals(user_id, referrer_id) VALUES (%s,%s)",
+                                      (uid, ref.id))
+                ancestors = await alink_new_user(cur, uid, ref.id if ref else None)
+                await abump_level_count(cur, uid, None, 0)
+                await conn.commit()
+                invalidate_user(mobile)
+                invalidate_profiles(*ancestors)
+                return uid
+
+    @staticmethod
+    async def login(mobile: str, pwd: str) -> dict:
+        """用户登录"""
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT id, password_hash, member_level, status FROM users WHERE mobile=%s",
+                    (mobile,)
+                )
+                row = await cur.fetchone()
+        if not row or not await verify_pwd_async(pwd, row["password_hash"]):
+            raise ValueError("手机号或密码错误")
+
+        status = row["status"]
+        if status == UserStatus.FROZEN:
+            raise ValueError("账号已被冻结，请联系客服")
+        if status == UserStatus.DELETED:
+            raise ValueError("账号已注销")
+
+        token = issue_token(row["id"])
+        return {"uid": row["id"], "level": row["member_level"], "token": token}
+
+    @staticmethod
+    async def upgrade_one_star(mobile: str) -> int:
+        """用户升级一星"""
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await cur.execute("SELECT id, member_level FROM users WHERE mobile=%s FOR UPDATE", (mobile,))
+                row = await cur.fetchone()
+                if not row:
+                    raise ValueError("用户不存在")
+                current = row["member_level"]
+                if current >= 6:
+                    raise ValueError("已是最高星级（6星）")
+                new_level = current + 1
+                await cur.execute("UPDATE users SET member_level=%s, level_changed_at=NOW() WHERE mobile=%s",
+                                  (new_level, mobile))
+                await aon_level_change(cur, row["id"], current, new_level)
+                await abump_level_count(cur, row["id"], current, new_level)
+                await ainsert_audit(cur, [audit_entry(row["id"], "SET_LEVEL", current, new_level, "升 1 星")])
+                await conn.commit()
+                invalidate_profiles(row["id"])
+                return new_level
+
+    @staticmethod
+    async def bind_referrer(mobile: str, referrer_mobile: str):
+        """绑定推荐人"""
+        u = await aresolve_user(mobile)
+        if not u:
+            raise ValueError("被推荐人不存在")
+        ref = await aresolve_user(referrer_mobile)
+        if not ref:
+            raise ValueError("推荐人不存在")
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await aacquire_tree_lock(cur)
+                try:
+                    await conn.begin()
+                    changed = await amove_subtree(cur, u.id, ref.id)
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+                finally:
+                    await arelease_tree_lock(cur)
+        invalidate_profiles(*changed)
+
+    @staticmethod
+    async def set_level(mobile: str, new_level: int, reason: str = "后台手动调整"):
+        """设置会员等级"""
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await cur.execute("SELECT id, member_level FROM users WHERE mobile=%s FOR UPDATE", (mobile,))
+                row = await cur.fetchone()
+                if not row:
+                    raise ValueError("用户不存在")
+                old_level = row["member_level"]
+                if old_level == new_level:
+                    return old_level
+                await cur.execute("UPDATE users SET member_level=%s, level_changed_at=NOW() WHERE mobile=%s",
+                                  (new_level, mobile))
+                await aon_level_change(cur, row["id"], old_level, new_level)
+                await abump_level_count(cur, row["id"], old_level, new_level)
+                await ainsert_audit(cur, [audit_entry(row["id"], "SET_LEVEL", old_level, new_level, reason)])
+                await conn.commit()
+                invalidate_profiles(row["id"])
+                return new_level
+
+    @staticmethod
+    async def grant_merchant(mobile: str) -> bool:
+        """授予商家权限"""
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("UPDATE users SET is_merchant=1 WHERE mobile=%s", (mobile,))
+                return cur.rowcount > 0
+
+    @staticmethod
+    async def is_merchant(mobile: str) -> bool:
+        """检查是否为商家"""
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT is_merchant FROM users WHERE mobile=%s", (mobile,))
+                row = await cur.fetchone()
+                return bool(row and row['is_merchant'])
+
+    @staticmethod
+    async def set_status(mobile: str, new_status: UserStatus, reason: str = "后台调整") -> bool:
+        """设置用户状态"""
+        if new_status not in (UserStatus.NORMAL, UserStatus.FROZEN, UserStatus.DELETED):
+            raise ValueError("非法状态值")
+
+        async with aget_conn() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await cur.execute("SELECT id, status FROM users WHERE mobile=%s FOR UPDATE", (mobile,))
+                row = await cur.fetchone()
+                if not row:
+                    raise ValueError("用户不存在")
+
+                old_status = row["status"]
+                if old_status == new_status:
+                    return False
+
+                await cur.execute(
+                    "UPDATE users SET status=%s, token_valid_after=IF(%s, %s, token_valid_after) WHERE mobile=%s",
+                    (int(new_status), new_status != UserStatus.NORMAL, token_cutoff(), mobile)
+                )
+                changed = cur.rowcount > 0
+                await ainsert_audit(cur, [audit_entry(row["id"], "SET_STATUS", old_status, new_status, reason)])
+                await conn.commit()
+                invalidate_user(mobile)
+                invalidate_profiles(row["id"])
+                if new_status != UserStatus.NORMAL:
+                    revoke_user_tokens(row["id"])
+                return changed
@@ -0,0 +1,168 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from src.config import WECHAT_HTTP_CFG
+
+# 微信侧「系统繁忙」，可以重试
+_BUSY_ERRCODE = -1
+
+
+class WechatUnavailableError(Exception):
+    """微信接口不可用：熔断打开，或重试后仍失败"""
+
+
+class CircuitBreaker:
+    """连续失败 threshold 次后打开，reset 秒内直接拒绝；之后放一个试探请求，成功即关闭"""
+
+    def __init__(self, threshold: int = 5, reset: float = 30.0):
+        self.threshold = max(1, threshold)
+        self.reset = reset
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened_count = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                if self._opened_at is None or self._probing:
+                    self.opened_count += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def abandon(self):
+        """试探请求没有结果就结束了（被取消、意外异常），让出试探名额，下一个请求重新试探"""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._probing else "open"
+
+
+class WechatClient:
+    """jscode2session 异步客户端：keep-alive 连接池 + 超时 + 指数退避重试 + 熔断"""
+
+    def __init__(self, base_url: str, timeout: float = 5.0, connect_timeout: float = 2.0,
+                 max_connections: int = 20, retries: int = 2, backoff: float = 0.2,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self._stats = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0,
+                       "total_seconds": 0.0, "max_seconds": 0.0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # httpx 的连接绑定在创建它的事件循环上，换了循环就重建
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            self._client_loop = loop
+        return self._client
+
+    async def code2session(self, appid: str, secret: str, js_code: str) -> dict:
+        """返回微信原始 JSON；网络错误 / 5xx / 系统繁忙会重试，最终失败或熔断时抛 WechatUnavailableError"""
+        self._stats["requests"] += 1
+        if not self.breaker.allow():
+            self._stats["rejected"] += 1
+            raise WechatUnavailableError("微信接口暂不可用，请稍后重试")
+        params = {"appid": appid, "secret": secret, "js_code": js_code, "grant_type": "authorization_code"}
+        t0 = time.perf_counter()
+        last_error = None
+        settled = False
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._stats["retries"] += 1
+                    # 指数退避 + 抖动，避免一起重试打爆对端
+                    await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+                self._stats["attempts"] += 1
+                try:
+                    resp = await self._get_client().get("/sns/jscode2session", params=params)
+                    if resp.status_code >= 500:
+                        last_error = f"HTTP {resp.status_code}"
+                        continue
+                    if resp.status_code != 200:
+                        break
+                    data = resp.json()
+                except (httpx.TransportError, ValueError) as e:
+                    last_error = e
+                    continue
+                if data.get("errcode") == _BUSY_ERRCODE:
+                    last_error = data.get("errmsg")
+                    continue
+                settled = True
+                self.breaker.success()
+                return data
+            else:
+                settled = True
+                self.breaker.failure()
+                self._stats["failures"] += 1
+                raise WechatUnavailableError(f"微信接口调用失败：{last_error}")
+            # 4xx 属于请求本身的问题，不计入熔断
+            settled = True
+            self.breaker.success()
+            raise WechatUnavailableError(f"微信接口调用失败：HTTP {resp.status_code}")
+        finally:
+            if not settled:
+                # 客户端断开 / 外层 wait_for 超时会在 await 处抛 CancelledError，不能让熔断器一直卡在半开
+                self.breaker.abandon()
+            elapsed = time.perf_counter() - t0
+            self._stats["total_seconds"] += elapsed
+            self._stats["max_seconds"] = max(self._stats["max_seconds"], elapsed)
+
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        s["breaker"] = self.breaker.state
+        s["breaker_opened"] = self.breaker.opened_count
+        return s
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+_client = WechatClient(**WECHAT_HTTP_CFG)
+
+
+async def code2session(appid: str, secret: str, js_code: str) -> dict:
+    return await _client.code2session(appid, secret, js_code)
+
+
+def wechat_client_stats() -> dict:
+    return _client.stats()
+
+
+async def close_wechat_client():
+    await _client.aclose()
@@ -1,13 +1,14 @@
-import uuid
-import pymysql
-from config import Wechat_ID
-import requests
-import hashlib
-from jose import jwt
-import datetime
 from fastapi import Request, HTTPException
-from src.config import get_conn
-from src.user_service import hash_pwd, UserStatus, _generate_code
+from src.config import Wechat_ID
+from src.aio_db import aget_conn
+from src.user_service import UserStatus
+from src.referral_code import anext_referral_code, ainsert_with_code
+from src.pwd_hasher import make_unusable_hash
+from src.user_resolver import invalidate_user
+from src.referral_tree import alink_new_user
+from src.totals import abump_level_count
+from src.wechat_client import code2session, WechatUnavailableError
+from src.auth import issue_token
 
 # 微信小程序配置从环境变量读取，避免明文写入仓库
 WECHAT_APP_ID = Wechat_ID.get("wechat_app_id", "")
@@ -19,9 +20,6 @@ async def wechat_login(request: Request):
     if not WECHAT_APP_ID or not WECHAT_APP_SECRET:
         raise HTTPException(status_code=500, detail="未配置微信小程序 AppId/Secret，请在 .env 中设置 WECHAT_APP_ID 与 WECHAT_APP_SECRET")
 
-    # 确保 users 表存在 openid 字段（兼容旧库）
-    ensure_openid_column()
-
     data = await request.json()
     code = data.get('code')
     nick_name = data.get('nickName')
@@ -29,14 +27,11 @@ async def wechat_login(request: Request):
     if not code or not nick_name:
         raise HTTPException(status_code=400, detail="缺少参数")
 
-    # 调用微信接口，通过code换取openid和session_key
-    url = f"https://api.weixin.qq.com/sns/jscode2session?appid={WECHAT_APP_ID}&secret={WECHAT_APP_SECRET}&js_code={code}&grant_type=authorization_code"
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail="微信接口调用失败")
-
-    wechat_data = response.json()
-    print("微信接口返回：", wechat_data)
+    # 调用微信接口，通过code换取openid和session_key（连接复用、超时、重试、熔断见 wechat_client）
+    try:
+        wechat_data = await code2session(WECHAT_APP_ID, WECHAT_APP_SECRET, code)
+    except WechatUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     openid = wechat_data.get('openid')
     session_key = wechat_data.get('session_key')
 
@@ -57,7 +52,7 @@ async def wechat_login(request: Request):
         raise HTTPException(status_code=500, detail=f"微信注册失败: {e}")
 
     # 生成token并返回
-    token = generate_token(user_id)
+    token = issue_token(user_id)
     return {
         "success": True,
         "user_id": user_id,
@@ -65,62 +60,43 @@ async def wechat_login(request: Request):
     }
 
 async def check_user_by_openid(openid):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE openid=%s", (openid,))
-            result = cur.fetchone()
+    async with aget_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT id FROM users WHERE openid=%s", (openid,))
+            result = await cur.fetchone()
             return result
 
-def ensure_openid_column():
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SHOW COLUMNS FROM users LIKE 'openid'")
-            exists = cur.fetchone()
-            if not exists:
-                try:
-                    cur.execute("ALTER TABLE users ADD COLUMN openid VARCHAR(64) UNIQUE")
-                    conn.commit()
-                except pymysql.err.InternalError as e:
-                    if e.args[0] == 1060:  # 字段已存在
-                        return
-                    raise
-
-
 async def register_user(openid, nick_name):
     """为微信用户创建账号，自动生成必填字段"""
     # 生成占位手机号，保证唯一
     mobile = f"wx_{openid[:20]}"
-    pwd_hash = hash_pwd(uuid.uuid4().hex)
+    # 微信账号不走密码登录，用占位哈希代替对随机密码跑一次 bcrypt
+    pwd_hash = make_unusable_hash()
 
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            # 唯一推荐码
-            code = _generate_code()
-            cur.execute("SELECT 1 FROM users WHERE referral_code=%s", (code,))
-            while cur.fetchone():
-                code = _generate_code()
-                cur.execute("SELECT 1 FROM users WHERE referral_code=%s", (code,))
+    async with aget_conn() as conn:
+        async with conn.cursor() as cur:
+            # 唯一推荐码（序号置换，不用查库）
+            code = await anext_referral_code()
 
             # 确保占位手机号不冲突
-            cur.execute("SELECT 1 FROM users WHERE mobile=%s", (mobile,))
+            await cur.execute("SELECT 1 FROM users WHERE mobile=%s", (mobile,))
             idx = 1
             base_mobile = mobile
-            while cur.fetchone():
+            while await cur.fetchone():
                 mobile = f"{base_mobile}_{idx}"
-                cur.execute("SELECT 1 FROM users WHERE mobile=%s", (mobile,))
+                await cur.execute("SELECT 1 FROM users WHERE mobile=%s", (mobile,))
                 idx += 1
 
-            cur.execute(
+            await conn.begin()
+            await ainsert_with_code(
+                cur,
                 "INSERT INTO users(openid, mobile, password_hash, name, member_points, merchant_points, withdrawable_balance, status, referral_code) "
                 "VALUES (%s, %s, %s, %s, 0, 0, 0, %s, %s)",
-                (openid, mobile, pwd_hash, nick_name, int(UserStatus.NORMAL), code)
+                (openid, mobile, pwd_hash, nick_name, int(UserStatus.NORMAL)), code
             )
-            return cur.lastrowid
-
-def generate_token(user_id):
-    payload = {
-        "user_id": user_id,
-        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
-    }
-    token = jwt.encode(payload, "your_secret_key", algorithm="HS256")
-    return token
\ No newline at end of file
+            uid = cur.lastrowid
+            await alink_new_user(cur, uid)
+            await abump_level_count(cur, uid, None, 0)
+            await conn.commit()
+            invalidate_user(mobile)
+            return uid